@@ -1,5 +1,5 @@
 import abc
-from typing import Any, Optional, Iterable, List, Mapping
+from typing import Any, Optional, Iterable, List, Mapping, Tuple
 
 from ..model import Statechart, StateMixin, Transition, Event
 from ..exceptions import CodeEvaluationError
@@ -86,6 +86,28 @@ class Evaluator(metaclass=abc.ABCMeta):
             return self._evaluate_code(transition.guard, additional_context={'event': event})
         return None
 
+    def time_constraints(self, transition: Transition, *,
+                         necessary: bool = False) -> List[Tuple[str, float]]:
+        """
+        Return the time constraints that are involved in the guard of given transition.
+        Each constraint is a pair (kind, duration) where kind is either "after" or "idle",
+        meaning the guard may change when given duration has elapsed since the source state
+        was respectively entered or idle.
+
+        If *necessary* is True, only the constraints that must be satisfied for the guard
+        to hold are returned. In that case, the guard is expected to be False (and its
+        evaluation to have no effect) as long as one of these constraints is not satisfied.
+
+        This method is used by the interpreter to compute the next time at which something
+        could happen (see *Interpreter.next_wakeup_time*), and to avoid evaluating guards
+        that cannot hold yet. By default, no constraint is returned.
+
+        :param transition: the considered transition
+        :param necessary: True to only return necessary constraints
+        :return: a possibly empty list of (kind, duration) pairs
+        """
+        return []
+
     def execute_action(self, transition: Transition, event: Optional[Event] = None) -> List[Event]:
         """
         Execute the action for given transition.
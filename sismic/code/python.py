@@ -1,17 +1,89 @@
+import ast
 import collections
 import copy
 
+from functools import lru_cache
 from types import CodeType
-from typing import Any, Dict, List, Optional, Mapping, Iterator
+from typing import Any, Dict, Iterable, List, Optional, Mapping, Tuple
 
 from . import Evaluator
 from ..exceptions import CodeEvaluationError
-from ..model import Event, InternalEvent, MetaEvent, Transition
+from ..model import (ActionStateMixin, ContractMixin, Event, InternalEvent, MetaEvent,
+                     Statechart, Transition)
 
 
 __all__ = ['PythonEvaluator']
 
 
+@lru_cache(maxsize=4096)
+def _compile(code: str, mode: str) -> CodeType:
+    """
+    Compile given code. Compiled code is kept in a process-wide LRU cache, shared by all
+    the evaluators, as it only depends on the code and the compilation mode.
+
+    :param code: code to compile
+    :param mode: either "eval" or "exec"
+    :return: compiled code
+    """
+    return compile(code, '<string>', mode)
+
+
+def _time_constraint(node: ast.AST) -> Optional[Tuple[str, float]]:
+    """
+    Return a (kind, duration) pair if given node is a call to *after* or *idle* whose
+    duration is a constant number, or None otherwise.
+
+    :param node: an AST node
+    :return: a (kind, duration) pair, or None
+    """
+    if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name)
+            and node.func.id in ('after', 'idle') and len(node.args) == 1
+            and len(node.keywords) == 0):
+        try:
+            duration = ast.literal_eval(node.args[0])
+        except ValueError:
+            return None
+        if isinstance(duration, (int, float)) and not isinstance(duration, bool):
+            return node.func.id, float(duration)
+    return None
+
+
+@lru_cache(maxsize=4096)
+def _time_constraints(code: str) -> Tuple[Tuple[Tuple[str, float], ...],
+                                          Tuple[Tuple[str, float], ...]]:
+    """
+    Analyse given code and return a pair of tuples of (kind, duration) pairs, where kind is
+    either "after" or "idle". The first tuple contains every call to *after* and *idle* whose
+    duration is a constant number. The second one contains the calls that are necessary for
+    the code to be true, ie. the ones that appear in the leading operands of a top-level
+    conjunction (so that no other part of the code is evaluated while they are false).
+    Results are kept in a process-wide LRU cache.
+
+    :param code: code to analyse
+    :return: a pair (all constraints, necessary constraints)
+    """
+    try:
+        tree = ast.parse(code, mode='eval')
+    except SyntaxError:
+        return (), ()
+
+    constraints = tuple(filter(None, map(_time_constraint, ast.walk(tree))))
+
+    body = tree.body
+    if isinstance(body, ast.BoolOp) and isinstance(body.op, ast.And):
+        operands = body.values
+    else:
+        operands = [body]
+    necessary = []
+    for operand in operands:
+        constraint = _time_constraint(operand)
+        if constraint is None:
+            break
+        necessary.append(constraint)
+
+    return constraints, tuple(necessary)
+
+
 class FrozenContext(collections.abc.Mapping):
     """
     A shallow copy of a context. The keys of the underlying context are
@@ -56,10 +128,13 @@ class PythonEvaluator(Evaluator):
           if and only if this state is currently active, ie. it is in the active configuration of
           the ``Interpreter`` instance that makes use of this evaluator.
     - On code execution:
-        - A *send(name: str, **kwargs) -> None* function that takes an event name and additional
+        - A *send(name: str, **kwargs) -> Event* function that takes an event name and additional
           keyword parameters and raises an internal event with it. Raised events are propagated to
           bound statecharts as external events and to the current statechart as internal event.
-          If delay is provided, a delayed event is created.
+          If delay is provided, a delayed event is created. The raised event is returned.
+        - A *cancel(event: Event) -> bool* function that takes an event returned by *send* and
+          cancels it if it was not yet processed (see *Interpreter.cancel*). It returns True
+          if the event was cancelled.
         - A *notify(name: str, **kwargs) -> None* function that takes an event name and additional
           keyword parameters and raises a meta-event with it. Meta-events are only sent to bound
           property statecharts.
@@ -103,17 +178,132 @@ class PythonEvaluator(Evaluator):
         self._context.update(initial_context if initial_context else {})
         self._interpreter = interpreter
 
-        # Precompiled code
-        self._evaluable_code = {}  # type: Dict[str, CodeType]
-        self._executable_code = {}  # type: Dict[str, CodeType]
-
         # Frozen context for __old__
         self._memory = {}  # type: Dict[int, FrozenContext]
 
+        # State and event that are considered by after, idle and received
+        self._current_state = None  # type: Optional[str]
+        self._current_event = None  # type: Optional[Event]
+
+        # Events sent by the code that is currently executed
+        self._raised_events = []  # type: List[Event]
+
+        self._create_namespaces()
+
+    def _create_namespaces(self) -> None:
+        """
+        Create the namespaces that are exposed to the code. These namespaces are created
+        once, and their dynamic entries (e.g. *time* or *event*) are updated in place
+        before each evaluation or execution.
+        """
+        self._evaluation_namespace = {
+            'active': self._active,
+            'time': None,
+        }  # type: Dict[str, Any]
+
+        self._execution_namespace = {
+            'active': self._active,
+            'time': None,
+            'send': self._send,
+            'cancel': self._cancel,
+            'notify': self._notify,
+            'setdefault': self._setdefault,
+        }  # type: Dict[str, Any]
+
+        self._action_namespace = dict(self._execution_namespace, event=None)
+
+        self._guard_namespace = {
+            'active': self._active,
+            'time': None,
+            'after': self._after,
+            'idle': self._idle,
+            'event': None,
+        }  # type: Dict[str, Any]
+
+        self._precondition_namespace = {
+            'active': self._active,
+            'time': None,
+            'received': self._received,
+            'sent': self._sent,
+            'event': None,
+        }  # type: Dict[str, Any]
+
+        self._condition_namespace = {
+            'active': self._active,
+            'time': None,
+            '__old__': None,
+            'after': self._after,
+            'idle': self._idle,
+            'received': self._received,
+            'sent': self._sent,
+            'event': None,
+        }  # type: Dict[str, Any]
+
     @property
     def context(self) -> Mapping:
         return self._context
 
+    @staticmethod
+    def precompile(statechart: Statechart) -> None:
+        """
+        Compile every piece of code contained in given statechart (preamble, guards, actions
+        and contracts). Compiled code is shared by all the Python evaluators of the current
+        process, so interpreters that are created afterwards for this statechart do not have
+        to compile anything.
+
+        :param statechart: statechart to consider
+        """
+        if statechart.preamble:
+            _compile(statechart.preamble, 'exec')
+
+        elements = [statechart.state_for(name) for name in statechart.states]
+        elements.extend(statechart.transitions)
+        for element in elements:
+            if isinstance(element, Transition):
+                if element.guard:
+                    _compile(element.guard, 'eval')
+                if element.action:
+                    _compile(element.action, 'exec')
+            if isinstance(element, ActionStateMixin):
+                for code in (element.on_entry, element.on_exit):
+                    if code:
+                        _compile(code, 'exec')
+            if isinstance(element, ContractMixin):
+                for code in element.preconditions + element.postconditions + element.invariants:
+                    _compile(code, 'eval')
+
+    def _active(self, name: str) -> bool:
+        return self._interpreter.is_active(name)
+
+    def _after(self, seconds: float) -> bool:
+        return (self._interpreter.time - seconds
+                >= self._interpreter._entry_time[self._current_state])
+
+    def _idle(self, seconds: float) -> bool:
+        return (self._interpreter.time - seconds
+                >= self._interpreter._idle_time[self._current_state])
+
+    def _received(self, name: str) -> bool:
+        return name == getattr(self._current_event, 'name', None)
+
+    def _sent(self, name: str) -> bool:
+        return any(name == event.name for event in self._interpreter._sent_events)
+
+    def _send(self, name: str, **kwargs) -> InternalEvent:
+        event = InternalEvent(name, **kwargs)
+        self._raised_events.append(event)
+        return event
+
+    def _cancel(self, event: Event) -> bool:
+        for i, raised_event in enumerate(self._raised_events):
+            if raised_event is event:
+                del self._raised_events[i]
+                return True
+        return self._interpreter.cancel(event)
+
+    def _notify(self, name: str, **kwargs) -> None:
+        self._raised_events.append(MetaEvent(name, **kwargs))
+
     def _setdefault(self, name: str, value: Any) -> Any:
         """
         Define and return variable "name".
@@ -134,21 +324,29 @@ class PythonEvaluator(Evaluator):
         :param additional_context: an optional additional context
         :return: truth value of *code*
         """
+        namespace = self._evaluation_namespace
+        namespace['time'] = self._interpreter.time
+        if additional_context is not None:
+            namespace = dict(namespace)
+            namespace.update(additional_context)
+
+        return self._evaluate_in(code, namespace)
+
+    def _evaluate_in(self, code: Optional[str], namespace: Dict[str, Any]) -> bool:
+        """
+        Evaluate given code using Python, in given namespace.
+
+        :param code: code to evaluate
+        :param namespace: namespace to use as globals
+        :return: truth value of *code*
+        """
         if code is None:
             return True
 
-        compiled_code = self._evaluable_code.get(code, None)
-        if compiled_code is None:
-            compiled_code = self._evaluable_code.setdefault(code, compile(code, '<string>', 'eval'))
-
-        exposed_context = {
-            'active': lambda s: s in self._interpreter.configuration,
-            'time': self._interpreter.time,
-        }
-        exposed_context.update(additional_context if additional_context is not None else {})
+        compiled_code = _compile(code, 'eval')
 
         try:
-            return bool(eval(compiled_code, exposed_context, self._context))
+            return bool(eval(compiled_code, namespace, self._context))
         except Exception as e:
             raise CodeEvaluationError('"{}" occurred while evaluating "{}"'.format(e, code)) from e
 
@@ -162,31 +360,52 @@ class PythonEvaluator(Evaluator):
         :param additional_context: an optional additional context
         :return: a list of sent events
         """
+        namespace = self._execution_namespace
+        namespace['time'] = self._interpreter.time
+        if additional_context is not None:
+            namespace = dict(namespace)
+            namespace.update(additional_context)
+
+        return self._execute_in(code, namespace)
+
+    def _execute_in(self, code: Optional[str], namespace: Dict[str, Any]) -> List[Event]:
+        """
+        Execute given code using Python, in given namespace.
+
+        :param code: code to execute
+        :param namespace: namespace to use as globals
+        :return: a list of sent events
+        """
         if code is None:
             return []
 
-        compiled_code = self._executable_code.get(code, None)
-        if compiled_code is None:
-            compiled_code = self._executable_code.setdefault(
-                code, compile(code, '<string>', 'exec'))
-
-        sent_events = []  # type: List[Event]
+        compiled_code = _compile(code, 'exec')
 
-        exposed_context = {
-            'active': lambda name: name in self._interpreter.configuration,
-            'time': self._interpreter.time,
-            'send': lambda name, **kwargs: sent_events.append(InternalEvent(name, **kwargs)),
-            'notify': lambda name, **kwargs: sent_events.append(MetaEvent(name, **kwargs)),
-            'setdefault': self._setdefault,
-        }
-        exposed_context.update(additional_context if additional_context is not None else {})
+        sent_events = self._raised_events = []  # type: List[Event]
 
         try:
-            exec(compiled_code, exposed_context, self._context)  # type: ignore
+            exec(compiled_code, namespace, self._context)  # type: ignore
             return sent_events
         except Exception as e:
             raise CodeEvaluationError('"{}" occurred while executing "{}"'.format(e, code)) from e
 
+    def execute_action(self, transition: Transition, event: Optional[Event] = None) -> List[Event]:
+        """
+        Execute the action for given transition.
+        This method is called for every transition that is processed, even those with no *action*.
+
+        :param transition: the considered transition
+        :param event: instance of *Event* if any
+        :return: a list of sent events
+        """
+        if not transition.action:
+            return []
+
+        namespace = self._action_namespace
+        namespace['time'] = self._interpreter.time
+        namespace['event'] = event
+        return self._execute_in(transition.action, namespace)
+
     def evaluate_guard(self, transition: Transition, event: Optional[Event] = None) -> bool:
         """
         Evaluate the guard for given transition.
@@ -195,22 +414,31 @@ class PythonEvaluator(Evaluator):
         :param event: instance of *Event* if any
         :return: truth value of *code*
         """
-        additional_context = {
-            'after': (
-                lambda seconds: self._interpreter.time - seconds
-                >= self._interpreter._entry_time[transition.source]
-            ),
-            'idle': (
-                lambda seconds: self._interpreter.time - seconds
-                >= self._interpreter._idle_time[transition.source]
-            ),
-            'event': event,
-        }
-        return self._evaluate_code(
-            getattr(transition, 'guard', None),
-            additional_context=additional_context)
-
-    def evaluate_preconditions(self, obj, event: Optional[Event] = None) -> Iterator[str]:
+        self._current_state = transition.source
+
+        namespace = self._guard_namespace
+        namespace['time'] = self._interpreter.time
+        namespace['event'] = event
+        return self._evaluate_in(getattr(transition, 'guard', None), namespace)
+
+    def time_constraints(self, transition: Transition, *,
+                         necessary: bool = False) -> List[Tuple[str, float]]:
+        """
+        Return the time constraints that are involved in the guard of given transition,
+        ie. the calls to *after* and *idle* whose parameter is a constant number.
+
+        If *necessary* is True, only the calls that are leading operands of a top-level
+        conjunction are returned (e.g. *after(10)* in *after(10) and x > 2*).
+
+        :param transition: the considered transition
+        :param necessary: True to only return necessary constraints
+        :return: a possibly empty list of (kind, duration) pairs
+        """
+        if not transition.guard:
+            return []
+        return list(_time_constraints(transition.guard)[1 if necessary else 0])
+
+    def evaluate_preconditions(self, obj, event: Optional[Event] = None) -> Iterable[str]:
         """
         Evaluate the preconditions for given object (either a *StateMixin* or a
         *Transition*) and return a list of conditions that are not satisfied.
@@ -219,22 +447,22 @@ class PythonEvaluator(Evaluator):
         :param event: an optional *Event* instance, if any
         :return: list of unsatisfied conditions
         """
-        additional_context = {
-            'received': lambda name: name == getattr(event, 'name', None),
-            'sent': lambda name: name in [e.name for e in self._interpreter._sent_events],
-            'event': event,
-        }
-
         # Deal with __old__ in contracts, only required if there is an invariant or a postcondition
         if len(getattr(obj, 'invariants', [])) > 0 or len(getattr(obj, 'postconditions', [])) > 0:
             self._memory[id(obj)] = FrozenContext(self._context)
 
-        return filter(
-            lambda c: not self._evaluate_code(c, additional_context=additional_context),
-            getattr(obj, 'preconditions', [])
-        )
+        conditions = getattr(obj, 'preconditions', [])
+        if len(conditions) == 0:
+            return []
+
+        self._current_event = event
+
+        namespace = self._precondition_namespace
+        namespace['time'] = self._interpreter.time
+        namespace['event'] = event
+        return filter(lambda c: not self._evaluate_in(c, namespace), conditions)
 
-    def evaluate_invariants(self, obj, event: Optional[Event] = None) -> Iterator[str]:
+    def evaluate_invariants(self, obj, event: Optional[Event] = None) -> Iterable[str]:
         """
         Evaluate the invariants for given object (either a *StateMixin* or a
         *Transition*) and return a list of conditions that are not satisfied.
@@ -243,35 +471,9 @@ class PythonEvaluator(Evaluator):
         :param event: an optional *Event* instance, if any
         :return: list of unsatisfied conditions
         """
-        state_name = obj.source if isinstance(obj, Transition) else obj.name
-
-        additional_context = {
-            '__old__': self._memory.get(
-                id(obj),
-                None),
-            'after': (
-                lambda seconds: self._interpreter.time - seconds
-                >= self._interpreter._entry_time[state_name]
-            ),
-            'idle': (
-                lambda seconds: self._interpreter.time - seconds
-                >= self._interpreter._idle_time[state_name]
-            ),
-            'received': lambda name: name == getattr(
-                event,
-                'name',
-                None),
-            'sent': lambda name: name in [
-                e.name for e in self._interpreter._sent_events],
-            'event': event,
-        }
-
-        return filter(
-            lambda c: not self._evaluate_code(c, additional_context=additional_context),
-            getattr(obj, 'invariants', [])
-        )
-
-    def evaluate_postconditions(self, obj, event: Optional[Event] = None) -> Iterator[str]:
+        return self._evaluate_conditions(obj, getattr(obj, 'invariants', []), event)
+
+    def evaluate_postconditions(self, obj, event: Optional[Event] = None) -> Iterable[str]:
         """
         Evaluate the postconditions for given object (either a *StateMixin* or a
         *Transition*) and return a list of conditions that are not satisfied.
@@ -280,36 +482,38 @@ class PythonEvaluator(Evaluator):
         :param event: an optional *Event* instance, if any
         :return: list of unsatisfied conditions
         """
-        state_name = obj.source if isinstance(obj, Transition) else obj.name
-
-        additional_context = {
-            '__old__': self._memory.get(
-                id(obj),
-                None),
-            'after': (
-                lambda seconds: self._interpreter.time - seconds
-                >= self._interpreter._entry_time[state_name]
-            ),
-            'idle': (
-                lambda seconds: self._interpreter.time - seconds
-                >= self._interpreter._idle_time[state_name]
-            ),
-            'received': lambda name: name == getattr(
-                event,
-                'name',
-                None),
-            'sent': lambda name: name in [
-                e.name for e in self._interpreter._sent_events],
-            'event': event,
-        }
-
-        return filter(
-            lambda c: not self._evaluate_code(c, additional_context=additional_context),
-            getattr(obj, 'postconditions', [])
-        )
+        return self._evaluate_conditions(obj, getattr(obj, 'postconditions', []), event)
+
+    def _evaluate_conditions(self, obj, conditions: List[str],
+                             event: Optional[Event] = None) -> Iterable[str]:
+        """
+        Evaluate given invariants or postconditions for given object (either a *StateMixin*
+        or a *Transition*) and return a list of conditions that are not satisfied.
+
+        :param obj: the considered state or transition
+        :param conditions: the conditions to evaluate
+        :param event: an optional *Event* instance, if any
+        :return: list of unsatisfied conditions
+        """
+        if len(conditions) == 0:
+            return []
+
+        self._current_state = obj.source if isinstance(obj, Transition) else obj.name
+        self._current_event = event
+
+        namespace = self._condition_namespace
+        namespace['time'] = self._interpreter.time
+        namespace['__old__'] = self._memory.get(id(obj), None)
+        namespace['event'] = event
+        return filter(lambda c: not self._evaluate_in(c, namespace), conditions)
 
     def __getstate__(self):
         attributes = self.__dict__.copy()
-        attributes['_executable_code'] = dict()  # Code fragment cannot be pickled
-        attributes['_evaluable_code'] = dict()  # Code fragment cannot be pickled
+        for name in list(attributes):
+            if name.endswith('_namespace'):
+                del attributes[name]  # Namespaces contain builtins, and are recreated
         return attributes
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._create_namespaces()
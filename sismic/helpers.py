@@ -92,6 +92,8 @@ def run_in_background(interpreter: Interpreter,
 
     def stop_thread():
         interpreter._configuration = set()
+        interpreter._sorted_configuration = []
+        interpreter._frozen_configuration_cache = None
 
     thread.stop = stop_thread  # type: ignore
 
@@ -1,4 +1,5 @@
 from .default import Interpreter
+from .queue import EventQueue, TimerWheelQueue
 from ..model.events import Event, InternalEvent, MetaEvent
 
-__all__ = ['Interpreter', 'Event', 'InternalEvent', 'MetaEvent']
+__all__ = ['Interpreter', 'EventQueue', 'TimerWheelQueue', 'Event', 'InternalEvent', 'MetaEvent']
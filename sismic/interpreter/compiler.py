@@ -0,0 +1,346 @@
+import pprint
+import types
+
+from typing import (Any, Callable, Dict, FrozenSet, List, Mapping, Optional, Sequence, Set,
+                    Tuple, Type, Union, cast)
+
+from .default import Interpreter, _Candidates
+from .queue import EventQueue
+from ..clock import Clock
+from ..code import Evaluator, PythonEvaluator
+from ..io.datadict import export_to_dict, import_from_dict
+from ..model import (CompoundState, DeepHistoryState, Event, FinalState,
+                     MicroStep, OrthogonalState, ShallowHistoryState,
+                     Statechart, Transition)
+from ..utilities import sorted_groupby
+
+__all__ = ['CompiledInterpreter', 'generate_module', 'compile_statechart']
+
+
+class CompiledInterpreter(Interpreter):
+    """
+    Base class for the interpreters that are generated by *generate_module*.
+
+    A compiled interpreter follows the semantics of *Interpreter* but relies on static
+    tables and functions that are generated once for a given statechart, instead of
+    computing the candidate transitions and the steps to apply at each step:
+
+    - *DISPATCH* maps each state name to a mapping between event names (None for eventless
+      transitions) and the groups of transitions (as indexes) that can be triggered, by
+      decreasing priority;
+    - *STEPS* contains, for each transition, a function that creates the corresponding
+      micro step given the event, the transition and the active configuration;
+    - *STABILIZATION* maps state names to the kind of stabilization step they require.
+
+    The statechart of a compiled interpreter is shared by all its instances and must not be
+    modified. Code fragments (guards, actions, contracts) are compiled once, when the first
+    interpreter is created, and are evaluated by the evaluator of each interpreter.
+
+    :param evaluator_klass: see *Interpreter*
+    :param initial_context: see *Interpreter*
+    :param clock: see *Interpreter*
+    :param ignore_contract: see *Interpreter*
+    :param queue_klass: see *Interpreter*
+    :param queue_size: see *Interpreter*
+    :param queue_policy: see *Interpreter*
+    :param coalesce: see *Interpreter*
+    """
+
+    STATECHART = {}  # type: Mapping[str, Any]
+    DISPATCH = {}  # type: Mapping[str, Mapping[Optional[str], Sequence[Sequence[int]]]]
+    STEPS = ()  # type: Sequence[Callable[[Optional[Event], Transition, Set[str]], MicroStep]]
+    STABILIZATION = {}  # type: Mapping[str, Tuple[str, Any]]
+
+    _compiled = None  # type: Optional[Tuple[Statechart, Dict, Dict, Dict]]
+
+    def __init__(self, *,
+                 evaluator_klass: Callable[..., Evaluator] = PythonEvaluator,
+                 initial_context: Mapping[str, Any] = None,
+                 clock: Clock = None,
+                 ignore_contract: bool = False,
+                 queue_klass: Callable[[], EventQueue] = EventQueue,
+                 queue_size: int = None,
+                 queue_policy: str = 'block',
+                 coalesce: Mapping[str, Union[str, Callable[..., Mapping[str, Any]]]] = None
+                 ) -> None:
+        cls = type(self)
+        if cls.__dict__.get('_compiled', None) is None:
+            cls._prepare()
+
+        statechart, self._dispatch, self._steps, self._ignored = cast(tuple, cls._compiled)
+        super().__init__(
+            statechart,
+            evaluator_klass=evaluator_klass,
+            initial_context=initial_context,
+            clock=clock,
+            ignore_contract=ignore_contract,
+            queue_klass=queue_klass,
+            queue_size=queue_size,
+            queue_policy=queue_policy,
+            coalesce=coalesce,
+        )
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        # Step functions are keyed by transition id, see __setstate__
+        del state['_steps']
+        return state
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        # Transitions are copied when unpickled, so their ids changed
+        self._steps = {
+            id(transition): step
+            for transition, step in zip(self._statechart.transitions, self.STEPS)
+        }
+
+    @classmethod
+    def _prepare(cls) -> None:
+        """
+        Create the statechart shared by all the instances of this class, and resolve the
+        transition indexes of the static tables.
+        """
+        statechart = import_from_dict(cls.STATECHART)
+        PythonEvaluator.precompile(statechart)
+
+        transitions = statechart.transitions
+        dispatch = {
+            source: {
+                event: [[transitions[i] for i in group] for group in groups]
+                for event, groups in events.items()
+            } for source, events in cls.DISPATCH.items()
+        }
+        steps = {id(transition): step for transition, step in zip(transitions, cls.STEPS)}
+        # States to ignore once a transition of a source state is selected
+        ignored = {
+            name: frozenset(statechart.ancestors_for(name)).union([name])
+            for name in statechart.states
+        }
+
+        cls._compiled = (statechart, dispatch, steps, ignored)
+
+    def _compute_candidates(self, states: FrozenSet[str], event_name: Optional[str],
+                            eventless_first: bool,
+                            inner_first: bool) -> List[Tuple[bool, List[_Candidates]]]:
+        """
+        Compute the candidate transitions based on the static dispatch table, without having
+        to group and sort the transitions. See *Interpreter._compute_candidates*.
+        """
+        if not (eventless_first and inner_first):
+            return super()._compute_candidates(states, event_name, eventless_first, inner_first)
+
+        depth_for = self._statechart.depth_for
+        keys = [(False, None)]  # type: List[Tuple[bool, Optional[str]]]
+        if event_name is not None:
+            keys.append((True, event_name))
+
+        candidates = []
+        for has_event, key in keys:
+            sources = sorted(
+                (source for source in states if key in self._dispatch.get(source, {})),
+                key=lambda s: (-depth_for(s), s)
+            )
+            if len(sources) > 0:
+                candidates.append((has_event, [
+                    (source, self._dispatch[source][key], self._ignored[source])
+                    for source in sources
+                ]))
+        return candidates
+
+    def _create_steps(self, event: Optional[Event],
+                      transitions: Sequence[Transition]) -> List[MicroStep]:
+        """
+        Return the micro steps for given transitions, using the generated step functions.
+        See *Interpreter._create_steps*.
+        """
+        return [self._steps[id(transition)](event, transition, self._configuration)
+                for transition in transitions]
+
+    def _create_stabilization_step(self, names: Sequence[str]) -> Optional[MicroStep]:
+        """
+        Return a stabilization step based on the static stabilization table.
+        See *Interpreter._create_stabilization_step*.
+        """
+        if names is self._configuration:
+            frozen_names = self._frozen_configuration()
+        else:
+            frozen_names = frozenset(names)
+        leaf = self._cached(('stabilization', frozen_names), self._stabilization_leaf,
+                            frozen_names)
+        if leaf is None:
+            return None
+
+        kind, value = self.STABILIZATION[leaf]
+        if kind == 'final':
+            return MicroStep(exited_states=[leaf, cast(str, self._statechart.root)])
+        elif kind == 'history':
+            states_to_enter = cast(List[str], self._memory.get(leaf, [value]))
+            states_to_enter.sort(key=lambda x: (self._statechart.depth_for(x), x))
+            return MicroStep(entered_states=states_to_enter, exited_states=[leaf])
+        elif kind == 'orthogonal':
+            return MicroStep(entered_states=list(value))
+        else:  # 'compound'
+            return MicroStep(entered_states=[value])
+
+    def _stabilization_leaf(self, names: FrozenSet[str]) -> Optional[str]:
+        """
+        Return the deepest leaf of given states that requires a stabilization step, if any.
+        This only depends on the states, and is kept in cache, see *Interpreter._cached*.
+
+        :param names: state names to consider
+        :return: a state name, or None
+        """
+        leaves = sorted(self._statechart.leaf_for(names),
+                        key=lambda s: (-self._statechart.depth_for(s), s))
+        for leaf in leaves:
+            if leaf in self.STABILIZATION:
+                return leaf
+        return None
+
+
+def _generate_step(index: int, statechart: Statechart, transition: Transition) -> List[str]:
+    """
+    Return the lines of the function that creates the micro step for given transition.
+    """
+    lines = ['def _step_{}(event, transition, configuration):'.format(index),
+             '    # {}'.format(str(transition).replace('\n', ' '))]
+
+    if transition.target is None:
+        lines.append('    return MicroStep(event=event, transition=transition)')
+        return lines
+
+    lca = statechart.least_common_ancestor(transition.source, transition.target)
+
+    last_before_lca = transition.source
+    for state in statechart.ancestors_for(transition.source):
+        if state == lca:
+            break
+        last_before_lca = state
+    exited_states = statechart.descendants_for(last_before_lca)[::-1] + [last_before_lca]
+
+    entered_states = [transition.target]
+    for state in statechart.ancestors_for(transition.target):
+        if state == lca:
+            break
+        entered_states.insert(0, state)
+
+    lines.extend([
+        '    return MicroStep(',
+        '        event=event, transition=transition,',
+        '        entered_states={!r},'.format(entered_states),
+        '        exited_states=[name for name in {!r} if name in configuration],'.format(
+            tuple(exited_states)),
+        '    )',
+    ])
+    return lines
+
+
+def generate_module(statechart: Statechart, filepath: str = None) -> str:
+    """
+    Generate the source code of a Python module that contains a specialised interpreter
+    for given statechart. If a filepath is provided, also save the output to this file.
+
+    The generated module exposes an *Interpreter* class (a subclass of *CompiledInterpreter*)
+    that accepts the same named parameters than *sismic.interpreter.Interpreter* except the
+    statechart, and that provides the same API. The statechart itself is embedded in the
+    module, and a *statechart()* function returns a new instance of it.
+
+    :param statechart: statechart to compile
+    :param filepath: save output to given filepath, if provided
+    :return: source code of the module
+    """
+    data = export_to_dict(statechart)
+
+    # Tables are computed on the statechart that will be embedded in the module, so that
+    # transition indexes match.
+    statechart = import_from_dict(data)
+    transitions = statechart.transitions
+    indexes = {id(transition): i for i, transition in enumerate(transitions)}
+
+    dispatch = {}  # type: Dict[str, Dict[Optional[str], List[List[int]]]]
+    for source, events in statechart._index_transitions().items():
+        dispatch[source] = {}
+        for event, event_transitions in events.items():
+            groups = sorted_groupby(event_transitions, key=lambda t: t.priority, reverse=True)
+            dispatch[source][event] = [
+                [indexes[id(transition)] for transition in group] for _, group in groups]
+
+    stabilization = {}  # type: Dict[str, Tuple[str, Any]]
+    for name in statechart.states:
+        state = statechart.state_for(name)
+        if isinstance(state, FinalState) and statechart.parent_for(name) == statechart.root:
+            stabilization[name] = ('final', None)
+        elif isinstance(state, (ShallowHistoryState, DeepHistoryState)):
+            stabilization[name] = ('history', state.memory)
+        elif isinstance(state, OrthogonalState) and statechart.children_for(name):
+            stabilization[name] = ('orthogonal', tuple(sorted(statechart.children_for(name))))
+        elif isinstance(state, CompoundState) and state.initial:
+            stabilization[name] = ('compound', state.initial)
+
+    lines = [
+        '"""',
+        'Interpreter for statechart {!r}.'.format(statechart.name),
+        '',
+        'This module was generated by sismic.interpreter.compiler, do not edit it manually.',
+        '"""',
+        'from sismic.interpreter.compiler import CompiledInterpreter',
+        'from sismic.io.datadict import import_from_dict',
+        'from sismic.model import MicroStep',
+        '',
+        "__all__ = ['Interpreter', 'statechart']",
+        '',
+        '',
+        'STATECHART = {}'.format(pprint.pformat(data, indent=4)),
+        '',
+        'DISPATCH = {}'.format(pprint.pformat(dispatch, indent=4)),
+        '',
+        'STABILIZATION = {}'.format(pprint.pformat(stabilization, indent=4)),
+        '',
+    ]
+
+    for i, transition in enumerate(transitions):
+        lines.append('')
+        lines.extend(_generate_step(i, statechart, transition))
+        lines.append('')
+
+    lines.extend([
+        '',
+        'STEPS = ({})'.format(''.join('_step_{}, '.format(i) for i in range(len(transitions)))),
+        '',
+        '',
+        'def statechart():',
+        '    """',
+        '    Return a new instance of the compiled statechart.',
+        '    """',
+        '    return import_from_dict(STATECHART)',
+        '',
+        '',
+        'class Interpreter(CompiledInterpreter):',
+        '    STATECHART = STATECHART',
+        '    DISPATCH = DISPATCH',
+        '    STEPS = STEPS',
+        '    STABILIZATION = STABILIZATION',
+        '',
+    ])
+
+    output = '\n'.join(lines)
+
+    if filepath:
+        with open(filepath, 'w') as f:
+            f.write(output)
+
+    return output
+
+
+def compile_statechart(statechart: Statechart) -> Type[CompiledInterpreter]:
+    """
+    Generate a module for given statechart (see *generate_module*), load it and return
+    its *Interpreter* class.
+
+    :param statechart: statechart to compile
+    :return: a subclass of *CompiledInterpreter*
+    """
+    module = types.ModuleType('sismic_compiled_{}'.format(id(statechart)))
+    exec(compile(generate_module(statechart), '<{}>'.format(module.__name__), 'exec'),
+         module.__dict__)
+    return cast(Type[CompiledInterpreter], module.Interpreter)  # type: ignore
@@ -1,11 +1,14 @@
 import bisect
+import threading
 import warnings
 
+from collections import OrderedDict, deque
 from itertools import combinations
-from typing import (Any, Callable, Dict, Iterable, List, Mapping, Optional,
-                    Set, Tuple, Union, cast)
+from typing import (Any, Callable, Deque, Dict, FrozenSet, Iterable, List, Mapping,
+                    Optional, Set, Tuple, Union, cast)
 
 from .listener import InternalEventListener, PropertyStatechartListener
+from .queue import COALESCING_REDUCERS, EventQueue
 from ..utilities import sorted_groupby
 from ..clock import Clock, SimulatedClock, SynchronizedClock
 from ..code import Evaluator, PythonEvaluator
@@ -20,16 +23,8 @@ from ..model import (CompoundState, DeepHistoryState, Event,
 __all__ = ['Interpreter']
 
 
-class _KeyifyList():
-    def __init__(self, inner, key):
-        self.inner = inner
-        self.key = key
-
-    def __len__(self):
-        return len(self.inner)
-
-    def __getitem__(self, k):
-        return self.key(self.inner[k])
+# (source, transitions grouped by decreasing priority, states to ignore if one is selected)
+_Candidates = Tuple[str, List[List[Transition]], FrozenSet[str]]
 
 
 class Interpreter:
@@ -46,13 +41,39 @@ class Interpreter:
     :param clock: A BaseClock instance that will be used to set this interpreter internal time.
         By default, a SimulatedClock is used.
     :param ignore_contract: set to True to ignore contract checking during the execution.
+    :param queue_klass: An optional callable (e.g. a class) that returns an *EventQueue* instance.
+        It is used to create the queues of internal and external events. By default, the
+        *EventQueue* class is used. See also *TimerWheelQueue*.
+    :param queue_size: An optional bound on the number of pending external events.
+        By default, the number of pending external events is not bounded.
+    :param queue_policy: What to do when an event is queued while *queue_size* events are
+        pending, see *queue*. One of *QUEUE_POLICIES*, default to 'block'.
+    :param coalesce: An optional mapping from event names to reducers, to coalesce pending
+        external events with the same name, see *queue*. A reducer is either the name of one of
+        *COALESCING_REDUCERS* ('latest' or 'sum'), or a callable that receives the data of the
+        pending event and of the queued event, and returns the data of the coalesced event.
     """
 
+    #: Policies that can be applied when the bounded external queue is full, see *queue*.
+    QUEUE_POLICIES = ('block', 'drop newest', 'drop oldest', 'coalesce')
+
+    #: Maximal number of structures derived from the statechart that are kept in cache, such as
+    #: the candidate transitions for a (configuration, event name) pair, see *_cached*.
+    candidates_cache_size = 512
+
     def __init__(self, statechart: Statechart, *,
                  evaluator_klass: Callable[..., Evaluator] = PythonEvaluator,
                  initial_context: Mapping[str, Any] = None,
                  clock: Clock = None,
-                 ignore_contract: bool = False) -> None:
+                 ignore_contract: bool = False,
+                 queue_klass: Callable[[], EventQueue] = EventQueue,
+                 queue_size: int = None,
+                 queue_policy: str = 'block',
+                 coalesce: Mapping[str, Union[str, Callable[..., Mapping[str, Any]]]] = None
+                 ) -> None:
+        if queue_policy not in self.QUEUE_POLICIES:
+            raise ValueError('Unknown queue policy: {}'.format(queue_policy))
+
         # Internal variables
         self._ignore_contract = ignore_contract
         self._statechart = statechart
@@ -66,8 +87,12 @@ class Interpreter:
         # History states memory
         self._memory = {}  # type: Dict[str, Optional[List[str]]]
 
-        # Set of active states
+        # Set of active states, and (depth, name) pairs of active states in increasing order
         self._configuration = set()  # type: Set[str]
+        self._sorted_configuration = []  # type: List[Tuple[int, str]]
+
+        # Frozen copy of the active configuration, see _frozen_configuration
+        self._frozen_configuration_cache = None  # type: Optional[FrozenSet[str]]
 
         # Entry and idle times
         self._entry_time = dict()  # type: Dict[str, float]
@@ -76,12 +101,74 @@ class Interpreter:
         # Events sent during current macro step
         self._sent_events = []  # type: List[Event]
 
-        # Event queues
-        self._internal_queue = []  # type: List[Tuple[float, InternalEvent]]
-        self._external_queue = []  # type: List[Tuple[float, Event]]
+        # Events sent during current micro step, that are raised at its end, see _apply_step
+        self._unsent_events = []  # type: List[Event]
+
+        # Whether a step is being executed, see _select_event
+        self._executing = False
 
-        # Bound listeners
+        # Event queues
+        self._internal_queue = queue_klass()
+        self._external_queue = queue_klass()
+
+        # (time, event) pairs queued using *queue*, possibly from other threads, see _drain_inbox
+        self._inbox = deque()  # type: Deque[Tuple[float, Event]]
+
+        # Bound on pending external events, see queue. The lock is only used if there is a bound.
+        self._queue_size = queue_size
+        self._queue_policy = queue_policy
+        self._queue_lock = threading.Condition()
+        self._drop_requests = 0  # Number of oldest external events to drop, see _drain_inbox
+        self._overflow = []  # type: List[Tuple[float, Event]]  # To coalesce, see _drain_inbox
+        self._dropped_events = 0
+        self._coalesced_events = 0
+
+        # (event, coalesced event or None) pairs for the external events that were coalesced or
+        # dropped, possibly from other threads, and are still to be reported, see _discard
+        self._discarded = deque()  # type: Deque[Tuple[Event, Optional[Event]]]
+
+        # Reducers for the events to coalesce, and latest pending event for each name, with its
+        # time and the queued events it stands for (so that they can be cancelled)
+        self._reducers = {}  # type: Dict[str, Callable[..., Mapping[str, Any]]]
+        for name, reducer in (coalesce or {}).items():
+            if isinstance(reducer, str):
+                try:
+                    reducer = COALESCING_REDUCERS[reducer]
+                except KeyError:
+                    raise ValueError('Unknown reducer for event {}: {}'.format(name, reducer))
+            self._reducers[name] = reducer
+        self._coalescing = {}  # type: Dict[str, Tuple[float, Event, Tuple[Event, ...]]]
+
+        # Bound listeners, and the names of the meta-events they are attached to (None for all)
         self._listeners = []  # type: List[Callable[[MetaEvent], Any]]
+        self._subscriptions = []  # type: List[Optional[FrozenSet[str]]]
+
+        # Listeners for each meta-event name, and listeners for other names, see _update_routes
+        self._routes = {}  # type: Dict[str, List[Callable[[MetaEvent], Any]]]
+        self._unfiltered = []  # type: List[Callable[[MetaEvent], Any]]
+
+        # Callables that are notified when external events are queued, see AsyncRunner
+        self._queue_callbacks = []  # type: List[Callable[[], Any]]
+
+        # Callables that are notified when external events are dropped or coalesced, possibly
+        # from other threads, see AsyncInterpreter
+        self._discard_callbacks = []  # type: List[Callable[[Event, Optional[Event]], Any]]
+
+        # Warm up the transitions index, it is maintained by the statechart
+        self._statechart._index_transitions()
+
+        # Structures derived from the statechart, reset when it changes, see _check_revision
+        self._revision = self._statechart._revision
+
+        # Structures derived from the statechart, such as the candidate transitions per
+        # configuration and event, see _cached
+        self._candidates_cache = OrderedDict()  # type: OrderedDict
+
+        # Necessary time constraints of guards per source state, and (reference time, duration)
+        # pairs that must be satisfied for these guards to hold (per transition id),
+        # see _register_guard_timers
+        self._guard_timers = None  # type: Optional[Dict[str, List[Tuple[Transition, List[Tuple[str, float]]]]]]  # noqa: E501
+        self._guard_deadlines = {}  # type: Dict[int, List[Tuple[float, float]]]
 
         # Evaluator
         self._evaluator = evaluator_klass(self, initial_context=initial_context)
@@ -107,7 +194,30 @@ class Interpreter:
         List of active states names, ordered by depth. Ties are broken according to the
         lexicographic order on the state name.
         """
-        return sorted(self._configuration, key=lambda s: (self._statechart.depth_for(s), s))
+        return [name for _, name in self._sorted_configuration]
+
+    def is_active(self, name: str) -> bool:
+        """
+        Return True if and only if given state is in the active configuration.
+
+        :param name: name of a state
+        :return: True if given state is active
+        """
+        return name in self._configuration
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_queue_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._queue_lock = threading.Condition()
+
+        # Guard deadlines are keyed by transition ids, that are not preserved by pickling
+        self._guard_deadlines = {}
+        for name in self._configuration:
+            self._register_guard_timers(name)
 
     @property
     def context(self) -> Mapping[str, Any]:
@@ -123,6 +233,21 @@ class Interpreter:
         """
         return self._initialized and len(self._configuration) == 0
 
+    @property
+    def dropped_events(self) -> int:
+        """
+        Number of external events that were dropped because the external queue was full.
+        """
+        return self._dropped_events
+
+    @property
+    def coalesced_events(self) -> int:
+        """
+        Number of external events that were coalesced, either because the external queue was
+        full or because of the *coalesce* parameter of the interpreter.
+        """
+        return self._coalesced_events
+
     @property
     def statechart(self) -> Statechart:
         """
@@ -130,11 +255,13 @@ class Interpreter:
         """
         return self._statechart
 
-    def attach(self, listener: Callable[[MetaEvent], Any]) -> None:
+    def attach(self, listener: Callable[[MetaEvent], Any], events: Iterable[str] = None) -> None:
         """
         Attach given listener to the current interpreter.
 
-        The listener is called each time a meta-event is emitted by current interpreter.
+        The listener is called each time a meta-event is emitted by current interpreter, or
+        only for the meta-events whose name is in *events*, if provided. Meta-events are only
+        created if at least one listener is attached to them.
         Emitted meta-events are:
 
         - *step started*: when a (possibly empty) macro step starts. The current time of the step
@@ -142,6 +269,12 @@ class Interpreter:
         - *step ended*: when a (possibly empty) macro step ends.
         - *event consumed*: when an event is consumed. The consumed event is exposed through the
           ``event`` attribute.
+        - *event dropped*: when a pending external event is dropped, either because of the
+          *queue_policy*, or because an event it was coalesced with is cancelled. The dropped
+          event is exposed through the ``event`` attribute.
+        - *event coalesced*: when a pending external event is coalesced with another one, see
+          *queue*. The coalesced event and the event that takes its place are exposed
+          respectively through the ``event`` and ``into`` attributes.
         - *event sent*: when an event is sent. The sent event is exposed through the ``event``
           attribute.
         - *state exited*: when a state is exited. The exited state is exposed through the ``state``
@@ -158,8 +291,12 @@ class Interpreter:
         Consult ``sismic.interpreter.listener`` for common listeners/wrappers.
 
         :param listener: A callable that accepts meta-event instances.
+        :param events: An optional collection of meta-event names. By default, the listener
+            is called for every meta-event.
         """
         self._listeners.append(listener)
+        self._subscriptions.append(None if events is None else frozenset(events))
+        self._update_routes()
 
     def detach(self, listener: Callable[[MetaEvent], Any]) -> None:
         """
@@ -167,7 +304,26 @@ class Interpreter:
 
         :param listener: A previously attached listener.
         """
-        self._listeners.remove(listener)
+        index = self._listeners.index(listener)
+        del self._listeners[index]
+        del self._subscriptions[index]
+        self._update_routes()
+
+    def _update_routes(self) -> None:
+        """
+        Compute, for each meta-event name some listener is attached to, the list of listeners
+        to call, in the order they were attached.
+        """
+        pairs = list(zip(self._listeners, self._subscriptions))
+        names = set()  # type: Set[str]
+        for _, events in pairs:
+            names.update(events or ())
+
+        self._routes = {
+            name: [listener for listener, events in pairs if events is None or name in events]
+            for name in names
+        }
+        self._unfiltered = [listener for listener, events in pairs if events is None]
 
     def bind(self, interpreter_or_callable: Union['Interpreter', Callable[[
              Event], Any]]) -> Callable[[MetaEvent], Any]:
@@ -191,20 +347,29 @@ class Interpreter:
         else:
             listener = InternalEventListener(interpreter_or_callable)
 
-        self.attach(listener)
+        self.attach(listener, events=['event sent'])
 
         return listener
 
     def bind_property_statechart(
-            self, statechart: Statechart, *, interpreter_klass: Callable = None) -> Callable[
-            [MetaEvent],
-            Any]:
+            self, statechart: Statechart, *, interpreter_klass: Callable = None,
+            batched: bool = False) -> Callable[[MetaEvent], Any]:
         """
         Bind a property statechart to the current interpreter.
 
         A property statechart receives meta-events from the current interpreter depending on
         what happens. See ``attach`` method for a full list of meta-events.
 
+        Only the meta-events the property statechart can react to (see *Statechart.events_for*)
+        are forwarded to it. The property statechart is nevertheless executed at the beginning
+        of each step, so that it is initialized at the same time than the current interpreter,
+        and that its eventless transitions are considered.
+
+        If *batched* is set, the meta-events emitted during a macro step are buffered, and sent
+        at once to the property statechart when the step ends. The property statechart is then
+        executed only once per macro step, and a violation is reported at the end of the macro
+        step that caused it.
+
         The internal clock of all property statecharts is synced with the one of the current
         interpreter. As soon as a property statechart reaches a final state, a
         ``PropertyStatechartError`` will be raised, meaning that the property expressed by the
@@ -220,6 +385,7 @@ class Interpreter:
         :param statechart: A statechart instance.
         :param interpreter_klass: An optional callable that accepts a statechart as first parameter
             and a named parameter clock. Default to Interpreter.
+        :param batched: Send the meta-events to the property statechart once per macro step.
         :return: the resulting attached listener.
         """
         if isinstance(statechart, Interpreter):
@@ -233,8 +399,19 @@ class Interpreter:
             interpreter_klass = Interpreter if interpreter_klass is None else interpreter_klass
             interpreter = interpreter_klass(statechart, clock=SynchronizedClock(self))
 
-        listener = PropertyStatechartListener(interpreter)
-        self.attach(listener)
+        statechart = interpreter.statechart if isinstance(statechart, Interpreter) else statechart
+        if isinstance(statechart, Statechart):
+            # Only forward the meta-events the property statechart can react to, but execute
+            # it at each step, so that it starts at the same time than the current interpreter,
+            # and that its eventless transitions are considered.
+            events = statechart.events_for()
+            listener = PropertyStatechartListener(interpreter, events=events, batched=batched)
+            self.attach(listener, events=events + (
+                ['step started', 'step ended'] if batched else ['step started']))
+        else:
+            # Statechart is unknown, e.g. if it is provided by a custom interpreter_klass
+            listener = PropertyStatechartListener(interpreter, batched=batched)
+            self.attach(listener)
 
         return listener
 
@@ -250,16 +427,135 @@ class Interpreter:
         If named parameters are provided, they will be added to all events
         that are provided by name.
 
+        This method can be safely called from other threads while the interpreter is being
+        executed. Events are put in an inbox without locking, and are moved to the external
+        event queue at the beginning of the next call to `execute_once`.
+
+        If a *queue_size* was provided to the interpreter, the number of pending external events
+        is bounded, and producers are serialised using a lock. When an event is queued while
+        *queue_size* events are pending, the *queue_policy* of the interpreter applies:
+
+        - 'block': wait until an event is consumed. This requires the interpreter to be
+          executed in another thread.
+        - 'drop newest': the queued event is dropped.
+        - 'drop oldest': the pending event that was queued first is dropped. If this event is
+          already in the external event queue, it is dropped at the beginning of the next step.
+        - 'coalesce': the queued event replaces the latest pending event with the same name
+          that is not due before it, if any, and takes its place (and its time). Otherwise, it
+          is dropped. If the pending event is already in the external event queue, the
+          replacement is done at the beginning of the next step.
+
+        Independently of the bound, the *coalesce* parameter of the interpreter specifies the
+        names of the external events to coalesce. When such an event is moved to the external
+        queue while another event with the same name is pending, and is not due before the new
+        one, both events are merged using the corresponding reducer. A new event, with the
+        merged data, takes the place (and the time) of the pending one, the order of the other
+        events being preserved. Queued events are left unchanged, and cancelling any of them
+        cancels the merged event.
+
+        The numbers of dropped and coalesced events are available through *dropped_events* and
+        *coalesced_events*. These events are also reported to the listeners, with *event dropped*
+        and *event coalesced* meta-events, at the beginning of the next step.
+
         :param event_or_name: name of the event or Event instance
         :param event_or_names: additional events
         :param parameters: event parameters.
         :return: *self* so it can be chained.
         """
-        for event in [event_or_name] + list(event_or_names):
-            event = Event(event, **parameters) if isinstance(event, str) else event
-            self._queue_event(event)
+        now = self.time
+        events = [
+            Event(event, **parameters) if isinstance(event, str) else event
+            for event in [event_or_name] + list(event_or_names)
+        ]
+
+        if self._queue_size is None:
+            for event in events:
+                # Appending to a deque is thread-safe, see _drain_inbox
+                self._inbox.append((now + getattr(event, 'delay', 0), event))
+        else:
+            with self._queue_lock:
+                for event in events:
+                    self._queue_bounded(now + getattr(event, 'delay', 0), event)
+
+        for callback in self._queue_callbacks:
+            callback()
         return self
 
+    def cancel(self, event: Event) -> bool:
+        """
+        Cancel given event if it is still pending, ie. if it was queued (or sent from within
+        the statechart) but not yet processed. Cancelled events are never processed, and do
+        not lead to any step.
+
+        Notice that events are identified by their instance, not by their name. To cancel an
+        event queued using *queue*, provide an *Event* instance to *queue* and keep it as
+        a handle. Within the statechart, *send* returns such a handle, that can be cancelled as
+        soon as it is returned, including during the step that sent the event.
+
+        Unlike *queue*, this method is not thread-safe: it moves the events of the inbox to the
+        event queues, that are only modified by the thread executing the interpreter. It must
+        be called from that thread, e.g. from a listener or between two calls to *execute_once*.
+
+        :param event: an Event instance
+        :return: True if the event was pending and has been cancelled
+        """
+        self._drain_inbox()
+        if isinstance(event, InternalEvent):
+            # Events sent during current micro step are only queued at its end
+            for index, sent_event in enumerate(self._unsent_events):
+                if sent_event is event:
+                    del self._unsent_events[index]
+                    return True
+            return self._internal_queue.cancel(event)
+        cancelled = self._external_queue.cancel(event)
+        if not cancelled and event.name in self._coalescing:
+            _, pending, handles = self._coalescing[event.name]
+            if any(handle is event for handle in handles):
+                cancelled = self._external_queue.cancel(pending)
+                if cancelled and pending is not event:
+                    # Other events were coalesced into the pending one
+                    self._discard(pending)
+                    self._report_discarded()
+        if cancelled:
+            self._notify_producers()
+        return cancelled
+
+    def next_wakeup_time(self) -> Optional[float]:
+        """
+        Return the earliest time at which a call to *execute_once* could lead to a step,
+        or None if nothing is expected to happen until a new event is queued.
+
+        This time is computed based on the pending events (including delayed ones) and on
+        the deadlines implied by the calls to *after* and *idle* in the guards of the eventless
+        transitions of the active states, as reported by the evaluator (see
+        *Evaluator.time_constraints*). If a step could already be done, the returned value is
+        not greater than the time of the latest execution (see *time*).
+
+        Notice that guards depending on time in another way (e.g. relying on the *time*
+        variable, or on the context being modified outside the statechart) are not considered.
+
+        As for *cancel*, this method must be called from the thread executing the interpreter.
+
+        :return: a time value, or None
+        """
+        if not self._initialized:
+            return self.time
+
+        self._drain_inbox()
+        candidates = []
+        for queue in (self._internal_queue, self._external_queue):
+            head = queue.peek()
+            if head is not None:
+                candidates.append(head[0])
+
+        for source, kind, duration in self._time_constraints():
+            reference = self._entry_time if kind == 'after' else self._idle_time
+            deadline = reference[source] + duration
+            if deadline > self.time:
+                candidates.append(deadline)
+
+        return min(candidates) if len(candidates) > 0 else None
+
     def execute(self, max_steps: int = -1) -> List[MacroStep]:
         """
         Repeatedly calls *execute_once* and return a list containing
@@ -295,50 +591,260 @@ class Interpreter:
         """
         # Store time to have a consistent time value during this step
         self._time = self.clock.time
+        self._internal_queue.advance(self._time)
+        self._external_queue.advance(self._time)
+
+        self._executing = True
+        try:
+            # Move the events queued since the previous step to the external queue
+            self._drain_inbox(drop=True)
+
+            # Reset the list of events that were sent
+            self._sent_events.clear()
+
+            # Notify listeners
+            if self._listeners:
+                self._emit('step started', time=self.time)
+            self._report_discarded()
+
+            # Compute steps
+            computed_steps = self._compute_steps()
+
+            if len(computed_steps) > 0:
+
+                # Consume event if it triggered a transition
+                if computed_steps[0].event is not None:
+                    event = computed_steps[0].event
+                    self._consume_event(event)
+                    if self._listeners:
+                        self._emit('event consumed', event=event)
+                else:
+                    event = None
+
+                # Execute the steps
+                if hasattr(self._evaluator, 'on_step_starts'):
+                    warnings.warn('Evaluator.on_step_starts is deprecated since 1.4.0.',
+                                  DeprecationWarning)
+                    self._evaluator.on_step_starts(event)
+
+                executed_steps = []
+                for step in computed_steps:
+                    executed_steps.append(self._apply_step(step))
+                    executed_steps.extend(self._stabilize())
+
+                # type: Optional[MacroStep]
+                macro_step = MacroStep(time=self.time, steps=executed_steps)
+            else:  # No step
+                macro_step = None
+
+            # Check state invariants, use self.configuration to benefit from the sorting
+            configuration = self.configuration
+            for name in configuration:
+                state = self._statechart.state_for(name)
+                self._evaluate_contract_conditions(state, 'invariants', macro_step)
+
+            if self._listeners:
+                self._emit('step ended')
+
+            return macro_step
+        finally:
+            self._executing = False
+
+    def _queue_bounded(self, time: float, event: Event) -> None:
+        """
+        Put given event in the inbox, according to the bound and the policy of the external
+        queue. Must be called with *_queue_lock*.
 
-        # Reset the list of events that were sent
-        self._sent_events.clear()
+        :param time: time at which the event should be processed
+        :param event: event to queue
+        """
+        def pending():
+            return len(self._inbox) + len(self._external_queue) - self._drop_requests
+
+        if pending() >= self._queue_size:
+            if self._queue_policy == 'block':
+                while pending() >= self._queue_size:
+                    self._queue_lock.wait()
+            elif self._queue_policy == 'drop newest':
+                self._dropped_events += 1
+                self._discard(event)
+                return
+            elif self._queue_policy == 'drop oldest':
+                self._dropped_events += 1
+                if self._drop_requests < len(self._external_queue):
+                    # The oldest pending event is in the external queue, that is only modified
+                    # by the thread executing the interpreter.
+                    self._drop_requests += 1
+                else:
+                    self._discard(self._inbox.popleft()[1])
+            else:  # 'coalesce'
+                for index in range(len(self._inbox) - 1, -1, -1):
+                    if self._inbox[index][1].name == event.name and time <= self._inbox[index][0]:
+                        self._discard(self._inbox[index][1], event)
+                        self._inbox[index] = (self._inbox[index][0], event)
+                        self._coalesced_events += 1
+                        return
+                # The pending event may already be in the external queue, that is only
+                # modified by the thread executing the interpreter. At most one overflowing
+                # event is kept per name, and no more than there are events in that queue.
+                for index, (overflow_time, overflow) in enumerate(self._overflow):
+                    if overflow.name == event.name:
+                        if time <= overflow_time:
+                            self._discard(overflow, event)
+                            self._overflow[index] = (overflow_time, event)
+                            self._coalesced_events += 1
+                            return
+                        break
+                else:
+                    if len(self._overflow) < len(self._external_queue):
+                        self._overflow.append((time, event))
+                        return
+                self._dropped_events += 1
+                self._discard(event)
+                return
+        self._inbox.append((time, event))
+
+    def _drain_inbox(self, *, drop: bool = False) -> None:
+        """
+        Move the events that were queued using *queue* to the event queues, in bulk.
 
-        # Notify listeners
-        self._raise_event(MetaEvent('step started', time=self.time))
+        The inbox has multiple producers (the threads calling *queue*) and a single consumer
+        (the thread executing the interpreter). As both *append* and *popleft* are atomic
+        operations on a deque, no lock is needed, unless the external queue is bounded.
 
-        # Compute steps
-        computed_steps = self._compute_steps()
+        The events that were dropped or coalesced are reported to the listeners, unless a step
+        is being executed. In that case, they are reported by *execute_once*.
 
-        if len(computed_steps) > 0:
+        :param drop: apply the pending requests to drop the oldest external events, see
+            *_queue_bounded*. This should only be done when no event is being processed.
+        """
+        if self._queue_size is not None:
+            with self._queue_lock:
+                self._drain_inbox_unbounded()
+                if len(self._overflow) > 0:
+                    self._coalesce_overflow()
+                if drop:
+                    while self._drop_requests > 0:
+                        self._drop_requests -= 1
+                        if len(self._external_queue) > 0:
+                            self._discard(self._external_queue.pop()[1])
+        else:
+            self._drain_inbox_unbounded()
 
-            # Consume event if it triggered a transition
-            if computed_steps[0].event is not None:
-                event = self._select_event(consume=True)
-                self._raise_event(MetaEvent('event consumed', event=event))
+        if not self._executing:
+            self._report_discarded()
+
+    def _coalesce_overflow(self) -> None:
+        """
+        Put the events that were queued while the external queue was full (with the 'coalesce'
+        policy) in place of the latest pending external event with the same name, that is not
+        due before them. If there is
+        no such event, the queued event is dropped, unless an event was consumed in the
+        meantime. Must be called with *_queue_lock*.
+        """
+        for time, event in self._overflow:
+            latest = None
+            for pending_time, pending in self._external_queue:
+                if pending.name == event.name and time <= pending_time:
+                    latest = pending
+
+            if latest is not None:
+                self._external_queue.replace(latest, event)
+                self._discard(latest, event)
+                latest_time, coalescing, _ = self._coalescing.get(event.name, (None, None, ()))
+                if coalescing is latest:
+                    self._coalescing[event.name] = (latest_time, event, (event,))
+                self._coalesced_events += 1
+            elif len(self._external_queue) - self._drop_requests < self._queue_size:
+                self._external_queue.push(time, event)
             else:
-                event = None
+                self._dropped_events += 1
+                self._discard(event)
+        self._overflow.clear()
 
-            # Execute the steps
-            if hasattr(self._evaluator, 'on_step_starts'):
-                warnings.warn('Evaluator.on_step_starts is deprecated since 1.4.0.',
-                              DeprecationWarning)
-                self._evaluator.on_step_starts(event)
+    def _discard(self, event: Event, into: Event = None) -> None:
+        """
+        Notify the callbacks that given external event was dropped, or coalesced into another
+        one, and keep it to be reported to the listeners, provided that at least one listener
+        is attached to the corresponding meta-event. Can be called from any thread.
 
-            executed_steps = []
-            for step in computed_steps:
-                executed_steps.append(self._apply_step(step))
-                executed_steps.extend(self._stabilize())
+        :param event: the dropped or coalesced event
+        :param into: the event it was coalesced into, or None if it was dropped
+        """
+        for callback in self._discard_callbacks:
+            callback(event, into)
 
-            # type: Optional[MacroStep]
-            macro_step = MacroStep(time=self.time, steps=executed_steps)
-        else:  # No step
-            macro_step = None
+        name = 'event dropped' if into is None else 'event coalesced'
+        if self._routes.get(name, self._unfiltered):
+            self._discarded.append((event, into))
 
-        # Check state invariants
-        configuration = self.configuration  # Use self.configuration to benefit from the sorting
-        for name in configuration:
-            state = self._statechart.state_for(name)
-            self._evaluate_contract_conditions(state, 'invariants', macro_step)
+    def _report_discarded(self) -> None:
+        """
+        Emit an *event dropped* or *event coalesced* meta-event for each external event that was
+        dropped or coalesced since the last call. Must be called from the thread executing
+        the interpreter.
+        """
+        discarded = self._discarded
+        while len(discarded) > 0:
+            event, into = discarded.popleft()
+            if into is None:
+                self._emit('event dropped', event=event)
+            else:
+                self._emit('event coalesced', event=event, into=into)
 
-        self._raise_event(MetaEvent('step ended'))
+    def _notify_producers(self) -> None:
+        """
+        Wake up the producers that are waiting for an external event to be consumed, if the
+        external queue is bounded.
+        """
+        if self._queue_size is not None:
+            with self._queue_lock:
+                self._queue_lock.notify_all()
 
-        return macro_step
+    def _drain_inbox_unbounded(self) -> None:
+        """
+        Move the events that were queued using *queue* to the event queues, see *_drain_inbox*.
+        """
+        inbox = self._inbox
+        if len(inbox) == 0:
+            return
+
+        external = []  # type: List[Tuple[float, Event]]
+        for _ in range(len(inbox)):
+            time, event = inbox.popleft()
+            if isinstance(event, InternalEvent):
+                self._internal_queue.push(time, event)
+            elif event.name in self._reducers:
+                # Keep insertion order with respect to the other external events
+                self._external_queue.extend(external)
+                external.clear()
+                self._coalesce_event(time, event)
+            else:
+                external.append((time, event))
+        self._external_queue.extend(external)
+
+    def _coalesce_event(self, time: float, event: Event) -> None:
+        """
+        Put given external event in the external queue, or coalesce it with the latest pending
+        event with the same name, see *queue*.
+
+        :param time: time at which the event should be processed
+        :param event: event to queue
+        """
+        pending_time, pending, handles = self._coalescing.get(event.name, (None, None, ()))
+        # The merged event keeps the time of the pending event, so that the queued event is
+        # not processed earlier than expected
+        if pending is not None and time <= pending_time:
+            merged = Event(event.name, **self._reducers[event.name](pending.data, event.data))
+            if self._external_queue.replace(pending, merged):
+                self._coalescing[event.name] = (pending_time, merged, handles + (event,))
+                self._coalesced_events += 1
+                self._discard(pending, merged)
+                self._discard(event, merged)
+                return
+
+        self._external_queue.push(time, event)
+        self._coalescing[event.name] = (time, event, (event,))
 
     def _queue_event(self, event: Event):
         """
@@ -346,17 +852,8 @@ class Interpreter:
 
         :param event: Event to queue.
         """
-        if isinstance(event, InternalEvent):
-            queue = cast(List[Tuple[float, Event]], self._internal_queue)
-        else:
-            queue = self._external_queue
-
-        time = self.time + getattr(event, 'delay', 0)
-        position = bisect.bisect_right(  # type: ignore
-            _KeyifyList(queue, lambda t: (t[0], not isinstance(t[1], InternalEvent))),
-            (time, not isinstance(event, InternalEvent))
-        )
-        queue.insert(position, (time, event))
+        queue = self._internal_queue if isinstance(event, InternalEvent) else self._external_queue
+        queue.push(self.time + getattr(event, 'delay', 0), event)
 
     def _raise_event(self, event: Union[InternalEvent, MetaEvent]) -> None:
         """
@@ -368,37 +865,74 @@ class Interpreter:
         """
         if isinstance(event, InternalEvent):
             self._queue_event(event)
-            self._raise_event(MetaEvent('event sent', event=event))
-            if hasattr(event, 'delay'):
-                # Deprecated since 1.4.0
-                self._raise_event(MetaEvent('delayed event sent', event=event))
+            if self._listeners:
+                self._emit('event sent', event=event)
+                if hasattr(event, 'delay'):
+                    # Deprecated since 1.4.0
+                    self._emit('delayed event sent', event=event)
         elif isinstance(event, MetaEvent):
-            for listener in self._listeners:
+            for listener in self._routes.get(event.name, self._unfiltered):
                 listener(event)
         else:
             raise ValueError(
                 'Only InternalEvent and MetaEvent can be sent by a statechart, not {}'.format(
                     type(event)))
 
+    def _emit(self, name: str, **data: Any) -> None:
+        """
+        Create and raise a meta-event with given name and data, provided that at least one
+        listener is attached to it.
+
+        :param name: name of the meta-event
+        :param data: data of the meta-event
+        """
+        listeners = self._routes.get(name, self._unfiltered)
+        if listeners:
+            event = MetaEvent(name, **data)
+            for listener in listeners:
+                listener(event)
+
     def _select_event(self, *, consume: bool = False) -> Optional[Event]:
         """
         Return the next event to process.
-        Internal events have priority over external ones.
+        Internal events have priority over external ones. During a step, events queued using
+        *queue* are only considered once the inbox is drained, at the beginning of the next
+        call to *execute_once*. Outside a step, the inbox is drained first.
 
         :param consume: Indicates whether event should be consumed, default to False.
         :return: An instance of Event or None if no event is available
         """
-        for queue in cast(
-                Tuple[List[Tuple[float, Event]]],
-                (self._internal_queue, self._external_queue)):
-            if len(queue) > 0:
-                time, event = queue[0]
-                if time <= self.time:
-                    if consume:
-                        queue.pop(0)
-                    return event
+        if not self._executing:
+            self._drain_inbox()
+
+        for queue in (self._internal_queue, self._external_queue):
+            head = queue.ready(self.time)
+            if head is not None:
+                if consume:
+                    queue.pop()
+                    if queue is self._external_queue:
+                        self._notify_producers()
+                return head[1]
         return None
 
+    def _consume_event(self, event: Event) -> None:
+        """
+        Remove given event from the event queues. The event must have been returned by
+        *_select_event* during the current step.
+
+        The inbox is not drained in between, so given event is still at the head of its queue,
+        and has not been coalesced with an event queued in the meantime.
+
+        :param event: event to consume
+        """
+        for queue in (self._internal_queue, self._external_queue):
+            head = queue.peek()
+            if head is not None and head[1] is event:
+                queue.pop()
+                if queue is self._external_queue:
+                    self._notify_producers()
+                return
+
     def _select_transitions(self, event: Optional[Event], states: Iterable[str], *,
                             eventless_first=True, inner_first=True) -> List[Transition]:
         """
@@ -415,79 +949,280 @@ class Interpreter:
         :return: list of triggered transitions.
         """
         selected_transitions = []  # type: List[Transition]
+        ignored_states = set()  # type: Set[str]
+
+        candidates = self._candidate_transitions(
+            getattr(event, 'name', None), states,
+            eventless_first=eventless_first, inner_first=inner_first)
+
+        for has_event, sources in candidates:
+            # If there are selected transitions (from previous group), ignore new ones
+            if len(selected_transitions) > 0:
+                break
+
+            # Event shouldn't be exposed to guards if we're processing eventless transition
+            exposed_event = event if has_event else None
+
+            for source, priority_groups, ignored_by_source in sources:
+                # Do not considered ignored states
+                if source in ignored_states:
+                    continue
+
+                for transitions in priority_groups:
+                    has_found_transitions = False
+                    for transition in transitions:
+                        if transition.guard is None or (
+                                not self._guard_cannot_hold(transition)
+                                and self._evaluator.evaluate_guard(transition, exposed_event)):
+                            # Add transition to the list of selected ones
+                            selected_transitions.append(transition)
+                            has_found_transitions = True
+
+                    # Ignore ancestors/descendants w.r.t. inner-first/source state, and
+                    # current state, as we found transitions in a higher priority class
+                    if has_found_transitions:
+                        ignored_states.update(ignored_by_source)
+                        break
+
+        return selected_transitions
+
+    def _candidate_transitions(self, event_name: Optional[str], states: Iterable[str], *,
+                               eventless_first=True,
+                               inner_first=True) -> List[Tuple[bool, List[_Candidates]]]:
+        """
+        Return the transitions that could be triggered for given event name and given states,
+        in the order in which their guards have to be evaluated.
+
+        Transitions are grouped by whether they have an event (eventless first or last),
+        then by source state (in order of depth, w.r.t. inner-first/source state semantics),
+        and finally by decreasing priority. Each source state is accompanied by the set of
+        states to ignore if one of its transitions is selected.
+
+        As these groups only depend on the statechart structure and on the parameters,
+        they are kept in a bounded LRU cache, which is reset when the statechart is modified.
+
+        :param event_name: name of the event to consider, possibly None.
+        :param states: state names to consider.
+        :param eventless_first: True to prioritize eventless transitions.
+        :param inner_first: True to follow inner-first/source state semantics.
+        :return: list of (has_event, [(source, priority groups, ignored states)]) pairs.
+        """
+        if states is self._configuration:
+            frozen_states = self._frozen_configuration()
+        else:
+            frozen_states = frozenset(states)
+        return self._cached(
+            (frozen_states, event_name, eventless_first, inner_first),
+            self._compute_candidates, frozen_states, event_name, eventless_first, inner_first)
+
+    def _compute_candidates(self, states: FrozenSet[str], event_name: Optional[str],
+                            eventless_first: bool,
+                            inner_first: bool) -> List[Tuple[bool, List[_Candidates]]]:
+        """
+        Compute the candidate transitions for given states and event name, see
+        *_candidate_transitions*.
+
+        :param states: state names to consider.
+        :param event_name: name of the event to consider, possibly None.
+        :param eventless_first: True to prioritize eventless transitions.
+        :param inner_first: True to follow inner-first/source state semantics.
+        :return: list of (has_event, [(source, priority groups, ignored states)]) pairs.
+        """
         considered_transitions = []  # type: List[Transition]
         _state_depth_cache = dict()  # type: Dict[str, int]
 
         # Select triggerable (based on event) transitions for considered states
-        for transition in self._statechart.transitions:
-            if transition.source in states:
-                if transition.event is None or transition.event == getattr(event, 'name', None):
-                    # Compute order based on depth
-                    if transition.source not in _state_depth_cache:
-                        _state_depth_cache[transition.source] = self._statechart.depth_for(
-                            transition.source)
+        transitions_index = self._statechart._index_transitions()
+        for source in states:
+            transitions_for_source = transitions_index.get(source, None)
+            if transitions_for_source is None:
+                continue
+
+            transitions = transitions_for_source.get(None, [])
+            if event_name is not None:
+                transitions = transitions + transitions_for_source.get(event_name, [])
 
-                    considered_transitions.append(transition)
+            if len(transitions) > 0:
+                # Compute order based on depth
+                _state_depth_cache[source] = self._statechart.depth_for(source)
+                considered_transitions.extend(transitions)
 
         # Which states should be selected to satisfy depth ordering?
         if inner_first:
             ignored_state_selector = self._statechart.ancestors_for
         else:
             ignored_state_selector = self._statechart.descendants_for
-        ignored_states = set()  # type: Set[str]
 
         # Group and sort transitions based on the event
         def eventless_first_order(t):
             return t.event is not None
 
+        # Group and sort transitions based on the source state depth
+        def depth_order(t):
+            return _state_depth_cache[t.source]
+
+        # Group and sort transitions based on the source state
+        def state_order(t):
+            return t.source  # we just want states to be grouped here
+
+        # Group and sort transitions based on their priority
+        def priority_order(t):
+            return t.priority
+
+        candidates = []
         for has_event, transitions in sorted_groupby(
                 considered_transitions, key=eventless_first_order, reverse=not eventless_first):
-            # If there are selected transitions (from previous group), ignore new ones
-            if len(selected_transitions) > 0:
-                break
+            sources = []  # type: List[_Candidates]
+            for _, transitions in sorted_groupby(transitions, key=depth_order, reverse=inner_first):
+                for source, transitions in sorted_groupby(transitions, key=state_order):
+                    sources.append((
+                        source,
+                        [group for _, group in sorted_groupby(
+                            transitions, key=priority_order, reverse=True)],
+                        frozenset(ignored_state_selector(source)).union([source]),
+                    ))
+            candidates.append((has_event, sources))
 
-            # Event shouldn't be exposed to guards if we're processing eventless transition
-            exposed_event = event if has_event else None
+        return candidates
 
-            # Group and sort transitions based on the source state depth
-            def depth_order(t):
-                return _state_depth_cache[t.source]
+    def _cached(self, key: Tuple, compute: Callable[..., Any], *args: Any) -> Any:
+        """
+        Return the structure derived from the statechart that is kept in cache for given key,
+        or compute it by calling *compute* with given arguments, and keep it in cache.
 
-            for _, transitions in sorted_groupby(transitions, key=depth_order, reverse=inner_first):
-                # Group and sort transitions based on the source state
-                def state_order(t):
-                    return t.source  # we just want states to be grouped here
+        These structures are kept in a single LRU cache, bounded by *candidates_cache_size*,
+        which is reset when the statechart is modified.
 
-                for source, transitions in sorted_groupby(transitions, key=state_order):
-                    # Do not considered ignored states
-                    if source in ignored_states:
-                        continue
+        :param key: a hashable key, that identifies the structure
+        :param compute: a callable that computes the structure
+        :param args: arguments for *compute*
+        :return: the cached or computed structure
+        """
+        self._check_revision()
+
+        cache = self._candidates_cache
+        try:
+            value = cache[key]
+        except KeyError:
+            value = compute(*args)
+            cache[key] = value
+            if len(cache) > self.candidates_cache_size:
+                cache.popitem(last=False)
+        else:
+            cache.move_to_end(key)
+        return value
 
-                    has_found_transitions = False
+    def _check_revision(self) -> None:
+        """
+        Reset the structures that are derived from the statechart if the statechart
+        was modified since they were computed.
+        """
+        if self._revision != self._statechart._revision:
+            self._revision = self._statechart._revision
+            self._candidates_cache.clear()
+            self._guard_timers = None
+            self._guard_deadlines.clear()
 
-                    # Group and sort transitions based on their priority
-                    def priority_order(t):
-                        return t.priority
-
-                    for _, transitions in sorted_groupby(
-                            transitions, key=priority_order, reverse=True):
-                        for transition in transitions:
-                            if transition.guard is None or self._evaluator.evaluate_guard(
-                                    transition, exposed_event):
-                                # Add transition to the list of selected ones
-                                selected_transitions.append(transition)
-                                has_found_transitions = True
-
-                        # Ignore ancestors/descendants w.r.t. inner-first/source state
-                        if has_found_transitions:
-                            for state in ignored_state_selector(source):
-                                ignored_states.add(state)
-                            # Also ignore current state, as we found transitions in a higher
-                            # priority class
-                            ignored_states.add(source)
-                            break
+    def _frozen_configuration(self) -> FrozenSet[str]:
+        """
+        Return the active configuration as a frozenset. The frozenset is computed once
+        for each configuration, and reset whenever a state is entered or exited.
 
-        return selected_transitions
+        :return: a frozenset of active state names
+        """
+        if self._frozen_configuration_cache is None:
+            self._frozen_configuration_cache = frozenset(self._configuration)
+        return self._frozen_configuration_cache
+
+    def _accepted_events(self) -> FrozenSet[str]:
+        """
+        Return the names of the events for which at least one transition is defined in the
+        active configuration. Any other event can only be consumed without triggering a
+        transition. These names are kept in cache for each configuration, see *_cached*.
+
+        :return: a frozenset of event names
+        """
+        configuration = self._frozen_configuration()
+        return self._cached(('accepted events', configuration), self._compute_accepted_events,
+                            configuration)
+
+    def _compute_accepted_events(self, configuration: FrozenSet[str]) -> FrozenSet[str]:
+        """
+        Compute the names of the events accepted by given configuration, see
+        *_accepted_events*.
+
+        :param configuration: a frozenset of state names
+        :return: a frozenset of event names
+        """
+        return frozenset(self._statechart.events_for(list(configuration)))
+
+    def _time_constraints(self) -> List[Tuple[str, str, float]]:
+        """
+        Return the time constraints (see *Evaluator.time_constraints*) of the eventless
+        transitions of the active states, as (source, kind, duration) triples.
+        These constraints are kept in cache for each configuration, see *_cached*.
+
+        :return: a list of (source, kind, duration) triples
+        """
+        configuration = self._frozen_configuration()
+        return self._cached(('time constraints', configuration),
+                            self._compute_time_constraints, configuration)
+
+    def _compute_time_constraints(self,
+                                  configuration: FrozenSet[str]) -> List[Tuple[str, str, float]]:
+        """
+        Compute the time constraints of the eventless transitions of given configuration, see
+        *_time_constraints*.
+
+        :param configuration: a frozenset of state names
+        :return: a list of (source, kind, duration) triples
+        """
+        transitions_index = self._statechart._index_transitions()
+        return [
+            (source, kind, duration)
+            for source in sorted(configuration)
+            for transition in transitions_index.get(source, {}).get(None, [])
+            for kind, duration in self._evaluator.time_constraints(transition)
+        ]
+
+    def _register_guard_timers(self, source: str) -> None:
+        """
+        Register, for each transition of given source state whose guard has necessary time
+        constraints (see *Evaluator.time_constraints*), the (reference time, duration) pairs
+        that must be satisfied for this guard to hold, ie. *time - duration >= reference*.
+        This method is called whenever given state is entered or becomes idle.
+
+        :param source: name of a state
+        """
+        self._check_revision()
+        if self._guard_timers is None:
+            self._guard_timers = {}
+            for transition in self._statechart.transitions:
+                constraints = self._evaluator.time_constraints(transition, necessary=True)
+                if len(constraints) > 0:
+                    self._guard_timers.setdefault(transition.source, []).append(
+                        (transition, constraints))
+
+        for transition, constraints in self._guard_timers.get(source, []):
+            self._guard_deadlines[id(transition)] = [
+                ((self._entry_time if kind == 'after' else self._idle_time)[source], duration)
+                for kind, duration in constraints
+            ]
+
+    def _guard_cannot_hold(self, transition: Transition) -> bool:
+        """
+        Return True if the guard of given transition cannot hold at current time, based on
+        the time constraints registered by *_register_guard_timers*. In that case, there is
+        no need to evaluate this guard.
+
+        :param transition: a transition
+        :return: True if the guard is known to be False
+        """
+        deadlines = self._guard_deadlines.get(id(transition), None)
+        if deadlines is None:
+            return False
+        time = self.time
+        return any(time - duration < reference for reference, duration in deadlines)
 
     def _sort_transitions(self, transitions: List[Transition]) -> List[Transition]:
         """
@@ -525,8 +1260,9 @@ class Interpreter:
                             break
                         last_before_lca = state
                     # Target must be a descendant (or self) of this state
-                    if (transition.target and (transition.target not in [
-                            last_before_lca] + self._statechart.descendants_for(last_before_lca))):
+                    descendants = self._statechart._hierarchy().descendants_set[last_before_lca]
+                    if (transition.target and transition.target != last_before_lca
+                            and transition.target not in descendants):
                         raise ConflictingTransitionsError(
                             'Conflicting transitions: {t1} and {t2}'
                             '\nConfiguration is {c}\nEvent is {e}\nTransitions are:{t}\n'
@@ -553,7 +1289,11 @@ class Interpreter:
 
         # Select transitions
         event = self._select_event()
-        transitions = self._select_transitions(event, states=self._configuration)
+        if event is not None and event.name not in self._accepted_events():
+            # No active state can handle this event, only eventless transitions can be selected
+            transitions = self._select_transitions(None, states=self._configuration)
+        else:
+            transitions = self._select_transitions(event, states=self._configuration)
 
         # No transition can be triggered?
         if len(transitions) == 0:
@@ -674,7 +1414,7 @@ class Interpreter:
 
         active_configuration = set(self._configuration)  # Copy
 
-        sent_events = []  # type: List[Event]
+        sent_events = self._unsent_events = []  # type: List[Event]
 
         # Exit states
         for state in exited_states:
@@ -701,12 +1441,16 @@ class Interpreter:
 
             # Remove state from active configuration
             self._configuration.remove(state.name)
+            self._frozen_configuration_cache = None
+            del self._sorted_configuration[bisect.bisect_left(
+                self._sorted_configuration, (self._statechart.depth_for(state.name), state.name))]
 
             # Postconditions
             self._evaluate_contract_conditions(state, 'postconditions', step)
 
             # Notify properties
-            self._raise_event(MetaEvent('state exited', state=state.name))
+            if self._listeners:
+                self._emit('state exited', state=state.name)
 
         # Execute transition
         if step.transition:
@@ -722,14 +1466,16 @@ class Interpreter:
 
             # Update idle time
             self._idle_time[step.transition.source] = self.time
+            self._register_guard_timers(step.transition.source)
 
             # Notify properties
-            self._raise_event(MetaEvent(
-                'transition processed',
-                source=step.transition.source,
-                target=step.transition.target,
-                event=step.event
-            ))
+            if self._listeners:
+                self._emit(
+                    'transition processed',
+                    source=step.transition.source,
+                    target=step.transition.target,
+                    event=step.event
+                )
 
         # Enter states
         for state in entered_states:
@@ -741,13 +1487,19 @@ class Interpreter:
 
             # Update configuration
             self._configuration.add(state.name)
+            self._frozen_configuration_cache = None
+            bisect.insort(
+                self._sorted_configuration, (self._statechart.depth_for(state.name), state.name))
             self._entry_time[state.name] = self.time
             self._idle_time[state.name] = self.time
+            self._register_guard_timers(state.name)
 
             # Notify properties
-            self._raise_event(MetaEvent('state entered', state=state.name))
+            if self._listeners:
+                self._emit('state entered', state=state.name)
 
         # Send events
+        self._unsent_events = []
         for event in cast(Union[InternalEvent, MetaEvent], sent_events):
             self._raise_event(event)
             self._sent_events.append(event)
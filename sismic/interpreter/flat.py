@@ -0,0 +1,176 @@
+from typing import (Any, Callable, Dict, FrozenSet, Iterable, List, Mapping, Optional,
+                    Tuple, Union, cast)
+
+from .default import Interpreter
+from .queue import EventQueue
+from ..clock import Clock
+from ..code import Evaluator, PythonEvaluator
+from ..model import (DeepHistoryState, MicroStep, ShallowHistoryState, Statechart,
+                     Transition)
+
+__all__ = ['FlattenedInterpreter']
+
+
+_StepTemplate = Tuple[Optional[Transition], List[str], List[str]]
+
+
+class FlattenedInterpreter(Interpreter):
+    """
+    An interpreter that follows the semantics of *Interpreter*, but that memoises the steps
+    to apply for statecharts whose execution only depends on the active configuration and
+    on the name of the event being processed.
+
+    This is the case for statecharts that have neither guards nor history states.
+    For these statecharts, the steps to apply (the transitions that are processed, and the
+    states that are exited and entered) are computed once for each reachable configuration
+    and event name, the first time they are encountered. Subsequent steps only require a
+    dictionary lookup, followed by the execution of the actions and the contracts.
+
+    Whether the statechart qualifies is checked when the interpreter is created, and again
+    whenever the structure of the statechart changes. If it does not qualify, the
+    interpreter falls back on the algorithm of *Interpreter*.
+
+    :param statechart: statechart to interpret
+    :param evaluator_klass: see *Interpreter*
+    :param initial_context: see *Interpreter*
+    :param clock: see *Interpreter*
+    :param ignore_contract: see *Interpreter*
+    :param queue_klass: see *Interpreter*
+    :param queue_size: see *Interpreter*
+    :param queue_policy: see *Interpreter*
+    :param coalesce: see *Interpreter*
+    """
+
+    def __init__(self, statechart: Statechart, *,
+                 evaluator_klass: Callable[..., Evaluator] = PythonEvaluator,
+                 initial_context: Mapping[str, Any] = None,
+                 clock: Clock = None,
+                 ignore_contract: bool = False,
+                 queue_klass: Callable[[], EventQueue] = EventQueue,
+                 queue_size: int = None,
+                 queue_policy: str = 'block',
+                 coalesce: Mapping[str, Union[str, Callable[..., Mapping[str, Any]]]] = None
+                 ) -> None:
+        # Memoised steps, see _flat_tables
+        self._flat_revision = None  # type: Optional[int]
+        self._flat_steps = None  # type: Optional[Dict[Tuple[FrozenSet[str], Optional[str]], List[_StepTemplate]]]  # noqa: E501
+        self._flat_stabilization = None  # type: Optional[Dict[FrozenSet[str], Optional[_StepTemplate]]]  # noqa: E501
+
+        super().__init__(
+            statechart,
+            evaluator_klass=evaluator_klass,
+            initial_context=initial_context,
+            clock=clock,
+            ignore_contract=ignore_contract,
+            queue_klass=queue_klass,
+            queue_size=queue_size,
+            queue_policy=queue_policy,
+            coalesce=coalesce,
+        )
+        self._flat_tables()
+
+    @staticmethod
+    def supports(statechart: Statechart) -> bool:
+        """
+        Return True if the steps of given statechart only depend on the active configuration
+        and on the name of the event being processed, ie. if it has neither guards nor
+        history states.
+
+        :param statechart: a statechart
+        :return: True if given statechart can be executed using memoised steps
+        """
+        if any(transition.guard is not None for transition in statechart.transitions):
+            return False
+        return not any(
+            isinstance(statechart.state_for(name), (ShallowHistoryState, DeepHistoryState))
+            for name in statechart.states
+        )
+
+    @property
+    def flattened(self) -> bool:
+        """
+        True if this interpreter currently relies on memoised steps.
+        """
+        return self._flat_tables()[0] is not None
+
+    def _flat_tables(self) -> Tuple[Optional[Dict], Optional[Dict]]:
+        """
+        Return the dictionaries of memoised steps and memoised stabilization steps, or
+        (None, None) if the statechart does not qualify. Dictionaries are reset whenever
+        the structure of the statechart changes.
+
+        :return: a pair of dictionaries, or (None, None)
+        """
+        if self._flat_revision != self._statechart._revision:
+            self._flat_revision = self._statechart._revision
+            if self.supports(self._statechart):
+                self._flat_steps, self._flat_stabilization = {}, {}
+            else:
+                self._flat_steps, self._flat_stabilization = None, None
+        return self._flat_steps, self._flat_stabilization
+
+    def _compute_steps(self) -> List[MicroStep]:
+        """
+        Compute and returns the next steps based on current configuration and event queues.
+        Steps are memoised per configuration and event name. See *Interpreter._compute_steps*.
+
+        :return: a possibly empty list of steps
+        """
+        steps_table = self._flat_tables()[0]
+        if steps_table is None or not self._initialized:
+            return super()._compute_steps()
+
+        event = self._select_event()
+        event_name = getattr(event, 'name', None)
+        if event_name is not None and event_name not in self._accepted_events():
+            # No active state can handle this event, only eventless transitions can be selected
+            event_name = None
+        key = (self._frozen_configuration(), event_name)
+
+        templates = steps_table.get(key, None)
+        if templates is None:
+            exposed_event = None if event_name is None else event
+            transitions = self._select_transitions(exposed_event, states=self._configuration)
+            transitions = self._sort_transitions(transitions)
+            templates = [
+                (step.transition, step.entered_states, step.exited_states)
+                for step in self._create_steps(None, transitions)
+            ]
+            steps_table[key] = templates
+
+        if len(templates) == 0:
+            # Empty step, so that event is eventually consumed
+            return [] if event is None else [MicroStep(event=event)]
+
+        # Should the step consume an event?
+        event = None if cast(Transition, templates[0][0]).event is None else event
+        return [
+            MicroStep(event=event, transition=transition, entered_states=list(entered),
+                      exited_states=list(exited))
+            for transition, entered, exited in templates
+        ]
+
+    def _create_stabilization_step(self, names: Iterable[str]) -> Optional[MicroStep]:
+        """
+        Return a stabilization step. Stabilization steps are memoised per configuration.
+        See *Interpreter._create_stabilization_step*.
+
+        :param names: List of states to consider (usually, the active configuration)
+        :return: A *MicroStep* instance or *None* if this statechart can not be more stabilized
+        """
+        stabilization_table = self._flat_tables()[1]
+        if stabilization_table is None:
+            return super()._create_stabilization_step(names)
+
+        key = self._frozen_configuration() if names is self._configuration else frozenset(names)
+        try:
+            template = stabilization_table[key]
+        except KeyError:
+            step = super()._create_stabilization_step(names)
+            template = None if step is None else (None, step.entered_states, step.exited_states)
+            stabilization_table[key] = template
+
+        if template is None:
+            return None
+        _, entered, exited = template
+        return MicroStep(entered_states=list(entered), exited_states=list(exited))
@@ -1,4 +1,4 @@
-from typing import Callable, Any
+from typing import Any, Callable, Iterable, List
 
 from ..model import MetaEvent, Event
 
@@ -25,13 +25,45 @@ class PropertyStatechartListener:
     """
     Listener that propagates meta-events to given property statechart, executes
     the property statechart, and checks it.
+
+    If *events* is provided, only the meta-events whose name is in *events* are propagated.
+    The property statechart is nevertheless executed for the other meta-events.
+
+    If *batched* is set, the meta-events are buffered during a macro step, and propagated
+    at once when the *step ended* meta-event is received. The property statechart is then
+    executed and checked only once per macro step. The buffer is cleared when a *step started*
+    meta-event is received, so that the meta-events of a step that raised an exception are
+    not propagated with the ones of the next step.
+
+    :param interpreter: interpreter of the property statechart
+    :param events: optional names of the meta-events to propagate
+    :param batched: propagate the meta-events once per macro step
     """
 
-    def __init__(self, interpreter) -> None:
+    def __init__(self, interpreter, events: Iterable[str] = None, *,
+                 batched: bool = False) -> None:
         self._interpreter = interpreter
+        self._events = None if events is None else frozenset(events)
+        self._batched = batched
+        self._buffer = []  # type: List[MetaEvent]
 
     def __call__(self, event: MetaEvent) -> None:
-        self._interpreter.queue(event)
+        if self._batched and event.name != 'step ended':
+            if event.name == 'step started':
+                self._buffer.clear()
+            if self._events is None or event.name in self._events:
+                self._buffer.append(event)
+            return
+
+        if self._batched:
+            events, self._buffer = self._buffer, []
+            if self._events is None or event.name in self._events:
+                events.append(event)
+            if len(events) > 0:
+                self._interpreter.queue(*events)
+        elif self._events is None or event.name in self._events:
+            self._interpreter.queue(event)
+
         self._interpreter.execute()
         if self._interpreter.final:
             raise PropertyStatechartError(self._interpreter)
@@ -0,0 +1,432 @@
+import heapq
+import math
+
+from numbers import Number
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+from ..model import Event, InternalEvent
+
+__all__ = ['EventQueue', 'TimerWheelQueue', 'COALESCING_REDUCERS']
+
+
+# [time, not internal, insertion counter, event or None if cancelled]
+_Entry = List[Any]
+
+
+def _coalesce_latest(pending: Mapping[str, Any], queued: Mapping[str, Any]) -> Mapping[str, Any]:
+    return queued
+
+
+def _coalesce_sum(pending: Mapping[str, Any], queued: Mapping[str, Any]) -> Mapping[str, Any]:
+    data = dict(queued)
+    for key, value in pending.items():
+        if key not in data:
+            data[key] = value
+        elif key != 'delay' and isinstance(value, Number) and isinstance(data[key], Number):
+            data[key] = value + data[key]
+    return data
+
+
+#: Reducers that can be used to coalesce pending events with the same name, see *Interpreter*.
+#: A reducer receives the data of the pending event and of the queued event, and returns the
+#: data of the coalesced event. 'latest' keeps the data of the queued event, 'sum' adds the
+#: numerical values of both events (except *delay*) and keeps the latest value of the others.
+COALESCING_REDUCERS = {
+    'latest': _coalesce_latest,
+    'sum': _coalesce_sum,
+}  # type: Dict[str, Callable[[Mapping[str, Any], Mapping[str, Any]], Mapping[str, Any]]]
+
+
+class EventQueue:
+    """
+    A priority queue of timed events, as used by an interpreter to store its pending events.
+
+    Events are ordered by time. Ties are broken by putting internal events before external
+    ones, and then by following their insertion order. Insertion and removal are done
+    in O(log n), and the next event can be accessed in O(1).
+
+    Pending events can be cancelled in O(1). Cancelled events are lazily removed from the
+    queue, the next time they would have been accessed.
+
+    Iterating over a queue yields (time, event) pairs in the order they will be popped.
+
+    :param items: optional (time, event) pairs to initially put in the queue.
+    """
+
+    def __init__(self, items: Iterable[Tuple[float, Event]] = ()) -> None:
+        self._heap = []  # type: List[_Entry]
+        self._counter = 0
+
+        # Pending entries for each event (by id), and number of cancelled entries
+        self._entries = {}  # type: Dict[int, List[_Entry]]
+        self._cancelled = 0
+
+        self.extend(items)
+
+    def _entry(self, time: float, event: Event) -> _Entry:
+        """
+        Return the heap entry for given event, and update the insertion counter.
+
+        :param time: time at which the event should be processed
+        :param event: event to store
+        :return: a heap entry
+        """
+        self._counter += 1
+        entry = [time, not isinstance(event, InternalEvent), self._counter, event]
+        self._entries.setdefault(id(event), []).append(entry)
+        return entry
+
+    def _forget(self, entry: _Entry) -> None:
+        """
+        Forget given entry, that was removed from the queue.
+
+        :param entry: a pending entry
+        """
+        entries = self._entries[id(entry[3])]
+        if len(entries) == 1:
+            del self._entries[id(entry[3])]
+        else:
+            entries.remove(entry)
+
+    def _discard_cancelled(self) -> None:
+        """
+        Remove the cancelled entries that are at the top of the heap.
+        """
+        while len(self._heap) > 0 and self._heap[0][3] is None:
+            heapq.heappop(self._heap)
+            self._cancelled -= 1
+
+    def advance(self, time: float) -> None:
+        """
+        Notify the queue that given time is reached. This is called by the interpreter at the
+        beginning of each step. By default, does nothing.
+
+        :param time: current time
+        """
+        pass
+
+    def push(self, time: float, event: Event) -> None:
+        """
+        Add given event to the queue.
+
+        :param time: time at which the event should be processed
+        :param event: event to add
+        """
+        heapq.heappush(self._heap, self._entry(time, event))
+
+    def extend(self, items: Iterable[Tuple[float, Event]]) -> None:
+        """
+        Add given (time, event) pairs to the queue, in their order of iteration.
+        This is more efficient than repeated calls to *push* for large numbers of events.
+
+        :param items: (time, event) pairs to add
+        """
+        entries = [self._entry(time, event) for time, event in items]
+        if len(entries) > len(self._heap):
+            self._heap.extend(entries)
+            heapq.heapify(self._heap)
+        else:
+            for entry in entries:
+                heapq.heappush(self._heap, entry)
+
+    def cancel(self, event: Event) -> bool:
+        """
+        Cancel given event, if it is in the queue. If the same event instance was added
+        several times, all its occurrences are cancelled.
+
+        :param event: event to cancel
+        :return: True if the event was in the queue
+        """
+        entries = self._entries.pop(id(event), None)
+        if entries is None:
+            return False
+
+        for entry in entries:
+            entry[3] = None
+        self._cancelled += len(entries)
+        return True
+
+    def replace(self, event: Event, new_event: Event) -> bool:
+        """
+        Replace given event by another one, if it is in the queue. The new event keeps the
+        time and the position of the replaced one.
+
+        :param event: event to replace
+        :param new_event: replacing event
+        :return: True if the event was in the queue
+        """
+        entries = self._entries.pop(id(event), None)
+        if entries is None:
+            return False
+
+        for entry in entries:
+            entry[3] = new_event
+        self._entries.setdefault(id(new_event), []).extend(entries)
+        return True
+
+    def peek(self) -> Optional[Tuple[float, Event]]:
+        """
+        Return the next (time, event) pair without removing it from the queue.
+
+        :return: a (time, event) pair, or None if the queue is empty
+        """
+        self._discard_cancelled()
+        if len(self._heap) == 0:
+            return None
+        time, _, _, event = self._heap[0]
+        return time, event
+
+    def ready(self, time: float) -> Optional[Tuple[float, Event]]:
+        """
+        Return the next (time, event) pair without removing it from the queue, provided
+        it should be processed at or before given time.
+
+        :param time: current time
+        :return: a (time, event) pair, or None if no event should be processed yet
+        """
+        head = self.peek()
+        if head is not None and head[0] <= time:
+            return head
+        return None
+
+    def pop(self) -> Tuple[float, Event]:
+        """
+        Remove and return the next (time, event) pair.
+
+        :return: a (time, event) pair
+        :raise IndexError: if the queue is empty
+        """
+        self._discard_cancelled()
+        entry = heapq.heappop(self._heap)
+        self._forget(entry)
+        return entry[0], entry[3]
+
+    def clear(self) -> None:
+        """
+        Remove all the events from the queue.
+        """
+        self._heap.clear()
+        self._entries.clear()
+        self._cancelled = 0
+
+    def _all_entries(self) -> List[_Entry]:
+        """
+        Return every entry of the queue, including the cancelled ones, in no particular order.
+        """
+        return list(self._heap)
+
+    def __len__(self) -> int:
+        return len(self._heap) - self._cancelled
+
+    def __iter__(self) -> Iterator[Tuple[float, Event]]:
+        for time, _, _, event in sorted(self._all_entries()):
+            if event is not None:
+                yield time, event
+
+    def __setstate__(self, state):
+        # Pending entries are indexed by event ids, that are not preserved by pickling
+        self.__dict__.update(state)
+        self._entries = {}
+        for entry in self._all_entries():
+            if entry[3] is not None:
+                self._entries.setdefault(id(entry[3]), []).append(entry)
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, list(self))
+
+
+class TimerWheelQueue(EventQueue):
+    """
+    A priority queue of timed events that relies on a hierarchical timer wheel to store
+    the events that have to be processed in the future.
+
+    Time is divided in ticks of *resolution* seconds. Events whose tick has not yet been
+    reached are stored in the slots of a wheel: the first level has *slots* slots of one tick,
+    the second level has *slots* slots of *slots* ticks, and so on for the given number of
+    *levels*. Events that are too far in the future are stored in an overflow heap.
+    Events are moved from the wheel to a heap of ready events when their tick is reached
+    (see *advance*), cascading to lower levels when needed.
+
+    Inserting an event in the future is done in constant time, and each event is moved at
+    most once per level, so that expiry is done in amortised constant time (plus the cost
+    of the heap of ready events, that only contains events whose tick was reached).
+    Events are delivered in the same order than with *EventQueue*.
+
+    :param items: optional (time, event) pairs to initially put in the queue.
+    :param now: current time, at which the wheels start.
+    :param resolution: duration of a tick, in seconds.
+    :param slots: number of slots per level.
+    :param levels: number of levels.
+    """
+
+    def __init__(self, items: Iterable[Tuple[float, Event]] = (), *, now: float = 0,
+                 resolution: float = 0.01, slots: int = 64, levels: int = 4) -> None:
+        self._resolution = resolution
+        self._slots = slots
+        self._levels = levels
+
+        self._tick = self._tick_for(now)
+        self._wheels = [{} for _ in range(levels)]  # type: List[Dict[int, List[_Entry]]]
+        self._overflow = []  # type: List[_Entry]
+        self._delayed = 0  # Number of entries in the wheels and in the overflow heap
+        self._earliest = None  # type: Optional[_Entry]
+
+        super().__init__(items)
+
+    def _tick_for(self, time: float) -> int:
+        return math.floor(time / self._resolution)
+
+    def _insert(self, entry: _Entry) -> None:
+        """
+        Put given entry either in the heap of ready events, in the wheels or in the overflow
+        heap, depending on its tick.
+
+        :param entry: an entry
+        """
+        tick = self._tick_for(entry[0])
+        if tick <= self._tick:
+            heapq.heappush(self._heap, entry)
+            return
+
+        self._delayed += 1
+        if self._earliest is not None and entry < self._earliest:
+            self._earliest = entry
+
+        span = 1
+        for wheel in self._wheels:
+            key, current = tick // span, self._tick // span
+            if key - current < self._slots:
+                wheel.setdefault(key, []).append(entry)
+                return
+            span *= self._slots
+        heapq.heappush(self._overflow, entry)
+
+    def advance(self, time: float) -> None:
+        """
+        Move the events whose tick is reached at given time to the heap of ready events.
+
+        :param time: current time
+        """
+        tick = self._tick_for(time)
+        if tick <= self._tick:
+            return
+
+        previous, self._tick = self._tick, tick
+        if self._delayed == 0:
+            return
+
+        moved = []  # type: List[_Entry]
+        span = 1
+        for wheel in self._wheels:
+            first, last = previous // span, tick // span
+            if last - first < len(wheel):
+                keys = [key for key in range(first, last + 1) if key in wheel]
+            else:
+                keys = [key for key in wheel if key <= last]
+            for key in keys:
+                moved.extend(wheel.pop(key))
+            span *= self._slots
+
+        while len(self._overflow) > 0 and self._tick_for(self._overflow[0][0]) <= tick:
+            moved.append(heapq.heappop(self._overflow))
+
+        if len(moved) > 0:
+            self._delayed -= len(moved)
+            self._earliest = None
+            for entry in moved:
+                if entry[3] is None:
+                    self._cancelled -= 1
+                else:
+                    # Either ready, or cascaded to a lower level
+                    self._insert(entry)
+
+    def ready(self, time: float) -> Optional[Tuple[float, Event]]:
+        """
+        Return the next (time, event) pair without removing it from the queue, provided
+        it should be processed at or before given time. Events whose tick is reached at
+        given time are moved to the heap of ready events.
+
+        :param time: current time
+        :return: a (time, event) pair, or None if no event should be processed yet
+        """
+        self.advance(time)
+        self._discard_cancelled()
+        if len(self._heap) > 0 and self._heap[0][0] <= time:
+            time, _, _, event = self._heap[0]
+            return time, event
+        return None
+
+    def _earliest_delayed(self) -> Optional[_Entry]:
+        """
+        Return the earliest entry that is not cancelled among the ones that are in the wheels
+        or in the overflow heap, if any.
+        """
+        if self._earliest is None or self._earliest[3] is None:
+            while len(self._overflow) > 0 and self._overflow[0][3] is None:
+                heapq.heappop(self._overflow)
+                self._delayed -= 1
+                self._cancelled -= 1
+
+            earliest = [self._overflow[0]] if len(self._overflow) > 0 else []
+            for wheel in self._wheels:
+                for key in sorted(wheel):
+                    entries = [entry for entry in wheel[key] if entry[3] is not None]
+                    if len(entries) > 0:
+                        earliest.append(min(entries))
+                        break
+            self._earliest = min(earliest) if len(earliest) > 0 else None
+        return self._earliest
+
+    def push(self, time: float, event: Event) -> None:
+        self._insert(self._entry(time, event))
+
+    def extend(self, items: Iterable[Tuple[float, Event]]) -> None:
+        for time, event in items:
+            self.push(time, event)
+
+    def peek(self) -> Optional[Tuple[float, Event]]:
+        self._discard_cancelled()
+        if len(self._heap) > 0:
+            entry = self._heap[0]  # type: Optional[_Entry]
+        else:
+            entry = self._earliest_delayed()
+
+        if entry is None:
+            return None
+        time, _, _, event = entry
+        return time, event
+
+    def pop(self) -> Tuple[float, Event]:
+        self._discard_cancelled()
+        if len(self._heap) > 0:
+            return super().pop()
+
+        # The next event is delayed. Its entry is left in the wheels as if it was cancelled,
+        # so that the time of the wheels does not move forward.
+        entry = self._earliest_delayed()
+        if entry is None:
+            raise IndexError('pop from an empty queue')
+        time, _, _, event = entry
+        self._forget(entry)
+        entry[3] = None
+        self._cancelled += 1
+        self._earliest = None
+        return time, event
+
+    def clear(self) -> None:
+        super().clear()
+        for wheel in self._wheels:
+            wheel.clear()
+        self._overflow.clear()
+        self._delayed = 0
+        self._earliest = None
+
+    def _all_entries(self) -> List[_Entry]:
+        entries = list(self._heap) + list(self._overflow)
+        for wheel in self._wheels:
+            for slot in wheel.values():
+                entries.extend(slot)
+        return entries
+
+    def __len__(self) -> int:
+        return len(self._heap) + self._delayed - self._cancelled
@@ -1,3 +1,5 @@
+import sys
+
 from abc import ABCMeta
 from typing import List
 
@@ -307,7 +309,8 @@ class Transition(ContractMixin):
         ContractMixin.__init__(self)
         self._source = source
         self._target = target
-        self.event = event
+        # Interned, so that it can be compared by identity with the name of events
+        self.event = event if event is None else sys.intern(event)
         self.guard = guard
         self.action = action
         self.priority = 0 if priority is None else priority
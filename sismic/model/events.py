@@ -1,4 +1,6 @@
+import sys
 import warnings
+
 from typing import Any
 
 __all__ = ['Event', 'InternalEvent', 'MetaEvent']
@@ -16,6 +18,9 @@ class Event:
     When two events are compared, they are considered equal if their names
     and their data are equal.
 
+    Event names are interned (see *sys.intern*), as are the event names of transitions, so that
+    they can be compared by identity in most cases.
+
     :param name: name of the event.
     :param data: additional data passed as named parameters.
     """
@@ -23,7 +28,7 @@ class Event:
     __slots__ = ['name', 'data']
 
     def __init__(self, name: str, **additional_parameters: Any) -> None:
-        self.name = name
+        self.name = sys.intern(name) if type(name) is str else name
         self.data = additional_parameters
 
     def __eq__(self, other):
@@ -44,7 +49,9 @@ class Event:
 
     def __setstate__(self, state):
         # For pickle and implicitly for multiprocessing
-        self.name, self.data = state
+        name, data = state
+        self.name = sys.intern(name) if type(name) is str else name
+        self.data = data
 
     def __hash__(self):
         return hash(self.name)
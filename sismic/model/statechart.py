@@ -1,5 +1,7 @@
+from collections import deque
 from copy import deepcopy
-from typing import Callable, Dict, Iterable, List, Optional, Union, cast
+from typing import (Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple,
+                    Union, cast)
 
 from ..exceptions import StatechartError
 
@@ -9,6 +11,53 @@ from .elements import (CompositeStateMixin, CompoundState, HistoryStateMixin,
 __all__ = ['Statechart']
 
 
+_TransitionsIndex = Dict[str, Dict[Optional[str], List[Transition]]]
+
+
+class _Hierarchy:
+    """
+    Precomputed hierarchy tables for the states of a statechart: ancestors (by decreasing
+    depth), descendants (by increasing depth), depth, and a memo for least common ancestors.
+
+    :param parent: mapping from a state name to the name of its parent (or None)
+    :param children: mapping from a state name (or None) to the names of its children
+    """
+
+    __slots__ = ['ancestors', 'ancestors_set', 'descendants', 'descendants_set', 'depth', 'lca']
+
+    def __init__(self, parent: Dict[str, Optional[str]],
+                 children: Dict[Optional[str], List[str]]) -> None:
+        self.ancestors = {}  # type: Dict[str, Tuple[str, ...]]
+        self.ancestors_set = {}  # type: Dict[str, FrozenSet[str]]
+        self.descendants = {}  # type: Dict[str, List[str]]
+        self.descendants_set = {}  # type: Dict[str, FrozenSet[str]]
+        self.depth = {}  # type: Dict[str, int]
+        self.lca = {}  # type: Dict[Tuple[str, str], Optional[str]]
+
+        # Breadth-first traversal, so parents are always visited before their children
+        states_to_consider = deque(children[None])
+        while states_to_consider:
+            name = states_to_consider.popleft()
+            parent_name = parent[name]
+            if parent_name is None:
+                ancestors = ()  # type: Tuple[str, ...]
+            else:
+                ancestors = (parent_name,) + self.ancestors[parent_name]
+            self.ancestors[name] = ancestors
+            self.ancestors_set[name] = frozenset(ancestors)
+            self.depth[name] = len(ancestors) + 1
+            self.descendants[name] = []
+
+            # Descendants are discovered by increasing depth
+            for ancestor in ancestors:
+                self.descendants[ancestor].append(name)
+
+            states_to_consider.extend(children[name])
+
+        for name, descendants in self.descendants.items():
+            self.descendants_set[name] = frozenset(descendants)
+
+
 class Statechart:
     """
     Python structure for a statechart
@@ -30,6 +79,11 @@ class Statechart:
 
         self._children[None] = []  # Root state
 
+        # Lazily computed structures, see _invalidate_cache
+        self._transitions_index = None  # type: Optional[_TransitionsIndex]
+        self._hierarchy_cache = None  # type: Optional[_Hierarchy]
+        self._revision = 0
+
     @property
     def root(self) -> Optional[str]:
         """
@@ -106,14 +160,10 @@ class Statechart:
         :return: state's ancestors
         :raise StatechartError: if state does not exist
         """
-        self.state_for(name)  # Raise StatechartError if state does not exist
-
-        ancestors = []
-        parent = self._parent[name]
-        while parent:
-            ancestors.append(parent)
-            parent = self._parent[parent]
-        return ancestors
+        try:
+            return list(self._hierarchy().ancestors[name])
+        except KeyError as e:
+            raise StatechartError('State {} does not exist'.format(name)) from e
 
     def descendants_for(self, name: str) -> List[str]:
         """
@@ -124,16 +174,10 @@ class Statechart:
         :return: state's descendants
         :raise StatechartError: if state does not exist
         """
-        self.state_for(name)  # Raise StatechartError if state does not exist
-
-        descendants = []
-        states_to_consider = [name]
-        while states_to_consider:
-            name = states_to_consider.pop(0)
-            for child in self.children_for(name):
-                states_to_consider.append(child)
-                descendants.append(child)
-        return descendants
+        try:
+            return list(self._hierarchy().descendants[name])
+        except KeyError as e:
+            raise StatechartError('State {} does not exist'.format(name)) from e
 
     def depth_for(self, name: str) -> int:
         """
@@ -143,10 +187,10 @@ class Statechart:
         :return: state depth
         :raise StatechartError: if state does not exist
         """
-        self.state_for(name)  # Raise StatechartError if state does not exist
-
-        ancestors = self.ancestors_for(name)
-        return len(ancestors) + 1
+        try:
+            return self._hierarchy().depth[name]
+        except KeyError as e:
+            raise StatechartError('State {} does not exist'.format(name)) from e
 
     def least_common_ancestor(self, name_first: str, name_second: str) -> Optional[str]:
         """
@@ -158,15 +202,24 @@ class Statechart:
         :return: name of deepest common ancestor or *None*
         :raise StatechartError: if state does not exist
         """
+        hierarchy = self._hierarchy()
+        try:
+            return hierarchy.lca[name_first, name_second]
+        except KeyError:
+            pass
+
         self.state_for(name_first)  # Raise StatechartError if state does not exist
         self.state_for(name_second)
 
-        s1_anc = self.ancestors_for(name_first)
-        s2_anc = self.ancestors_for(name_second)
-        for state in s1_anc:
+        lca = None
+        s2_anc = hierarchy.ancestors_set[name_second]
+        for state in hierarchy.ancestors[name_first]:
             if state in s2_anc:
-                return state
-        return None
+                lca = state
+                break
+
+        hierarchy.lca[name_first, name_second] = hierarchy.lca[name_second, name_first] = lca
+        return lca
 
     def leaf_for(self, names: Iterable[str]) -> List[str]:
         """
@@ -181,18 +234,45 @@ class Statechart:
         """
         leaves = []  # type: List[str]
         names = set(names)  # Lookups in set are more efficient
+        descendants = self._hierarchy().descendants_set
 
         for name in names:
-            # Raise a StatechartError if it does not exist!
-            for descendant in self.descendants_for(name):
-                if descendant in names:
-                    break
-            else:  # no break occurs
-                leaves.append(name)
+            try:
+                if names.isdisjoint(descendants[name]):
+                    leaves.append(name)
+            except KeyError as e:
+                raise StatechartError('State {} does not exist'.format(name)) from e
         return leaves
 
+    def _hierarchy(self) -> '_Hierarchy':
+        """
+        Return the (cached) hierarchy tables of this statechart. The tables are computed
+        lazily, and are reset each time the statechart is modified.
+
+        :return: a *_Hierarchy* instance
+        """
+        if self._hierarchy_cache is None:
+            self._hierarchy_cache = _Hierarchy(self._parent, self._children)
+        return self._hierarchy_cache
+
     # ######### TRANSITIONS ##########
 
+    def _index_transitions(self) -> _TransitionsIndex:
+        """
+        Return a mapping from source state names to a mapping from event names (None for
+        eventless transitions) to the list of corresponding transitions, in the order they were
+        added. The index is computed lazily, and is reset each time the statechart is modified.
+
+        :return: a (cached) transitions index
+        """
+        if self._transitions_index is None:
+            index = {}  # type: _TransitionsIndex
+            for transition in self._transitions:
+                index.setdefault(transition.source, {}).setdefault(
+                    transition.event, []).append(transition)
+            self._transitions_index = index
+        return self._transitions_index
+
     @property
     def transitions(self):
         """
@@ -222,6 +302,7 @@ class Statechart:
             raise StatechartError('Unknown target state for {}'.format(transition))
 
         self._transitions.append(transition)
+        self._invalidate_cache()
 
     def remove_transition(self, transition: Transition) -> None:
         """
@@ -234,6 +315,7 @@ class Statechart:
             self._transitions.remove(transition)
         except ValueError:
             raise StatechartError('Transition {} does not exist'.format(transition))
+        self._invalidate_cache()
 
     def rotate_transition(self, transition: Transition, new_source: str = '',
                           new_target: Optional[str] = '') -> None:
@@ -272,6 +354,8 @@ class Statechart:
                 new_target_state = self.state_for(new_target)
                 transition._target = new_target_state.name
 
+        self._invalidate_cache()
+
     def transitions_from(self, source: str) -> List[Transition]:
         """
         Return the list of transitions whose source is given name.
@@ -395,6 +479,8 @@ class Statechart:
         self._children[state.name] = []
         self._children[parent].append(state.name)
 
+        self._invalidate_cache()
+
     def remove_state(self, name: str) -> None:
         """
         Remove given state.
@@ -431,6 +517,8 @@ class Statechart:
 
         self._children[parent].remove(name)
 
+        self._invalidate_cache()
+
     def rename_state(self, old_name: str, new_name: str) -> None:
         """
         Change state name, and adapt transitions, initial state, memory, etc.
@@ -483,6 +571,8 @@ class Statechart:
         # Rename state!
         state._name = new_name
 
+        self._invalidate_cache()
+
     def move_state(self, name: str, new_parent: str) -> None:
         """
         Move given state (and its children) such that its new parent is *new_parent*.
@@ -524,6 +614,8 @@ class Statechart:
                 if other_state.memory == name:
                     other_state.memory = None
 
+        self._invalidate_cache()
+
     def copy_from_statechart(self, statechart: 'Statechart', *, source: str, replace: str,
                              renaming_func: Callable[[str], str] = lambda s: s) -> None:
         """
@@ -557,6 +649,7 @@ class Statechart:
         statechart_copy.rename_state(source, replace)
         source_name = replace  # For lisibility
         self._states[replace] = statechart_copy.state_for(source_name)
+        self._invalidate_cache()
         for name in statechart_copy.descendants_for(source_name):
             new_name = renaming_func(name)
             # May raise a StatechartError if names collides in source statechart.
@@ -579,6 +672,19 @@ class Statechart:
                         transition.source, transition, source)
                 ) from e
 
+    # ######### CACHE ##########
+
+    def _invalidate_cache(self) -> None:
+        """
+        Reset the lazily computed structures of this statechart.
+        This method is called by every method that modifies the structure of the statechart.
+        Structures that are computed outside the statechart can rely on *_revision* to detect
+        such modifications.
+        """
+        self._transitions_index = None
+        self._hierarchy_cache = None
+        self._revision += 1
+
     # ######### VALIDATION ##########
 
     def _validate_compoundstate_initial(self) -> bool:
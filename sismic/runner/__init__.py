@@ -1 +1,4 @@
 from .runner import *
+from .asynchronous import *
+from .scheduler import *
+from .sharded import *
@@ -0,0 +1,394 @@
+import asyncio
+import inspect
+
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+from .runner import wakeup_timeout
+from ..interpreter import Interpreter
+from ..model import Event, MacroStep, MetaEvent
+
+
+__all__ = ['AsyncioRunner', 'AsyncInterpreter']
+
+
+class AsyncInterpreter:
+    """
+    An awaitable interface for an interpreter that is executed by an *AsyncioRunner*.
+    Instances are returned by *AsyncioRunner.add*, and should not be created directly.
+
+    The methods of this class return asyncio futures, that can be awaited from coroutines that
+    run in the same event loop than the runner. These futures are created as soon as the methods
+    are called, so that they can be awaited after the event they wait for has occurred.
+    For instance::
+
+        entered = handle.until_entered('s3')
+        await handle.queue_async('goto s2')
+        await entered
+
+    If the execution of the interpreter fails, the exception is set on the pending futures.
+    If the execution is stopped, or if the interpreter reaches a final configuration, the
+    pending futures are cancelled (except the one returned by *until_final*).
+
+    :param interpreter: interpreter to execute
+    :param loop: event loop in which the interpreter is executed
+    """
+
+    def __init__(self, interpreter: Interpreter, loop: asyncio.AbstractEventLoop) -> None:
+        self._interpreter = interpreter
+        self._loop = loop
+        self._task = None  # type: Optional[asyncio.Task]
+
+        # Set when an event is queued, or when the next deadline is reached
+        self._wakeup = asyncio.Event()
+
+        # Pending futures. Futures waiting for an event are stored with this event, so that
+        # its id is not reused by another event while they are pending.
+        self._consumed = {}  # type: Dict[int, Tuple[Event, List[asyncio.Future]]]
+        self._consumed_during_step = []  # type: List[asyncio.Future]
+        self._entered = {}  # type: Dict[str, List[asyncio.Future]]
+        self._final = []  # type: List[asyncio.Future]
+
+        # Awaitables returned by coroutine listeners during current step
+        self._awaitables = []  # type: List[Awaitable]
+        self._listeners = {}  # type: Dict[Callable[[MetaEvent], Any], Callable[[MetaEvent], None]]
+
+        self._interpreter.attach(self._listener, events=['event consumed', 'state entered'])
+        self._interpreter._queue_callbacks.append(self._notify)
+        self._interpreter._discard_callbacks.append(self._discarded)
+
+    @property
+    def interpreter(self) -> Interpreter:
+        """
+        Underlying interpreter.
+        """
+        return self._interpreter
+
+    @property
+    def running(self) -> bool:
+        """
+        Holds if the interpreter is currently executed by the runner.
+        """
+        return self._task is not None and not self._task.done()
+
+    def queue(self, event_or_name: Union[str, Event], *event_or_names: Union[str, Event],
+              **parameters) -> 'AsyncInterpreter':
+        """
+        Queue given events, see *Interpreter.queue*.
+
+        :param event_or_name: name of the event or Event instance
+        :param event_or_names: additional events
+        :param parameters: event parameters.
+        :return: *self* so it can be chained.
+        """
+        self._interpreter.queue(event_or_name, *event_or_names, **parameters)
+        return self
+
+    def queue_async(self, event_or_name: Union[str, Event], **parameters) -> asyncio.Future:
+        """
+        Queue given event, and return a future that is resolved when this event is consumed.
+        The result of the future is the macro step that consumed the event.
+
+        If the event is coalesced with another one (see *Interpreter.queue*), the future is
+        resolved when the coalesced event is consumed. If the event is dropped, the future
+        is cancelled.
+
+        :param event_or_name: name of the event or Event instance
+        :param parameters: event parameters.
+        :return: a future
+        """
+        event = Event(event_or_name, **parameters) if isinstance(event_or_name, str) \
+            else event_or_name
+
+        future = self._loop.create_future()
+        if not self.running:
+            future.cancel()
+            return future
+
+        self._consumed.setdefault(id(event), (event, []))[1].append(future)
+        self._interpreter.queue(event)
+        return future
+
+    def cancel(self, event: Event) -> bool:
+        """
+        Cancel given event if it is still pending, see *Interpreter.cancel*.
+        The futures that wait for this event to be consumed are cancelled.
+
+        :param event: an Event instance
+        :return: True if the event was pending and has been cancelled
+        """
+        cancelled = self._interpreter.cancel(event)
+        if cancelled:
+            for future in self._pop_consumed(event):
+                future.cancel()
+        return cancelled
+
+    def until_entered(self, name: str) -> asyncio.Future:
+        """
+        Return a future that is resolved when given state is entered. The future is
+        immediately resolved if the state is already active.
+
+        :param name: name of a state
+        :return: a future
+        :raise StatechartError: if given state does not exist
+        """
+        self._interpreter.statechart.state_for(name)
+
+        future = self._loop.create_future()
+        if self._interpreter._initialized and self._interpreter.is_active(name):
+            future.set_result(None)
+        elif not self.running:
+            future.cancel()
+        else:
+            self._entered.setdefault(name, []).append(future)
+        return future
+
+    def until_final(self) -> asyncio.Future:
+        """
+        Return a future that is resolved when the interpreter reaches a final configuration.
+
+        :return: a future
+        """
+        future = self._loop.create_future()
+        if self._interpreter.final:
+            future.set_result(None)
+        elif not self.running:
+            future.cancel()
+        else:
+            self._final.append(future)
+        return future
+
+    def attach(self, listener: Callable[[MetaEvent], Any]) -> None:
+        """
+        Attach given listener to the underlying interpreter, see *Interpreter.attach*.
+
+        The listener can be a coroutine function (or, more generally, can return an awaitable).
+        In that case, the awaitables are awaited in order at the end of the step in which the
+        meta-events were emitted, before the next step starts.
+
+        :param listener: A callable that accepts meta-event instances.
+        """
+        def wrapper(event: MetaEvent) -> None:
+            result = listener(event)
+            if inspect.isawaitable(result):
+                self._awaitables.append(result)
+
+        self._listeners[listener] = wrapper
+        self._interpreter.attach(wrapper)
+
+    def detach(self, listener: Callable[[MetaEvent], Any]) -> None:
+        """
+        Remove given listener from the ones that were attached using *attach*.
+
+        :param listener: A previously attached listener.
+        """
+        self._interpreter.detach(self._listeners.pop(listener))
+
+    def _notify(self) -> None:
+        """
+        Wake up the task when an event is queued, possibly from another thread.
+        """
+        if not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def _pop_consumed(self, event: Event) -> List[asyncio.Future]:
+        """
+        Remove and return the futures that wait for given event to be consumed.
+
+        :param event: an Event instance
+        :return: a possibly empty list of futures
+        """
+        _, futures = self._consumed.pop(id(event), (None, []))
+        return futures
+
+    def _discarded(self, event: Event, into: Optional[Event]) -> None:
+        """
+        Cancel the futures that wait for given event to be consumed if it was dropped, or make
+        them wait for the event it was coalesced into. This is called by the interpreter,
+        possibly from another thread, so that it does not need to keep the discarded events.
+
+        :param event: the dropped or coalesced event
+        :param into: the event it was coalesced into, or None if it was dropped
+        """
+        futures = self._pop_consumed(event)
+        if len(futures) == 0:
+            return
+        elif into is not None:
+            self._consumed.setdefault(id(into), (into, []))[1].extend(futures)
+        elif not self._loop.is_closed():
+            for future in futures:
+                self._loop.call_soon_threadsafe(future.cancel)
+
+    def _listener(self, event: MetaEvent) -> None:
+        """
+        Keep track of the consumed events, and of the entered states.
+        """
+        if event.name == 'event consumed':
+            self._consumed_during_step.extend(self._pop_consumed(event.event))
+        elif event.name == 'state entered':
+            for future in self._entered.pop(event.state, []):
+                if not future.done():
+                    future.set_result(None)
+
+    def _resolve(self, step: Optional[MacroStep]) -> None:
+        """
+        Resolve the futures that depend on the last step.
+
+        :param step: the macro step returned by the last call to *execute_once*
+        """
+        for future in self._consumed_during_step:
+            if not future.done():
+                future.set_result(step)
+        self._consumed_during_step.clear()
+
+        if self._interpreter.final:
+            for future in self._final:
+                if not future.done():
+                    future.set_result(None)
+            self._final.clear()
+
+    def _release(self, exception: BaseException = None) -> None:
+        """
+        Cancel all the pending futures, or set given exception on them.
+
+        :param exception: an optional exception
+        """
+        futures = list(self._consumed_during_step) + self._final
+        for _, pending in self._consumed.values():
+            futures.extend(pending)
+        for pending in self._entered.values():
+            futures.extend(pending)
+
+        for future in futures:
+            if future.done():
+                continue
+            elif exception is None:
+                future.cancel()
+            else:
+                future.set_exception(exception)
+
+        self._consumed.clear()
+        self._consumed_during_step.clear()
+        self._entered.clear()
+        self._final.clear()
+
+    async def _sleep(self) -> None:
+        """
+        Wait until an event is queued, or until the next deadline of the interpreter.
+        """
+        timeout = wakeup_timeout(self._interpreter)
+        timer = None
+        if timeout is not None:
+            timer = self._loop.call_at(self._loop.time() + timeout, self._wakeup.set)
+        try:
+            await self._wakeup.wait()
+        finally:
+            if timer is not None:
+                timer.cancel()
+
+    async def _run(self) -> None:
+        """
+        Execute the interpreter until it reaches a final configuration.
+        """
+        while not self._interpreter.final:
+            self._wakeup.clear()
+            step = self._interpreter.execute_once()
+
+            while len(self._awaitables) > 0:
+                await self._awaitables.pop(0)
+
+            self._resolve(step)
+
+            if step is None and not self._interpreter.final:
+                await self._sleep()
+            else:
+                # Give other tasks a chance to run
+                await asyncio.sleep(0)
+
+    def _done(self, task: asyncio.Task) -> None:
+        """
+        Release the pending futures and the interpreter when the task completes, including
+        when it is cancelled before being started.
+
+        :param task: the task executing the interpreter
+        """
+        for awaitable in self._awaitables:
+            if inspect.iscoroutine(awaitable):
+                awaitable.close()
+        self._awaitables.clear()
+
+        if task.cancelled():
+            self._release()
+        else:
+            self._release(task.exception())
+
+        self._interpreter._queue_callbacks.remove(self._notify)
+        self._interpreter._discard_callbacks.remove(self._discarded)
+        self._interpreter.detach(self._listener)
+
+
+class AsyncioRunner:
+    """
+    A runner that executes interpreters as tasks of an asyncio event loop, without relying
+    on additional threads.
+
+    Interpreters are added using *add*, that must be called from a coroutine running in the
+    event loop. Each interpreter is executed until it reaches a final configuration. Between two
+    steps, its task sleeps until an event is queued or until the next deadline reported by
+    *Interpreter.next_wakeup_time* is reached, using *loop.call_at*.
+
+    Events can be queued from any thread, using either the interpreter or the *AsyncInterpreter*
+    returned by *add*. The latter provides futures to wait for events to be consumed, for states
+    to be entered, or for a final configuration to be reached, and supports listeners that
+    are coroutines.
+    """
+
+    def __init__(self) -> None:
+        self._handles = []  # type: List[AsyncInterpreter]
+
+    @property
+    def interpreters(self) -> List[AsyncInterpreter]:
+        """
+        List of the interpreters that were added to this runner.
+        """
+        return list(self._handles)
+
+    @property
+    def running(self) -> bool:
+        """
+        Holds if at least one interpreter is being executed.
+        """
+        return any(handle.running for handle in self._handles)
+
+    def add(self, interpreter: Interpreter) -> AsyncInterpreter:
+        """
+        Start the execution of given interpreter in the running event loop.
+
+        :param interpreter: interpreter to execute
+        :return: an awaitable interface for given interpreter
+        :raise RuntimeError: if there is no running event loop
+        """
+        handle = AsyncInterpreter(interpreter, asyncio.get_running_loop())
+        handle._task = asyncio.ensure_future(handle._run())
+        handle._task.add_done_callback(handle._done)
+        self._handles.append(handle)
+        return handle
+
+    async def wait(self) -> None:
+        """
+        Wait until every interpreter reaches a final configuration, or is stopped.
+        Exceptions raised during their execution are propagated.
+        """
+        tasks = [handle._task for handle in self._handles]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+
+    async def stop(self) -> None:
+        """
+        Stop the execution of every interpreter, and wait for their tasks to complete.
+        """
+        for handle in self._handles:
+            handle._task.cancel()
+        await asyncio.gather(*[handle._task for handle in self._handles],
+                             return_exceptions=True)
@@ -1,7 +1,7 @@
 import time
 import threading
 
-from typing import List
+from typing import List, Optional
 
 from ..interpreter import Interpreter
 from ..model import MacroStep
@@ -10,6 +10,27 @@ from ..model import MacroStep
 __all__ = ['AsyncRunner']
 
 
+def wakeup_timeout(interpreter: Interpreter) -> Optional[float]:
+    """
+    Return the number of (wall-clock) seconds to wait before a step could happen for given
+    interpreter, based on its *next_wakeup_time* method and on the speed of its clock.
+
+    A clock whose speed is 0 does not advance, so no deadline in the future can be reached.
+
+    :param interpreter: an interpreter
+    :return: a number of seconds, or None if nothing is expected to happen until an event
+        is queued
+    """
+    deadline = interpreter.next_wakeup_time()
+    if deadline is None:
+        return None
+    remaining = deadline - interpreter.clock.time
+    if remaining <= 0:
+        return 0
+    speed = getattr(interpreter.clock, 'speed', 1)
+    return None if speed == 0 else remaining / speed
+
+
 class AsyncRunner:
     """
     An asynchronous runner that repeatedly execute given interpreter.
@@ -46,18 +67,35 @@ class AsyncRunner:
     set to True, then `execute_once` is repeatedly called until no macro step can be
     processed in the current cycle.
 
+    If `event_driven` is set to True, the runner does not wait for `interval` between two
+    cycles. Instead, a new cycle starts immediately if the previous one processed a macro step.
+    Otherwise, the runner blocks until an event is queued in the interpreter (using its
+    `queue` method), or until the next time at which a step could happen, as computed by
+    the interpreter's `next_wakeup_time` method (e.g., a delayed event or a time-based
+    guard). If nothing is expected to happen, the runner does not wake up until an event
+    is queued. This mode requires a clock that follows the wall-clock time (e.g., a started
+    *SimulatedClock* or a *UtcClock*), and guards that only depend on time through the use
+    of `after` and `idle`.
+
     :param interpreter: interpreter instance to run.
     :param interval: interval between two calls to `execute`
     :param execute_all: Repeatedly call interpreter's `execute_once` method at each step.
+    :param event_driven: Wait for events and deadlines instead of `interval`.
     """
 
-    def __init__(self, interpreter: Interpreter, interval: float = 0.1, execute_all=False) -> None:
+    def __init__(self, interpreter: Interpreter, interval: float = 0.1, execute_all=False, *,
+                 event_driven=False) -> None:
         self._unpaused = threading.Event()
         self._stop = threading.Event()
 
+        # Signaled when an event is queued, or when the runner is stopped, in event-driven mode
+        self._wakeup = threading.Condition()
+        self._woken_up = False
+
         self.interpreter = interpreter
         self.interval = interval
         self._execute_all = execute_all
+        self._event_driven = event_driven
         self._thread = threading.Thread(target=self._run)
 
     @property
@@ -92,6 +130,7 @@ class AsyncRunner:
         """
         self._stop.set()
         self._unpaused.set()
+        self._notify()
         self.wait()
 
     def pause(self):
@@ -156,7 +195,33 @@ class AsyncRunner:
         """
         pass
 
+    def _notify(self):
+        """
+        Wake up the runner, in event-driven mode.
+        """
+        with self._wakeup:
+            self._woken_up = True
+            self._wakeup.notify()
+
+    def _sleep(self, steps: List[MacroStep], elapsed: float):
+        """
+        Wait before the next call to `execute`.
+
+        :param steps: List of macrosteps returned by the last call to self.execute()
+        :param elapsed: Duration of the last cycle
+        """
+        if not self._event_driven:
+            time.sleep(max(0, self.interval - elapsed))
+        elif len(steps) == 0:
+            with self._wakeup:
+                if not self._woken_up:
+                    self._wakeup.wait(wakeup_timeout(self.interpreter))
+                self._woken_up = False
+
     def _run(self):
+        if self._event_driven:
+            self.interpreter._queue_callbacks.append(self._notify)
+
         self.before_run()
         self._unpaused.wait()
 
@@ -166,13 +231,15 @@ class AsyncRunner:
             r = self.execute()
             self.after_execute(r)
 
-            elapsed = time.time() - starttime
-            time.sleep(max(0, self.interval - elapsed))
+            self._sleep(r, time.time() - starttime)
             self._unpaused.wait()
 
         # Ensure that self._stop is set if self.interpreter.final holds
         self._stop.set()
 
+        if self._event_driven:
+            self.interpreter._queue_callbacks.remove(self._notify)
+
         self.after_run()
 
     def __del__(self):
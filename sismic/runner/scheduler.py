@@ -0,0 +1,275 @@
+import heapq
+import threading
+import time
+
+from functools import partial
+from typing import Dict, List, Optional, Tuple
+
+from .runner import wakeup_timeout
+from ..interpreter import Interpreter
+from ..model import MacroStep
+
+
+__all__ = ['Scheduler']
+
+
+class _Entry:
+    """
+    Scheduling data of an interpreter.
+
+    :param interpreter: a scheduled interpreter
+    """
+
+    __slots__ = ('interpreter', 'due', 'counter', 'lag', 'callback')
+
+    def __init__(self, interpreter: Interpreter) -> None:
+        self.interpreter = interpreter
+        self.due = None  # type: Optional[float]
+        self.counter = None  # type: Optional[int]
+        self.lag = None  # type: Optional[float]
+        self.callback = None
+
+
+class Scheduler:
+    """
+    A scheduler that executes many interpreters in a single thread.
+
+    The scheduler keeps a priority queue of the (wall-clock) times at which its interpreters
+    have to be executed. An interpreter is due as soon as an event is queued (using its `queue`
+    method, possibly from another thread), or when the next time at which a step could happen,
+    as computed by its `next_wakeup_time` method, is reached. Only the interpreters that are
+    due are executed, in the order of their due time.
+
+    To ensure fairness, each interpreter processes at most `quantum` macro steps each time it is
+    executed. If it could process more, it is rescheduled after the interpreters that are
+    already due. The difference between the time at which an interpreter was due and the time
+    at which it was executed is reported by `lag`.
+
+    Interpreters are automatically removed from the scheduler when they reach a final
+    configuration. If an exception is raised during the execution of an interpreter, this
+    interpreter is removed as well, and the exception is reported by `failures`. The other
+    interpreters are still executed and rescheduled. As for the event-driven mode of
+    *AsyncRunner*, interpreters should rely on a clock that follows the wall-clock time, and on
+    guards that only depend on time through the use of `after` and `idle`.
+
+    The scheduler can be driven by calling `run_once` from an existing loop, or by calling `run`,
+    that blocks until `stop` is called or until every interpreter reaches a final configuration.
+    Subclasses can override `execute` to control how a due interpreter is executed.
+
+    :param quantum: maximal number of macro steps processed per interpreter and execution.
+    """
+
+    def __init__(self, quantum: int = 1) -> None:
+        if quantum < 1:
+            raise ValueError('Quantum must be strictly positive, not {}'.format(quantum))
+        self.quantum = quantum
+
+        self._entries = {}  # type: Dict[Interpreter, _Entry]
+        self._heap = []  # type: List[Tuple[float, int, _Entry]]
+        self._counter = 0
+        self._failures = []  # type: List[Tuple[Interpreter, Exception]]
+
+        # Protects the heap, and is signaled when an interpreter becomes due
+        self._lock = threading.Condition()
+        self._stop = threading.Event()
+
+    @property
+    def interpreters(self) -> List[Interpreter]:
+        """
+        List of the interpreters that are scheduled.
+        """
+        with self._lock:
+            return list(self._entries)
+
+    @property
+    def failures(self) -> List[Tuple[Interpreter, Exception]]:
+        """
+        List of (interpreter, exception) pairs for the interpreters whose execution failed.
+        """
+        with self._lock:
+            return list(self._failures)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, interpreter: Interpreter) -> bool:
+        return interpreter in self._entries
+
+    def add(self, interpreter: Interpreter) -> None:
+        """
+        Add given interpreter to the scheduler. The interpreter is immediately due.
+
+        :param interpreter: an interpreter
+        :raise ValueError: if given interpreter is already scheduled
+        """
+        with self._lock:
+            if interpreter in self._entries:
+                raise ValueError('Interpreter {} is already scheduled'.format(interpreter))
+            entry = _Entry(interpreter)
+            entry.callback = partial(self._wake, entry)
+            self._entries[interpreter] = entry
+            interpreter._queue_callbacks.append(entry.callback)
+            self._schedule(entry, time.monotonic())
+
+    def remove(self, interpreter: Interpreter) -> None:
+        """
+        Remove given interpreter from the scheduler.
+
+        :param interpreter: a scheduled interpreter
+        :raise KeyError: if given interpreter is not scheduled
+        """
+        with self._lock:
+            entry = self._entries.pop(interpreter)
+            interpreter._queue_callbacks.remove(entry.callback)
+            # Pending heap items are discarded when they are popped
+            entry.due, entry.counter = None, None
+
+    def lag(self, interpreter: Interpreter) -> Optional[float]:
+        """
+        Return the number of seconds between the time at which given interpreter was due and
+        the time at which it was executed, for its last execution.
+
+        :param interpreter: a scheduled interpreter
+        :return: a number of seconds, or None if the interpreter was not yet executed
+        :raise KeyError: if given interpreter is not scheduled
+        """
+        return self._entries[interpreter].lag
+
+    def next_due_time(self) -> Optional[float]:
+        """
+        Return the earliest (monotonic) time at which an interpreter is due.
+
+        :return: a time, as returned by *time.monotonic*, or None if no interpreter is due
+        """
+        with self._lock:
+            self._discard_stale()
+            return self._heap[0][0] if len(self._heap) > 0 else None
+
+    def run_once(self) -> int:
+        """
+        Execute the interpreters that are due.
+
+        :return: the number of macro steps that were processed
+        """
+        now = time.monotonic()
+        with self._lock:
+            due = []  # type: List[_Entry]
+            self._discard_stale()
+            while len(self._heap) > 0 and self._heap[0][0] <= now:
+                _, _, entry = heapq.heappop(self._heap)
+                entry.lag = now - entry.due
+                entry.due, entry.counter = None, None
+                due.append(entry)
+                self._discard_stale()
+
+        processed = 0
+        for entry in due:
+            try:
+                processed += self._execute(entry)
+            except Exception as e:
+                with self._lock:
+                    if self._entries.get(entry.interpreter, None) is entry:
+                        self.remove(entry.interpreter)
+                    self._failures.append((entry.interpreter, e))
+        return processed
+
+    def run(self) -> None:
+        """
+        Execute the interpreters until `stop` is called, or until every interpreter
+        reaches a final configuration.
+        """
+        while True:
+            self.run_once()
+            with self._lock:
+                deadline = self.next_due_time()
+                if self._stop.is_set() or len(self._entries) == 0:
+                    break
+                elif deadline is None:
+                    self._lock.wait()
+                else:
+                    self._lock.wait(max(0, deadline - time.monotonic()))
+        self._stop.clear()
+
+    def stop(self) -> None:
+        """
+        Stop the execution started by `run`, once the current interpreter is executed.
+        If the scheduler is not running, the next call to `run` returns after a single round.
+        """
+        self._stop.set()
+        with self._lock:
+            self._lock.notify_all()
+
+    def execute(self, interpreter: Interpreter) -> List[MacroStep]:
+        """
+        Called each time a due interpreter has to be executed. By default, calls its
+        `execute_once` method until no macro step can be processed, or until `quantum`
+        macro steps were processed.
+
+        :param interpreter: a due interpreter
+        :return: the list of processed macro steps
+        """
+        steps = []  # type: List[MacroStep]
+        while len(steps) < self.quantum:
+            step = interpreter.execute_once()
+            if step is None:
+                break
+            steps.append(step)
+        return steps
+
+    def _execute(self, entry: _Entry) -> int:
+        """
+        Process at most `quantum` macro steps for the interpreter of given entry, and
+        reschedule it.
+
+        :param entry: entry of a due interpreter
+        :return: the number of macro steps that were processed
+        """
+        interpreter = entry.interpreter
+        processed = len(self.execute(interpreter))
+
+        now = time.monotonic()
+        with self._lock:
+            if self._entries.get(interpreter, None) is not entry:
+                # Removed during its execution
+                return processed
+            elif interpreter.final:
+                self.remove(interpreter)
+            elif processed == self.quantum:
+                # More steps could be processed
+                self._schedule(entry, now)
+            else:
+                timeout = wakeup_timeout(interpreter)
+                if timeout is not None:
+                    self._schedule(entry, now + timeout)
+        return processed
+
+    def _schedule(self, entry: _Entry, due: float) -> None:
+        """
+        Ensure that given entry is due at or before given time. Must be called with the lock.
+
+        :param entry: an entry
+        :param due: a monotonic time
+        """
+        if entry.due is None or due < entry.due:
+            self._counter += 1
+            entry.due, entry.counter = due, self._counter
+            heapq.heappush(self._heap, (due, self._counter, entry))
+            self._lock.notify_all()
+
+    def _wake(self, entry: _Entry) -> None:
+        """
+        Make the interpreter of given entry due, when an event is queued.
+
+        :param entry: an entry
+        """
+        with self._lock:
+            if self._entries.get(entry.interpreter, None) is entry:
+                self._schedule(entry, time.monotonic())
+
+    def _discard_stale(self) -> None:
+        """
+        Remove the heap items that were superseded by a more recent scheduling of their
+        interpreter. Must be called with the lock.
+        """
+        while len(self._heap) > 0 and self._heap[0][2].counter != self._heap[0][1]:
+            heapq.heappop(self._heap)
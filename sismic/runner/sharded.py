@@ -0,0 +1,330 @@
+import multiprocessing
+import pickle
+import threading
+import time
+import zlib
+
+from collections import deque
+from typing import Any, Dict, Hashable, List, NamedTuple, Optional, Tuple, Union
+
+from multiprocessing.connection import Connection, wait
+
+from .scheduler import Scheduler
+from ..interpreter import Interpreter
+from ..model import Event, MacroStep
+
+
+__all__ = ['ShardedRunner', 'StepSummary']
+
+
+StepSummary = NamedTuple('StepSummary', [
+    ('key', Hashable),
+    ('time', float),
+    ('event', Optional[Event]),
+    ('entered_states', List[str]),
+    ('exited_states', List[str]),
+    ('configuration', List[str]),
+])
+StepSummary.__doc__ = """
+Summary of a macro step processed by an interpreter of a *ShardedRunner*.
+
+:param key: session key of the interpreter
+:param time: time of the macro step
+:param event: consumed event, if any
+:param entered_states: names of the entered states
+:param exited_states: names of the exited states
+:param configuration: active configuration after the macro step
+"""
+
+
+class _ShardScheduler(Scheduler):
+    """
+    The scheduler of a worker process, that records a summary of each macro step and the
+    failures of its interpreters.
+    """
+
+    def __init__(self, quantum: int) -> None:
+        super().__init__(quantum)
+        self.keys = {}  # type: Dict[Interpreter, Hashable]
+        self.outbox = []  # type: List[Tuple]
+
+    def execute(self, interpreter: Interpreter) -> List[MacroStep]:
+        key = self.keys[interpreter]
+        steps = []  # type: List[MacroStep]
+        try:
+            while len(steps) < self.quantum:
+                step = interpreter.execute_once()
+                if step is None:
+                    break
+                steps.append(step)
+
+                # The configuration changes with each step
+                summary = StepSummary(key, step.time, step.event, step.entered_states,
+                                      step.exited_states, interpreter.configuration)
+                self.outbox.append(('step', summary))
+        except Exception as e:
+            self.remove(interpreter)
+            del self.keys[interpreter]
+            try:
+                pickle.dumps(e)
+            except Exception:
+                e = RuntimeError(repr(e))
+            self.outbox.append(('failure', key, e))
+            return steps
+
+        if interpreter.final:
+            del self.keys[interpreter]
+        return steps
+
+
+def _worker(connection: Connection, quantum: int, batch_size: int,
+            batch_interval: float) -> None:
+    """
+    Main loop of a worker process. Messages received from the runner are applied to the
+    interpreters of this shard, and the resulting summaries are sent back in batches.
+
+    :param connection: connection with the runner
+    :param quantum: see *Scheduler*
+    :param batch_size: see *ShardedRunner*
+    :param batch_interval: see *ShardedRunner*
+    """
+    scheduler = _ShardScheduler(quantum)
+    interpreters = {}  # type: Dict[Hashable, Interpreter]
+    flush_time = None  # type: Optional[float]
+
+    while True:
+        # Wait for a message, for the next due interpreter, or for the next flush
+        deadlines = [t for t in (scheduler.next_due_time(), flush_time) if t is not None]
+        timeout = max(0, min(deadlines) - time.monotonic()) if len(deadlines) > 0 else None
+
+        if connection.poll(timeout):
+            while connection.poll():
+                message = connection.recv()
+                kind, key = message[0], message[1]
+                if kind == 'stop':
+                    connection.send(scheduler.outbox + [('stopped', None)])
+                    return
+                elif kind == 'add':
+                    interpreters[key] = message[2]
+                    scheduler.keys[message[2]] = key
+                    scheduler.add(message[2])
+                elif kind == 'queue' and key in interpreters:
+                    interpreters[key].queue(*message[2])
+                elif kind == 'remove' and key in interpreters:
+                    interpreter = interpreters.pop(key)
+                    if scheduler.keys.pop(interpreter, None) is not None:
+                        scheduler.remove(interpreter)
+
+        scheduler.run_once()
+
+        # Forget interpreters that reached a final configuration or that failed
+        if len(interpreters) > len(scheduler.keys):
+            for key in [k for k, i in interpreters.items() if i not in scheduler.keys]:
+                del interpreters[key]
+
+        if len(scheduler.outbox) > 0:
+            now = time.monotonic()
+            if flush_time is None:
+                flush_time = now + batch_interval
+            if len(scheduler.outbox) >= batch_size or now >= flush_time:
+                connection.send(scheduler.outbox)
+                scheduler.outbox = []
+                flush_time = None
+
+
+class ShardedRunner:
+    """
+    A runner that partitions interpreters across a pool of worker processes, in order to
+    execute large fleets of interpreters on several cores.
+
+    Each interpreter is identified by a (hashable) session key, that determines the worker
+    process owning the interpreter (see `shard_for`). Interpreters are added using `add`, that
+    sends a pickled copy of the interpreter to its worker. Events are then routed to the owning
+    worker using `queue`. In each worker, interpreters are executed by a *Scheduler*.
+
+    Workers send back a *StepSummary* for each processed macro step. Summaries are sent in
+    batches, either when `batch_size` summaries are pending, or `batch_interval` seconds after
+    the first pending summary was produced. They are received by a background thread and can be
+    retrieved using `collect`. Interpreters reaching a final configuration are discarded by their
+    worker. If an exception is raised during the execution of an interpreter, the interpreter is
+    discarded, and the exception is reported by `failures`.
+
+    Notice that the interpreters are executed in other processes: the instances given to `add`
+    are not modified, and their listeners and bound interpreters should be picklable.
+
+    The execution must be started with `start`, and stopped with `stop`.
+
+    :param processes: number of worker processes, default to the number of CPUs.
+    :param quantum: see *Scheduler*.
+    :param batch_size: maximal number of summaries sent at once by a worker.
+    :param batch_interval: maximal delay before sending pending summaries, in seconds.
+    :param context: multiprocessing context to use, default to the default context.
+    """
+
+    def __init__(self, processes: int = None, *, quantum: int = 1, batch_size: int = 100,
+                 batch_interval: float = 0.01, context: Any = None) -> None:
+        context = multiprocessing.get_context() if context is None else context
+        self.processes = multiprocessing.cpu_count() if processes is None else processes
+        if self.processes < 1:
+            raise ValueError('Number of processes must be strictly positive, '
+                             'not {}'.format(self.processes))
+
+        self._connections = []  # type: List[Connection]
+        self._locks = []  # type: List[threading.Lock]
+        self._workers = []  # type: List[Any]
+        for _ in range(self.processes):
+            connection, child = context.Pipe()
+            worker = context.Process(
+                target=_worker, args=(child, quantum, batch_size, batch_interval), daemon=True)
+            self._connections.append(connection)
+            self._locks.append(threading.Lock())
+            self._workers.append(worker)
+
+        self._summaries = deque()  # type: deque
+        self._received = threading.Condition()
+        self._failures = []  # type: List[Tuple[Hashable, Exception]]
+        self._reader = threading.Thread(target=self._read, daemon=True)
+        self._started = False
+        self._stopped = False
+
+    @property
+    def running(self) -> bool:
+        """
+        Holds if the worker processes are running.
+        """
+        return self._started and not self._stopped
+
+    @property
+    def failures(self) -> List[Tuple[Hashable, Exception]]:
+        """
+        List of (key, exception) pairs for the interpreters whose execution failed.
+        """
+        with self._received:
+            return list(self._failures)
+
+    def shard_for(self, key: Hashable) -> int:
+        """
+        Return the index of the worker process that owns the interpreter with given key.
+        This index only depends on the representation of the key and on the number of
+        processes, not on the hash seed of the current process.
+
+        :param key: a session key
+        :return: the index of a worker process
+        """
+        return zlib.crc32(repr(key).encode()) % self.processes
+
+    def start(self) -> None:
+        """
+        Start the worker processes.
+        """
+        if self._stopped:
+            raise RuntimeError('Cannot restart a stopped runner.')
+        elif self._started:
+            raise RuntimeError('Runner is already started')
+        for worker in self._workers:
+            worker.start()
+        self._started = True
+        self._reader.start()
+
+    def stop(self) -> None:
+        """
+        Stop the worker processes. Their pending summaries are received before they stop.
+        """
+        if not self.running:
+            return
+        for index in range(self.processes):
+            self._send(index, ('stop', None))
+        self._reader.join()
+        for worker in self._workers:
+            worker.join()
+        self._stopped = True
+
+    def add(self, key: Hashable, interpreter: Interpreter) -> None:
+        """
+        Send given interpreter to the worker process that owns given key. If an interpreter
+        with the same key already exists, it is replaced.
+
+        :param key: a session key
+        :param interpreter: an interpreter
+        """
+        self._send(self.shard_for(key), ('remove', key))
+        self._send(self.shard_for(key), ('add', key, interpreter))
+
+    def remove(self, key: Hashable) -> None:
+        """
+        Discard the interpreter with given key.
+
+        :param key: a session key
+        """
+        self._send(self.shard_for(key), ('remove', key))
+
+    def queue(self, key: Hashable, event_or_name: Union[str, Event],
+              *event_or_names: Union[str, Event], **parameters) -> 'ShardedRunner':
+        """
+        Queue given events in the interpreter with given key, see *Interpreter.queue*.
+        Events sent to an unknown (or discarded) interpreter are ignored.
+
+        :param key: a session key
+        :param event_or_name: name of the event or Event instance
+        :param event_or_names: additional events
+        :param parameters: event parameters.
+        :return: *self* so it can be chained.
+        """
+        events = [
+            Event(event, **parameters) if isinstance(event, str) else event
+            for event in [event_or_name] + list(event_or_names)
+        ]
+        self._send(self.shard_for(key), ('queue', key, events))
+        return self
+
+    def collect(self, timeout: float = 0) -> List[StepSummary]:
+        """
+        Return the summaries that were received since the last call, in the order they
+        were received. Summaries of a given interpreter are always received in order.
+
+        :param timeout: if no summary was received, wait at most this number of seconds
+            for one to be received. If None, wait until a summary is received.
+        :return: a possibly empty list of summaries
+        """
+        with self._received:
+            if len(self._summaries) == 0 and (timeout is None or timeout > 0):
+                self._received.wait(timeout)
+            summaries = list(self._summaries)
+            self._summaries.clear()
+        return summaries
+
+    def _send(self, index: int, message: Tuple) -> None:
+        """
+        Send given message to given worker process.
+
+        :param index: index of a worker process
+        :param message: message to send
+        :raise RuntimeError: if the runner is not running
+        """
+        if not self.running:
+            raise RuntimeError('Runner is not running')
+        with self._locks[index]:
+            self._connections[index].send(message)
+
+    def _read(self) -> None:
+        """
+        Receive the batches sent by the worker processes, until they are stopped.
+        """
+        connections = list(self._connections)
+        while len(connections) > 0:
+            for connection in wait(connections):
+                try:
+                    batch = connection.recv()
+                except EOFError:
+                    connections.remove(connection)
+                    continue
+
+                with self._received:
+                    for message in batch:
+                        if message[0] == 'step':
+                            self._summaries.append(message[1])
+                        elif message[0] == 'failure':
+                            self._failures.append((message[1], message[2]))
+                        elif message[0] == 'stopped':
+                            connections.remove(connection)
+                    self._received.notify_all()
@@ -1,4 +1,5 @@
 import os
+import random
 import pytest
 
 from sismic.io import import_from_yaml
@@ -44,6 +45,11 @@ def simple_statechart():
     return import_from_yaml(filepath='tests/yaml/simple.yaml')
 
 
+@pytest.fixture
+def timer_statechart():
+    return import_from_yaml(filepath='tests/yaml/timer.yaml')
+
+
 @pytest.fixture
 def composite_statechart():
     return import_from_yaml(filepath='tests/yaml/composite.yaml')
@@ -105,3 +111,34 @@ def example_from_tests(request):
                         'writer_options'])
 def example_from_docs(request):
     return import_from_yaml(filepath=os.path.join('docs', 'examples', request.param + '.yaml'))
+
+
+@pytest.fixture
+def check_equivalence():
+    """
+    Return a function that checks that the interpreters created by given callable behave
+    like an Interpreter for given statechart, on a random sequence of its events.
+    """
+    def run(interpreter, events):
+        trace = [repr(interpreter.execute(max_steps=10))]
+        for event in events:
+            interpreter.clock.time += 1
+            trace.append(repr(interpreter.queue(event).execute(max_steps=10)))
+            trace.append(interpreter.configuration)
+        return trace
+
+    def check(statechart, create, seed=42, length=50):
+        events = statechart.events_for()
+        if len(events) == 0:
+            events = ['unknown']
+        events = [random.Random(seed).choice(events) for _ in range(length)]
+
+        try:
+            expected = run(Interpreter(statechart), events)
+        except Exception as e:
+            with pytest.raises(type(e)):
+                run(create(), events)
+        else:
+            assert run(create(), events) == expected
+
+    return check
@@ -1,9 +1,10 @@
 import pytest
 
 from sismic import code
-from sismic.code.python import FrozenContext
+from sismic.code.python import FrozenContext, _compile
 from sismic.exceptions import CodeEvaluationError
 from sismic.interpreter import Event, InternalEvent, MetaEvent
+from sismic.model import Transition
 
 
 def test_dummy_evaluator(mocker):
@@ -101,6 +102,13 @@ class TestPythonEvaluator:
         events = evaluator._execute_code('notify("hello", x=1, y="world")')
         assert events == [MetaEvent('hello', x=1, y='world')]
 
+    def test_reused_namespace(self, evaluator):
+        namespace = evaluator._execution_namespace
+        assert evaluator._execute_code('send("hello")') == [InternalEvent('hello')]
+        assert evaluator._execute_code('a = 1') == []
+        assert evaluator._execution_namespace is namespace
+        assert 'a' not in namespace
+
     def test_no_event_raised_by_preamble(self, interpreter, evaluator):
         interpreter.statechart.preamble = 'send("test")'
         with pytest.raises(CodeEvaluationError):
@@ -113,3 +121,35 @@ class TestPythonEvaluator:
     @pytest.mark.xfail(reason='http://stackoverflow.com/questions/32894942/listcomp-unable-to-access-locals-defined-in-code-called-by-exec-if-nested-in-fun and possibly fixed with https://bugs.python.org/issue3692')
     def test_access_outer_scope(self, evaluator):
         evaluator._execute_code('d = [x for x in range(10) if x != a]', additional_context={'a': 1})
+
+
+def test_precompile(microwave):
+    code.PythonEvaluator.precompile(microwave.statechart)
+    misses = _compile.cache_info().misses
+
+    microwave.queue('door_opened', 'item_placed', 'door_closed', 'timer_inc', 'cooking_start')
+    microwave.execute()
+    assert _compile.cache_info().misses == misses
+
+
+def test_time_constraints():
+    evaluator = code.PythonEvaluator()
+    assert evaluator.time_constraints(Transition('s1', 's2')) == []
+    assert evaluator.time_constraints(Transition('s1', 's2', guard='x > 2')) == []
+    assert evaluator.time_constraints(
+        Transition('s1', 's2', guard='after(10) and (idle(-1.5) or after(x))')
+    ) == [('after', 10), ('idle', -1.5)]
+    assert evaluator.time_constraints(Transition('s1', 's2', guard='after(')) == []
+
+
+def test_necessary_time_constraints():
+    evaluator = code.PythonEvaluator()
+
+    def necessary(guard):
+        return evaluator.time_constraints(Transition('s1', 's2', guard=guard), necessary=True)
+
+    assert necessary('after(10)') == [('after', 10)]
+    assert necessary('after(10) and idle(2) and x > 2') == [('after', 10), ('idle', 2)]
+    assert necessary('x > 2 and after(10)') == []
+    assert necessary('after(10) or x > 2') == []
+    assert necessary('not after(10)') == []
@@ -0,0 +1,70 @@
+import pickle
+
+import pytest
+
+from sismic.interpreter import Interpreter
+from sismic.interpreter.compiler import CompiledInterpreter, compile_statechart, generate_module
+from sismic.io.datadict import export_to_dict, import_from_dict
+
+
+def compile_and_import(statechart):
+    klass = compile_statechart(statechart)
+    assert issubclass(klass, CompiledInterpreter)
+
+    # Compiled statechart is embedded as a dict, and the order of children may change
+    return import_from_dict(export_to_dict(statechart)), klass
+
+
+def test_examples_from_tests(example_from_tests, check_equivalence):
+    check_equivalence(*compile_and_import(example_from_tests))
+
+
+def test_examples_from_docs(example_from_docs, check_equivalence):
+    check_equivalence(*compile_and_import(example_from_docs))
+
+
+def test_generated_module(simple_statechart, tmpdir):
+    filepath = str(tmpdir.join('compiled.py'))
+    source = generate_module(simple_statechart, filepath=filepath)
+    with open(filepath) as f:
+        assert f.read() == source
+
+    namespace = {}
+    exec(compile(source, filepath, 'exec'), namespace)
+    assert namespace['statechart']().name == simple_statechart.name
+
+    interpreter = namespace['Interpreter']()
+    interpreter.execute()
+    assert interpreter.configuration == ['root', 's1']
+    interpreter.queue('goto s2').execute()
+    assert interpreter.configuration == ['root', 's3']
+
+
+def test_compiled_interpreter_is_serialisable(simple_statechart, tmpdir, monkeypatch):
+    generate_module(simple_statechart, filepath=str(tmpdir.join('compiled_simple.py')))
+    monkeypatch.syspath_prepend(str(tmpdir))
+    module = __import__('compiled_simple')
+
+    interpreter = module.Interpreter()
+    interpreter.execute()
+
+    interpreter = pickle.loads(pickle.dumps(interpreter))
+    interpreter.queue('goto s2').execute()
+    assert interpreter.configuration == ['root', 's3']
+
+
+def test_compiled_interpreter_does_less_work(simple_statechart, mocker):
+    interpreter = compile_statechart(simple_statechart)()
+    sorted_groupby = mocker.patch('sismic.interpreter.default.sorted_groupby')
+    leaf_for = mocker.spy(interpreter.statechart, 'leaf_for')
+
+    interpreter.execute()
+    interpreter.queue('goto s2', 'goto s1').execute()
+    call_count = leaf_for.call_count
+
+    # Candidate transitions come from the dispatch table, and the leaves requiring a
+    # stabilization step are computed once per configuration.
+    interpreter.queue('goto s2', 'goto s1').execute()
+    assert interpreter.configuration == ['root', 's1']
+    sorted_groupby.assert_not_called()
+    assert leaf_for.call_count == call_count
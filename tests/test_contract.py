@@ -23,6 +23,17 @@ def test_state_precondition(elevator):
     assert isinstance(e.value.obj, StateMixin)
 
 
+def test_stop_at_first_failing_precondition(elevator):
+    elevator = Interpreter(elevator.statechart, initial_context={'x': None})
+    elevator.statechart.state_for('movingUp').preconditions.extend(['x is not None', 'x > 0'])
+    elevator.queue('floorSelected', floor=4)
+
+    with pytest.raises(PreconditionError) as e:
+        elevator.execute()
+
+    assert e.value.condition == 'x is not None'
+
+
 def test_state_postcondition(elevator):
     elevator.statechart.state_for('movingUp').postconditions.append('False')
     elevator.queue('floorSelected', floor=4)
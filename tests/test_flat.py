@@ -0,0 +1,47 @@
+from functools import partial
+
+from sismic.interpreter import Interpreter
+from sismic.interpreter.flat import FlattenedInterpreter
+from sismic.model import Transition
+
+
+def test_examples_from_tests(example_from_tests, check_equivalence):
+    check_equivalence(example_from_tests, partial(FlattenedInterpreter, example_from_tests))
+
+
+def test_examples_from_docs(example_from_docs, check_equivalence):
+    check_equivalence(example_from_docs, partial(FlattenedInterpreter, example_from_docs))
+
+
+def test_supports(simple_statechart, history_statechart, elevator):
+    assert FlattenedInterpreter(simple_statechart).flattened
+    assert not FlattenedInterpreter(history_statechart).flattened
+    assert not FlattenedInterpreter(elevator.statechart).flattened
+
+
+def test_memoised_steps(simple_statechart, mocker):
+    interpreter = FlattenedInterpreter(simple_statechart)
+    interpreter.execute()
+    interpreter.queue('goto s2').execute()
+    interpreter.queue('goto s1').execute()
+
+    select = mocker.spy(interpreter, '_select_transitions')
+    stabilize = mocker.spy(Interpreter, '_create_stabilization_step')
+    for _ in range(3):
+        interpreter.queue('goto s2').execute()
+        assert interpreter.configuration == ['root', 's3']
+        interpreter.queue('goto s1').execute()
+        assert interpreter.configuration == ['root', 's1']
+    assert select.call_count == 0
+    assert stabilize.call_count == 0
+
+
+def test_statechart_changes(simple_statechart):
+    interpreter = FlattenedInterpreter(simple_statechart)
+    interpreter.execute()
+    assert interpreter.flattened
+
+    simple_statechart.add_transition(Transition('s1', 's2', event='guarded', guard='False'))
+    assert not interpreter.flattened
+    interpreter.queue('guarded').execute()
+    assert interpreter.configuration == ['root', 's1']
@@ -1,12 +1,17 @@
 import pytest
 import pickle
+import sismic.interpreter.default
+import random
 
 from collections import Counter
+from functools import partial
+from threading import Thread
 
 from sismic.exceptions import ExecutionError, NonDeterminismError, ConflictingTransitionsError
 from sismic.code import DummyEvaluator
-from sismic.interpreter import Interpreter, Event, InternalEvent
+from sismic.interpreter import Interpreter, Event, InternalEvent, EventQueue, TimerWheelQueue
 from sismic.helpers import coverage_from_trace, log_trace, run_in_background
+from sismic.io import import_from_yaml
 from sismic.model import Transition, MacroStep, MicroStep, MetaEvent
 from sismic import testing
 
@@ -77,11 +82,255 @@ class TestInterpreterWithSimple:
         assert interpreter.configuration == []
         assert interpreter.final
 
+    def test_is_active(self, interpreter):
+        assert interpreter.is_active('root')
+        assert interpreter.is_active('s1')
+        assert not interpreter.is_active('s2')
+
+        interpreter.queue('goto s2').execute_once()
+        assert not interpreter.is_active('s1')
+        assert interpreter.is_active('s2')
+
+    def test_statechart_changes(self, interpreter):
+        interpreter.statechart.add_transition(Transition('s1', 's3', event='goto s3'))
+        interpreter.queue('goto s3').execute_once()
+        assert interpreter.configuration == ['root', 's3']
+
+        interpreter.statechart.rotate_transition(
+            interpreter.statechart.transitions_with('goto s1')[0], new_source='s2')
+        interpreter.queue('goto s1').execute_once()
+        assert interpreter.configuration == ['root', 's3']
+
+    def test_candidate_transitions_cache(self, interpreter, mocker):
+        interpreter.queue('goto s2', 'goto s1').execute()
+
+        sorted_groupby = mocker.patch('sismic.interpreter.default.sorted_groupby')
+        interpreter.queue('goto s2', 'goto s1').execute()
+        assert interpreter.configuration == ['root', 's1']
+        sorted_groupby.assert_not_called()
+        mocker.stopall()
+
+        interpreter = Interpreter(interpreter.statechart)
+        interpreter.candidates_cache_size = 2
+        interpreter.queue('goto s2', 'goto s1').execute()
+        assert interpreter.configuration == ['root', 's1']
+        assert len(interpreter._candidates_cache) == 2
+
+        # Accepted events share the same bounded cache
+        assert interpreter._accepted_events() == {'goto s2'}
+        assert ('accepted events', frozenset(['root', 's1'])) in interpreter._candidates_cache
+        assert len(interpreter._candidates_cache) == 2
+
+    def test_unaccepted_event(self, interpreter, mocker):
+        assert interpreter._accepted_events() == {'goto s2'}
+        listener = mocker.MagicMock()
+        interpreter.attach(listener)
+        candidates = mocker.spy(interpreter, '_candidate_transitions')
+
+        step = interpreter.queue('goto s1').execute_once()
+        assert step.event.name == 'goto s1'
+        assert step.transitions == []
+        assert interpreter.configuration == ['root', 's1']
+        assert candidates.call_args[0][0] is None
+        assert listener.call_args_list[1][0][0].name == 'event consumed'
+
+        # Eventless transitions are still considered, and event is not consumed
+        interpreter.queue('goto s2').execute_once()
+        assert interpreter._accepted_events() == set()
+        step = interpreter.queue('goto s1').execute_once()
+        assert step.event is None
+        assert interpreter.configuration == ['root', 's3']
+        step = interpreter.execute_once()
+        assert step.event.name == 'goto s1'
+        assert interpreter.configuration == ['root', 's1']
+
     def test_simple_final(self, interpreter):
         interpreter.queue('goto s2').queue('goto final').execute()
         assert interpreter.final
 
 
+class TestInterpreterWithTimer:
+    @pytest.fixture
+    def interpreter(self, timer_statechart):
+        return Interpreter(timer_statechart)
+
+    def test_next_wakeup_time(self, interpreter):
+        assert interpreter.next_wakeup_time() == 0
+        interpreter.execute()
+        assert interpreter.next_wakeup_time() == 3
+
+        interpreter.clock.time = 2
+        assert interpreter.execute() == []
+        assert interpreter.next_wakeup_time() == 3
+
+        interpreter.clock.time = 3
+        interpreter.execute()
+        assert interpreter.configuration == ['root', 's2']
+        assert interpreter.next_wakeup_time() == 5
+
+        interpreter.queue(Event('x', delay=1))
+        assert interpreter.next_wakeup_time() == 4
+        interpreter.queue('y')
+        assert interpreter.next_wakeup_time() == 3
+        interpreter.execute()
+
+        interpreter.clock.time = 5
+        interpreter.execute()
+        assert interpreter.configuration == ['root', 's3']
+        assert interpreter.next_wakeup_time() == 7
+
+        interpreter.clock.time = 7
+        interpreter.execute()
+        assert interpreter.final
+        assert interpreter.next_wakeup_time() is None
+
+    def test_time_constraints_cache(self, interpreter, mocker):
+        time_constraints = mocker.spy(interpreter, '_compute_time_constraints')
+        for time in range(8):
+            interpreter.clock.time = time
+            interpreter.execute()
+            interpreter.next_wakeup_time()
+            interpreter.next_wakeup_time()
+
+        # Computed once per configuration (s1, s2, s3 and the final one), in the bounded cache
+        # of the candidate transitions
+        assert interpreter.final
+        assert time_constraints.call_count == 4
+        key = ('time constraints', frozenset(['root', 's1']))
+        assert key in interpreter._candidates_cache
+
+    def test_guards_are_not_evaluated_before_deadline(self, interpreter, mocker):
+        interpreter.execute()
+        evaluate_guard = mocker.spy(interpreter._evaluator, 'evaluate_guard')
+
+        for time in (1, 2, 2.9):
+            interpreter.clock.time = time
+            assert interpreter.execute() == []
+        evaluate_guard.assert_not_called()
+
+        interpreter.clock.time = 3
+        interpreter.execute()
+        assert interpreter.configuration == ['root', 's2']
+        assert evaluate_guard.call_count == 1
+
+    def test_guard_deadlines_are_serialisable(self, interpreter, mocker):
+        interpreter.execute()
+        interpreter = pickle.loads(pickle.dumps(interpreter))
+        assert set(interpreter._guard_deadlines) <= {
+            id(transition) for transition in interpreter.statechart.transitions}
+
+        evaluate_guard = mocker.spy(interpreter._evaluator, 'evaluate_guard')
+        interpreter.clock.time = 2
+        assert interpreter.execute() == []
+        evaluate_guard.assert_not_called()
+
+        interpreter.clock.time = 3
+        interpreter.execute()
+        assert interpreter.configuration == ['root', 's2']
+
+
+class TestCancellation:
+    @pytest.fixture
+    def statechart(self):
+        return import_from_yaml(text="""
+        statechart:
+          name: cancellation
+          root state:
+            name: root
+            initial: waiting
+            states:
+            - name: waiting
+              on entry: timeout = send('timeout', delay=10)
+              on exit: cancel(timeout)
+              transitions:
+              - target: done
+                event: reply
+              - target: failed
+                event: timeout
+            - name: done
+              on entry: cancelled = cancel(send('ignored'))
+            - name: failed
+        """)
+
+    def test_queued_event(self, simple_statechart):
+        interpreter = Interpreter(simple_statechart)
+        interpreter.execute()
+
+        event = Event('goto s2', delay=5)
+        interpreter.queue(event, Event('goto s2'))
+        assert interpreter.cancel(event)
+        assert not interpreter.cancel(event)
+        assert not interpreter.cancel(Event('goto s2'))
+        assert len(interpreter._external_queue) == 1
+
+        interpreter.clock.time = 5
+        interpreter.execute()
+        assert interpreter.configuration == ['root', 's3']
+        interpreter.queue('goto s1').execute()
+        assert interpreter.execute() == []
+        assert interpreter.configuration == ['root', 's1']
+
+    def test_sent_event(self, statechart):
+        interpreter = Interpreter(statechart)
+        interpreter.execute()
+        assert len(interpreter._internal_queue) == 1
+
+        interpreter.clock.time = 5
+        interpreter.queue('reply').execute()
+        assert interpreter.configuration == ['root', 'done']
+        assert interpreter.context['cancelled']
+        assert len(interpreter._internal_queue) == 0
+
+        interpreter.clock.time = 20
+        assert interpreter.execute() == []
+        assert interpreter.configuration == ['root', 'done']
+
+    def test_sent_earlier_in_step(self):
+        statechart = import_from_yaml(text="""
+        statechart:
+          name: cancellation in the same step
+          root state:
+            name: root
+            initial: idle
+            states:
+            - name: idle
+              transitions:
+              - target: child
+                event: start
+            - name: parent
+              on entry: pending = send('later')
+              initial: child
+              states:
+              - name: child
+                on entry: cancelled = cancel(pending)
+                transitions:
+                - target: failed
+                  event: later
+            - name: failed
+        """)
+        interpreter = Interpreter(statechart)
+        interpreter.execute()
+
+        # Both states are entered in the same micro step
+        step = interpreter.queue('start').execute_once()
+        assert interpreter.context['cancelled']
+        assert step.sent_events == []
+        assert len(interpreter._internal_queue) == 0
+
+        assert interpreter.execute() == []
+        assert interpreter.configuration == ['root', 'parent', 'child']
+
+    def test_pickled_queue(self, statechart):
+        interpreter = Interpreter(statechart)
+        interpreter.execute()
+
+        interpreter = pickle.loads(pickle.dumps(interpreter))
+        interpreter.queue('reply').execute()
+        interpreter.clock.time = 20
+        assert interpreter.execute() == []
+        assert interpreter.configuration == ['root', 'done']
+
+
 class TestInterpreterWithInternal:
     @pytest.fixture
     def interpreter(self, internal_statechart):
@@ -601,6 +850,52 @@ class TestInterpreterBinding:
         assert i2._select_event(consume=False) is None
 
 
+
+class TestListenerRouting:
+    @pytest.fixture()
+    def interpreter(self, simple_statechart):
+        return Interpreter(simple_statechart)
+
+    def test_no_meta_event_without_listener(self, interpreter, mocker):
+        meta_event = mocker.patch('sismic.interpreter.default.MetaEvent')
+        interpreter.queue('goto s2').execute()
+        assert interpreter.configuration == ['root', 's3']
+        assert meta_event.call_count == 0
+
+    def test_filtered_listener(self, interpreter, mocker):
+        entered, everything = [], []
+        interpreter.attach(entered.append, events=['state entered'])
+        interpreter.attach(everything.append)
+        interpreter.execute()
+
+        assert [e.state for e in entered] == ['root', 's1']
+        assert len(everything) > len(entered)
+        assert [e.name for e in everything].count('state entered') == 2
+
+        interpreter.detach(everything.append)
+        meta_event = mocker.spy(sismic.interpreter.default, 'MetaEvent')
+        interpreter.queue('goto s2').execute()
+        assert [e.state for e in entered] == ['root', 's1', 's2', 's3']
+        assert {call.args[0] for call in meta_event.call_args_list} == {'state entered'}
+
+    def test_order_and_detach(self, interpreter):
+        calls = []
+        first = lambda e: calls.append(('first', e.name))  # noqa: E731
+        second = lambda e: calls.append(('second', e.name))  # noqa: E731
+        interpreter.attach(first)
+        interpreter.attach(second, events={'step ended', 'custom'})
+
+        interpreter._raise_event(MetaEvent('custom'))
+        interpreter._raise_event(MetaEvent('other'))
+        assert calls == [('first', 'custom'), ('second', 'custom'), ('first', 'other')]
+
+        interpreter.detach(first)
+        calls.clear()
+        interpreter.execute_once()
+        assert calls == [('second', 'step ended')]
+        assert first not in interpreter._listeners
+
+
 def test_interpreter_is_serialisable(microwave):
     microwave.queue(
         'door_opened',
@@ -687,6 +982,420 @@ class TestEventQueue:
         assert event == Event('test1', delay=0)
         event = interpreter._select_event(consume=True)
         assert event == Event('test3', delay=2)
-        
-        
-    
\ No newline at end of file
+
+    def test_inbox(self, interpreter):
+        interpreter.queue('test1', 'test2')
+        assert len(interpreter._inbox) == 2
+        assert len(interpreter._external_queue) == 0
+
+        interpreter.execute_once()
+        assert len(interpreter._inbox) == 0
+        assert [event.name for _, event in interpreter._external_queue] == ['test2']
+
+    def test_concurrent_producers(self, interpreter):
+        consumed = []
+        interpreter.attach(lambda e: consumed.append(e.event) if e.name == 'event consumed' else None)
+
+        def produce(name):
+            for i in range(500):
+                interpreter.queue(name, index=i)
+
+        threads = [Thread(target=produce, args=('test{}'.format(i),)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        while any(thread.is_alive() for thread in threads):
+            interpreter.execute_once()
+        interpreter.execute()
+
+        assert len(consumed) == 2000
+        for i in range(4):
+            indexes = [event.index for event in consumed if event.name == 'test{}'.format(i)]
+            assert indexes == list(range(500))
+
+
+class TestBoundedQueue:
+    def interpreter(self, statechart, policy):
+        interpreter = Interpreter(statechart, queue_size=2, queue_policy=policy)
+        interpreter.execute()
+        return interpreter
+
+    def consumed(self, interpreter):
+        steps = interpreter.execute()
+        return [(step.event.name, step.event.data) for step in steps if step.event is not None]
+
+    def test_unknown_policy(self, simple_statechart):
+        with pytest.raises(ValueError):
+            Interpreter(simple_statechart, queue_size=2, queue_policy='unknown')
+
+    def test_drop_newest(self, simple_statechart):
+        interpreter = self.interpreter(simple_statechart, 'drop newest')
+        interpreter.queue('goto s2', 'goto s1', 'goto s2', 'goto final')
+        assert interpreter.dropped_events == 2
+        assert self.consumed(interpreter) == [('goto s2', {}), ('goto s1', {})]
+
+    def test_drop_oldest(self, simple_statechart):
+        interpreter = self.interpreter(simple_statechart, 'drop oldest')
+        interpreter.queue('goto s1', 'goto s2', 'goto s1', 'goto s2')
+        assert interpreter.dropped_events == 2
+        assert self.consumed(interpreter) == [('goto s1', {}), ('goto s2', {})]
+        assert interpreter.configuration == ['root', 's3']
+
+        # Already in the external queue
+        interpreter.queue('goto s1', 'goto s2')
+        interpreter._drain_inbox()
+        interpreter.queue('goto final')
+        assert self.consumed(interpreter) == [('goto s2', {}), ('goto final', {})]
+        assert interpreter.final
+
+    def test_coalesce(self, simple_statechart):
+        interpreter = self.interpreter(simple_statechart, 'coalesce')
+        interpreter.queue('goto s2', 'goto s1', x=1)
+        interpreter.queue('goto s2', x=2)
+        interpreter.queue('goto final', x=3)
+        assert self.consumed(interpreter) == [('goto s2', {'x': 2}), ('goto s1', {'x': 1})]
+        assert interpreter.coalesced_events == 1
+        assert interpreter.dropped_events == 1
+
+    def test_coalesce_external_queue(self, simple_statechart):
+        interpreter = self.interpreter(simple_statechart, 'coalesce')
+        interpreter.queue('temperature', value=1)
+        interpreter.queue('goto s2')
+        interpreter._drain_inbox()
+
+        # Pending events are already in the external queue
+        interpreter.queue('temperature', value=2)
+        interpreter.queue('goto final')
+        interpreter._drain_inbox()
+        assert [(e.name, e.data) for _, e in interpreter._external_queue] == [
+            ('temperature', {'value': 2}), ('goto s2', {})]
+        assert interpreter.coalesced_events == 1
+        assert interpreter.dropped_events == 1
+
+    def test_meta_events(self, simple_statechart):
+        interpreter = self.interpreter(simple_statechart, 'drop oldest')
+        meta_events = []
+        interpreter.attach(meta_events.append, events=['event dropped', 'step started'])
+
+        oldest = Event('goto s1')
+        interpreter.queue(oldest, 'goto s2', 'goto s1')
+        interpreter.execute_once()
+        assert [e.name for e in meta_events] == ['step started', 'event dropped']
+        assert meta_events[1].event is oldest
+
+        interpreter = self.interpreter(simple_statechart, 'coalesce')
+        interpreter.attach(meta_events.append, events=['event dropped', 'event coalesced'])
+        meta_events.clear()
+
+        pending, newest = Event('goto s2'), Event('goto s2', x=1)
+        interpreter.queue(pending, 'goto s1', newest, 'goto final')
+        interpreter._drain_inbox()
+        assert [e.name for e in meta_events] == ['event coalesced', 'event dropped']
+        assert meta_events[0].event is pending and meta_events[0].into is newest
+        assert meta_events[1].event == Event('goto final')
+
+    def test_coalesce_delayed(self, simple_statechart):
+        interpreter = self.interpreter(simple_statechart, 'coalesce')
+
+        # Not coalesced into an event that is due earlier
+        interpreter.queue('goto s2', 'goto s1')
+        interpreter.queue('goto s2', delay=5)
+        assert self.consumed(interpreter) == [('goto s2', {}), ('goto s1', {})]
+        assert interpreter.dropped_events == 1
+        interpreter.clock.time = 5
+        assert self.consumed(interpreter) == []
+
+        # Coalesced into an event that is due later, and keeps its time
+        interpreter.queue(Event('goto s2', delay=5), Event('goto s1', delay=1))
+        interpreter.queue('goto s2', x=1)
+        assert interpreter.coalesced_events == 1
+        interpreter.clock.time = 9
+        assert self.consumed(interpreter) == [('goto s1', {'delay': 1})]
+        interpreter.clock.time = 10
+        assert self.consumed(interpreter) == [('goto s2', {'x': 1})]
+
+    @pytest.mark.parametrize('policy', ['drop newest', 'drop oldest', 'coalesce'])
+    def test_bounded_memory(self, simple_statechart, policy):
+        interpreter = self.interpreter(simple_statechart, policy)
+        interpreter.queue('goto s2')
+        interpreter._drain_inbox()
+
+        for i in range(5000):
+            interpreter.queue('event {}'.format(i % 7), x=i)
+            assert len(interpreter._inbox) + len(interpreter._overflow) <= 2
+        # Discarded events are only kept if they are listened to
+        assert len(interpreter._discarded) == 0
+
+        interpreter._drain_inbox(drop=True)
+        discarded = interpreter.dropped_events + interpreter.coalesced_events
+        assert discarded + len(interpreter._external_queue) == 5001
+
+    def test_block(self, simple_statechart):
+        interpreter = self.interpreter(simple_statechart, 'block')
+        interpreter.queue('goto s2', 'goto s1')
+        producer = Thread(target=interpreter.queue, args=('goto s2', 'goto final'))
+        producer.start()
+        producer.join(0.05)
+        assert producer.is_alive()
+
+        # Only the first step consumes an event, the other one is eventless
+        interpreter.execute_once()
+        interpreter.execute_once()
+        assert interpreter.configuration == ['root', 's3']
+        producer.join(0.05)
+        assert producer.is_alive()
+
+        interpreter.execute()
+        producer.join(1)
+        assert not producer.is_alive()
+        interpreter.execute()
+        assert interpreter.final
+        assert interpreter.dropped_events == 0
+
+    def test_pickle(self, simple_statechart):
+        interpreter = self.interpreter(simple_statechart, 'drop newest')
+        interpreter.queue('goto s2')
+        interpreter = pickle.loads(pickle.dumps(interpreter))
+        interpreter.queue('goto s1', 'goto s2')
+        assert interpreter.dropped_events == 1
+
+
+class TestCoalescing:
+    @pytest.fixture()
+    def interpreter(self, simple_statechart):
+        interpreter = Interpreter(simple_statechart, coalesce={
+            'temperature': 'latest',
+            'ticks': 'sum',
+            'samples': lambda pending, queued: {'values': pending['values'] + queued['values']},
+        })
+        interpreter.execute()
+        return interpreter
+
+    def pending(self, interpreter):
+        interpreter._drain_inbox()
+        return [(event.name, event.data) for _, event in interpreter._external_queue]
+
+    def test_unknown_reducer(self, simple_statechart):
+        with pytest.raises(ValueError):
+            Interpreter(simple_statechart, coalesce={'temperature': 'unknown'})
+
+    def test_latest(self, interpreter):
+        interpreter.queue('temperature', value=1)
+        interpreter.queue('goto s2')
+        interpreter.queue('temperature', value=2)
+        interpreter.queue('goto s1')
+        interpreter.queue('temperature', value=3)
+        assert self.pending(interpreter) == [
+            ('temperature', {'value': 3}), ('goto s2', {}), ('goto s1', {})]
+        assert interpreter.coalesced_events == 2
+
+        # Once consumed, a new event is queued
+        interpreter.execute_once()
+        interpreter.queue('temperature', value=4)
+        assert self.pending(interpreter) == [
+            ('goto s2', {}), ('goto s1', {}), ('temperature', {'value': 4})]
+
+    def test_queued_during_step(self, interpreter, mocker):
+        compute_steps = interpreter._compute_steps
+
+        def queue_and_compute():
+            # Simulate another thread queueing an event while the step is computed
+            steps = compute_steps()
+            interpreter.queue('temperature', value=2)
+            return steps
+
+        interpreter.queue('temperature', value=1)
+        mocker.patch.object(interpreter, '_compute_steps', side_effect=queue_and_compute)
+
+        step = interpreter.execute_once()
+        assert step.event.data == {'value': 1}
+        assert self.pending(interpreter) == [('temperature', {'value': 2})]
+        assert interpreter.coalesced_events == 0
+
+    def test_reducers(self, interpreter):
+        interpreter.queue('ticks', count=1, unit='s')
+        interpreter.queue('samples', values=[1])
+        interpreter.queue('ticks', count=2, unit='ms')
+        interpreter.queue('samples', values=[2, 3])
+        assert self.pending(interpreter) == [
+            ('ticks', {'count': 3, 'unit': 'ms'}), ('samples', {'values': [1, 2, 3]})]
+
+    def test_queued_events_unchanged(self, interpreter):
+        first, second = Event('ticks', count=1), Event('ticks', count=2)
+        interpreter.queue(first, second)
+        assert self.pending(interpreter) == [('ticks', {'count': 3})]
+        assert first.data == {'count': 1} and second.data == {'count': 2}
+
+        # Any of the coalesced events can be cancelled
+        assert interpreter.cancel(first)
+        assert self.pending(interpreter) == []
+        assert not interpreter.cancel(second)
+
+    def test_meta_events(self, interpreter):
+        meta_events = []
+        interpreter.attach(meta_events.append, events=['event dropped', 'event coalesced'])
+
+        first, second = Event('temperature', value=1), Event('temperature', value=2)
+        interpreter.queue(first, second)
+        merged = interpreter._select_event()
+        assert [(e.name, e.event, e.into) for e in meta_events] == [
+            ('event coalesced', first, merged), ('event coalesced', second, merged)]
+        meta_events.clear()
+
+        # Cancelling a coalesced event drops the other ones
+        assert interpreter.cancel(second)
+        assert [(e.name, e.event) for e in meta_events] == [('event dropped', merged)]
+
+    def test_delayed_and_cancelled(self, interpreter):
+        # Not coalesced into an event that is due earlier
+        interpreter.queue('temperature', value=1)
+        interpreter.queue('temperature', value=2, delay=5)
+        assert self.pending(interpreter) == [
+            ('temperature', {'value': 1}), ('temperature', {'value': 2, 'delay': 5})]
+        assert interpreter.execute_once().event == Event('temperature', value=1)
+        assert interpreter.execute() == []
+
+        # Coalesced into an event that is due later, and keeps its time
+        interpreter.queue('temperature', value=3)
+        assert self.pending(interpreter) == [('temperature', {'value': 3})]
+        assert interpreter.execute() == []
+        interpreter.clock.time = 5
+        assert interpreter.execute_once().event == Event('temperature', value=3)
+
+        # Queued events are left unchanged, and can be used as handles
+        interpreter.queue('temperature', value=1, delay=5)
+        event = Event('temperature', value=2)
+        interpreter.queue(event)
+        assert self.pending(interpreter) == [('temperature', {'value': 2})]
+        assert interpreter._external_queue.peek()[1] is not event
+        assert interpreter.cancel(event)
+        interpreter.queue('temperature', value=4)
+        assert self.pending(interpreter) == [('temperature', {'value': 4})]
+
+
+class TestEventQueueStructure:
+    @pytest.fixture(params=[EventQueue, partial(TimerWheelQueue, resolution=0.5, slots=4, levels=2)],
+                    ids=['heap', 'timer wheel'])
+    def klass(self, request):
+        return request.param
+
+    def test_order(self, klass):
+        queue = klass()
+        queue.push(2, Event('e1'))
+        queue.push(1, Event('e2'))
+        queue.push(2, InternalEvent('e3'))
+        queue.push(1, Event('e4'))
+
+        assert len(queue) == 4
+        assert queue.peek() == (1, Event('e2'))
+        assert queue.ready(0) is None
+        assert queue.ready(1) == (1, Event('e2'))
+        assert [event.name for _, event in queue] == ['e2', 'e4', 'e3', 'e1']
+        assert [queue.pop()[1].name for _ in range(4)] == ['e2', 'e4', 'e3', 'e1']
+        assert queue.peek() is None
+
+        with pytest.raises(IndexError):
+            queue.pop()
+
+    def test_extend(self, klass):
+        queue = klass([(3, Event('e1'))])
+        queue.extend((i % 3, Event('e{}'.format(i))) for i in range(2, 10))
+        assert len(queue) == 9
+        assert [event.name for _, event in queue] == [
+            'e3', 'e6', 'e9', 'e4', 'e7', 'e2', 'e5', 'e8', 'e1']
+
+        queue.extend([(0, Event('e10'))])
+        assert queue.pop() == (0, Event('e3'))
+        assert list(queue)[2] == (0, Event('e10'))
+
+        queue.clear()
+        assert len(queue) == 0
+
+    def test_cancel(self, klass):
+        events = [Event('e{}'.format(i)) for i in range(6)]
+        queue = klass((i * 10, event) for i, event in enumerate(events))
+        queue.push(100, events[3])
+
+        assert queue.cancel(events[0])
+        assert queue.cancel(events[3])
+        assert queue.cancel(events[5])
+        assert not queue.cancel(events[5])
+        assert len(queue) == 3
+        assert list(queue) == [(10, events[1]), (20, events[2]), (40, events[4])]
+
+        assert queue.peek() == (10, events[1])
+        assert queue.ready(35) == (10, events[1])
+        assert [queue.pop() for _ in range(3)] == [(10, events[1]), (20, events[2]), (40, events[4])]
+        assert len(queue) == 0
+        assert queue.peek() is None
+
+    def test_replace(self, klass):
+        events = [Event('e{}'.format(i)) for i in range(3)]
+        queue = klass((i * 10, event) for i, event in enumerate(events))
+        new_event = Event('e')
+
+        assert queue.replace(events[1], new_event)
+        assert not queue.replace(events[1], new_event)
+        assert list(queue) == [(0, events[0]), (10, new_event), (20, events[2])]
+        assert queue.cancel(new_event)
+        assert [queue.pop() for _ in range(2)] == [(0, events[0]), (20, events[2])]
+
+    def test_timer_wheel(self, klass):
+        rng = random.Random(42)
+        queue, reference = klass(), EventQueue()
+        now = 0
+
+        for i in range(2000):
+            if rng.random() < 0.6:
+                item = (now + rng.choice([0, 0.1, 0.5, 1, 3, 17, 100, 1000 * rng.random()]),
+                        rng.choice([Event, InternalEvent])('e{}'.format(i)))
+                queue.push(*item)
+                reference.push(*item)
+            else:
+                now += rng.choice([0, 0.2, 1, 5, 50])
+
+            assert queue.peek() == reference.peek()
+            assert queue.ready(now) == reference.ready(now)
+            while queue.ready(now) is not None:
+                assert queue.pop() == reference.pop()
+            assert len(queue) == len(reference)
+
+        assert list(queue) == list(reference)
+        assert [queue.pop() for _ in range(len(queue))] == [
+            reference.pop() for _ in range(len(reference))]
+
+    def test_timer_wheel_start(self):
+        queue = TimerWheelQueue(now=10, resolution=1, slots=4, levels=2)
+        queue.push(40, Event('timeout'))
+        for i in range(100):
+            queue.push(11 + i % 20, Event('e{}'.format(i)))
+        assert len(queue._heap) == 0
+
+        # Popping a delayed event does not move the wheels forward
+        assert queue.pop() == (11, Event('e0'))
+        queue.push(12, Event('e'))
+        assert len(queue._heap) == 0
+        assert queue.ready(11) == (11, Event('e20'))
+        assert len(queue) == 101
+
+    def test_interpreter(self, klass, simple_statechart):
+        interpreter = Interpreter(simple_statechart, queue_klass=klass)
+        interpreter.execute()
+        interpreter.queue(Event('goto s2', delay=5), Event('goto s1', delay=6))
+
+        interpreter.clock.time = 4
+        assert interpreter.execute() == []
+        assert interpreter.next_wakeup_time() == 5
+
+        interpreter.clock.time = 6
+        interpreter.execute()
+        assert interpreter.configuration == ['root', 's1']
+
+    def test_interpreter_timer_wheel(self, simple_statechart):
+        interpreter = Interpreter(simple_statechart, queue_klass=TimerWheelQueue)
+        interpreter.clock.time = 100
+        interpreter.execute()
+
+        interpreter.queue(Event('goto s2', delay=30), Event('goto s1', delay=10))
+        interpreter.execute()
+        assert len(interpreter._external_queue._heap) == 0
+        assert interpreter.next_wakeup_time() == 110
@@ -1,3 +1,4 @@
+import pickle
 import pytest
 
 from sismic.exceptions import StatechartError
@@ -36,6 +37,22 @@ class TestEvents:
         with pytest.raises(TypeError):
             Event('test', name='fail')
 
+    def test_interned_names(self):
+        name = ''.join(['te', 'st'])
+        assert Event(name).name is Event('test').name
+        assert Transition('s1', event=name).event is Event('test').name
+
+        # Data of events without parameters are not shared
+        event = Event('a')
+        event.data['x'] = 1
+        assert Event('a').data == {}
+
+    def test_pickled_event(self):
+        event = pickle.loads(pickle.dumps(Event('a')))
+        assert event == Event('a')
+        assert event.name is Event('a').name
+        assert pickle.loads(pickle.dumps(Event('a', x=1))) == Event('a', x=1)
+
 
 class TestStatechartTraveral:
     def test_parent(self, composite_statechart):
@@ -72,6 +89,28 @@ class TestStatechartTraveral:
         assert composite_statechart.least_common_ancestor('s1a', 's1b') == 's1'
         assert composite_statechart.least_common_ancestor('s1a', 's1b1') == 's1'
 
+    def test_hierarchy_after_changes(self, composite_statechart):
+        assert composite_statechart.depth_for('s1b1') == 4
+        assert composite_statechart.least_common_ancestor('s1b1', 's2') == 'root'
+
+        composite_statechart.move_state('s1b', 's1a')
+        assert composite_statechart.depth_for('s1b1') == 5
+        assert composite_statechart.ancestors_for('s1b1') == ['s1b', 's1a', 's1', 'root']
+        assert composite_statechart.least_common_ancestor('s1b1', 's1a') == 's1'
+
+        composite_statechart.rename_state('s1a', 's1c')
+        assert composite_statechart.ancestors_for('s1b1') == ['s1b', 's1c', 's1', 'root']
+        assert 's1b2' in composite_statechart.descendants_for('s1c')
+
+        composite_statechart.remove_state('s1b')
+        assert composite_statechart.descendants_for('s1c') == []
+        with pytest.raises(StatechartError):
+            composite_statechart.depth_for('s1b1')
+
+        composite_statechart.add_state(BasicState('s1d'), parent='s1')
+        assert composite_statechart.depth_for('s1d') == 3
+        assert composite_statechart.least_common_ancestor('s1d', 's2') == 'root'
+
     def test_leaf(self, composite_statechart):
         assert sorted(composite_statechart.leaf_for([])) == []
         assert sorted(composite_statechart.leaf_for(['s1'])) == ['s1']
@@ -1,6 +1,7 @@
 import pytest
 
-from sismic.interpreter import Event, MetaEvent, InternalEvent
+from sismic.interpreter import Event, Interpreter, MetaEvent, InternalEvent
+from sismic.io import import_from_yaml
 from sismic.exceptions import PropertyStatechartError
 
 
@@ -98,3 +99,181 @@ class TestInterpreterMetaEvents:
 
         with pytest.raises(PropertyStatechartError):
             microwave.execute()
+
+
+class TestPropertyFiltering:
+    @pytest.fixture()
+    def interpreter(self, simple_statechart):
+        return Interpreter(simple_statechart)
+
+    def test_forwarded_meta_events(self, interpreter, mocker):
+        prop_sc = import_from_yaml(text="""
+        statechart:
+          name: s3 is never entered
+          root state:
+            name: root
+            initial: waiting
+            states:
+              - name: waiting
+                transitions:
+                  - target: failure
+                    event: state entered
+                    guard: event.state == 's3'
+              - name: failure
+                type: final
+        """)
+        listener = interpreter.bind_property_statechart(prop_sc)
+        queue = mocker.spy(listener._interpreter, 'queue')
+
+        interpreter.execute()
+        assert {call.args[0].name for call in queue.call_args_list} == {'state entered'}
+
+        with pytest.raises(PropertyStatechartError):
+            interpreter.queue('goto s2').execute()
+
+    def test_initialization_time(self, interpreter):
+        prop_sc = import_from_yaml(text="""
+        statechart:
+          name: foo is not consumed after 10 seconds
+          root state:
+            name: root
+            initial: waiting
+            states:
+              - name: waiting
+                transitions:
+                  - target: failure
+                    event: event consumed
+                    guard: event.event.name == 'foo' and after(10)
+              - name: failure
+                type: final
+        """)
+        interpreter.bind_property_statechart(prop_sc)
+        interpreter.execute()
+
+        interpreter.clock.time = 15
+        with pytest.raises(PropertyStatechartError):
+            interpreter.queue('foo').execute()
+
+    def test_time_synchronisation(self, interpreter):
+        prop_sc = import_from_yaml(text="""
+        statechart:
+          name: s1 is left within 5 seconds
+          root state:
+            name: root
+            initial: waiting
+            states:
+              - name: waiting
+                transitions:
+                  - target: failure
+                    guard: after(5)
+                  - target: done
+                    event: state exited
+                    guard: event.state == 's1'
+              - name: done
+              - name: failure
+                type: final
+        """)
+        interpreter.bind_property_statechart(prop_sc)
+        interpreter.execute()
+
+        interpreter.clock.time = 4
+        interpreter.execute()
+        interpreter.clock.time = 6
+        with pytest.raises(PropertyStatechartError):
+            interpreter.execute()
+
+
+class TestBatchedProperty:
+    @pytest.fixture()
+    def interpreter(self, simple_statechart):
+        return Interpreter(simple_statechart)
+
+    @pytest.fixture()
+    def property_statechart(self):
+        return import_from_yaml(text="""
+        statechart:
+          name: s3 is never entered
+          root state:
+            name: root
+            initial: waiting
+            states:
+              - name: waiting
+                transitions:
+                  - target: failure
+                    event: state entered
+                    guard: event.state == 's3'
+              - name: failure
+                type: final
+        """)
+
+    def test_one_execution_per_step(self, interpreter, property_statechart, mocker):
+        listener = interpreter.bind_property_statechart(property_statechart, batched=True)
+        execute = mocker.spy(listener._interpreter, 'execute')
+        queue = mocker.spy(listener._interpreter, 'queue')
+
+        step = interpreter.execute_once()
+        assert len(step.entered_states) > 1
+        assert execute.call_count == 1
+        assert queue.call_count == 1
+        assert [e.state for e in queue.call_args.args] == step.entered_states
+
+    def test_no_meta_event(self, interpreter, property_statechart, mocker):
+        interpreter.execute()
+        listener = interpreter.bind_property_statechart(property_statechart, batched=True)
+        queue = mocker.spy(listener._interpreter, 'queue')
+
+        interpreter.execute_once()
+        assert queue.call_count == 0
+
+    def test_violation(self, interpreter, property_statechart):
+        interpreter.bind_property_statechart(property_statechart, batched=True)
+        interpreter.execute()
+
+        with pytest.raises(PropertyStatechartError):
+            # s3 is entered by the eventless transition from s2
+            interpreter.queue('goto s2').execute()
+        assert 's3' in interpreter.configuration
+
+    def test_failed_step(self, interpreter, property_statechart):
+        def failing(event):
+            if event.state == 's3':
+                raise ValueError()
+
+        interpreter.execute()
+        interpreter.bind_property_statechart(property_statechart, batched=True)
+        interpreter.attach(failing, events=['state entered'])
+        interpreter.queue('goto s2').execute_once()
+        with pytest.raises(ValueError):
+            interpreter.execute_once()
+
+        # Meta-events of the failed step are not propagated with the ones of the next step
+        interpreter.detach(failing)
+        assert interpreter.execute_once() is None
+
+    def test_time_synchronisation(self, interpreter):
+        prop_sc = import_from_yaml(text="""
+        statechart:
+          name: s1 is left within 5 seconds
+          root state:
+            name: root
+            initial: waiting
+            states:
+              - name: waiting
+                transitions:
+                  - target: failure
+                    guard: after(5)
+                  - target: done
+                    event: state exited
+                    guard: event.state == 's1'
+              - name: done
+              - name: failure
+                type: final
+        """)
+        interpreter.bind_property_statechart(prop_sc, batched=True)
+        interpreter.execute()
+
+        interpreter.clock.time = 4
+        interpreter.execute()
+        interpreter.clock.time = 6
+        with pytest.raises(PropertyStatechartError):
+            interpreter.execute()
@@ -1,9 +1,50 @@
+import asyncio
 import pytest
 
-from time import sleep
-
-from sismic.runner import AsyncRunner
-from sismic.interpreter import Interpreter
+from copy import deepcopy
+from functools import partial
+from threading import Thread
+from time import monotonic, sleep
+
+from sismic.exceptions import CodeEvaluationError, StatechartError
+from sismic.runner import AsyncRunner, AsyncioRunner, Scheduler, ShardedRunner
+from sismic.runner.runner import wakeup_timeout
+from sismic.clock import SimulatedClock
+from sismic.interpreter import Event, Interpreter
+
+
+def wait_until(predicate, timeout=1):
+    """
+    Poll given predicate until it holds, or until timeout seconds have elapsed.
+    Return the last value of the predicate.
+    """
+    deadline = monotonic() + timeout
+    while not predicate():
+        if monotonic() > deadline:
+            return predicate()
+        sleep(0.001)
+    return True
+
+
+def record_entered(entered, interpreter, event):
+    """
+    Listener that records the entered states of given interpreter, with the time at which
+    they were entered.
+    """
+    entered.append((event.state, interpreter.time))
+
+
+def assert_entered_after_deadlines(entered):
+    """
+    Check that the states of the timer statechart were entered in order, each one after the
+    deadline of the guard that led to it. The time at which they were entered is not
+    bounded, as it depends on the load of the machine.
+    """
+    assert [state for state, _ in entered] == ['root', 's1', 's2', 's3', 's4']
+    times = dict(entered)
+    assert times['s2'] >= times['s1'] + 3
+    assert times['s3'] >= times['s2'] + 2
+    assert times['s4'] >= times['s3'] + 2
 
 
 class TestAsyncRunner:
@@ -13,9 +54,9 @@ class TestAsyncRunner:
     def interpreter(self, simple_statechart):
         return Interpreter(simple_statechart)
 
-    @pytest.fixture()
-    def runner(self, interpreter):
-        r = AsyncRunner(interpreter, interval=0)
+    @pytest.fixture(params=[False, True], ids=['polling', 'event-driven'])
+    def runner(self, interpreter, request):
+        r = AsyncRunner(interpreter, interval=0, event_driven=request.param)
         yield r
         r.stop()
 
@@ -143,3 +184,440 @@ class TestAsyncRunner:
         runner.start()
         runner.stop()
         runner.wait()
+
+    def test_event_driven(self, timer_statechart, mocker):
+        interpreter = Interpreter(timer_statechart, clock=SimulatedClock())
+        interpreter.clock.speed = 100  # Deadlines in guards are 3, 2 and 2 seconds
+        runner = AsyncRunner(interpreter, interval=10, event_driven=True)
+        execute = mocker.spy(runner, 'execute')
+
+        interpreter.clock.start()
+        runner.start()
+        runner.wait()
+        assert interpreter.final
+        assert interpreter.clock.time >= 7
+        # The runner did not wait for the interval (1000 on the clock) to reach the deadlines,
+        # and did only one cycle per deadline and state (+ initialization)
+        assert interpreter.clock.time < 500
+        assert execute.call_count < 15
+
+    def test_wakeup_timeout(self, timer_statechart):
+        interpreter = Interpreter(timer_statechart, clock=SimulatedClock())
+        interpreter.execute()
+        interpreter.clock.start()
+
+        interpreter.clock.speed = 2
+        assert 0 < wakeup_timeout(interpreter) <= 1.5
+
+        # A clock with a speed of 0 never reaches the next deadline
+        interpreter.clock.speed = 0
+        assert wakeup_timeout(interpreter) is None
+
+        interpreter.clock.time = 10
+        assert wakeup_timeout(interpreter) == 0
+
+    def test_event_driven_idle(self, interpreter, mocker):
+        runner = AsyncRunner(interpreter, interval=0, event_driven=True)
+        execute = mocker.spy(runner, 'execute')
+        runner.start()
+
+        # The runner sleeps once a call to execute processed no step
+        assert wait_until(lambda: execute.call_count >= 2 and execute.spy_return == [])
+        count = execute.call_count
+        sleep(self.INTERVAL)
+        assert execute.call_count == count
+
+        interpreter.queue('goto s2')
+        assert wait_until(lambda: interpreter.configuration == ['root', 's3'])
+        runner.stop()
+
+
+class TestAsyncioRunner:
+    TIMEOUT = 1
+
+    @pytest.fixture()
+    def interpreter(self, simple_statechart):
+        return Interpreter(simple_statechart)
+
+    def run(self, coroutine_function):
+        async def main():
+            runner = AsyncioRunner()
+            try:
+                return await asyncio.wait_for(coroutine_function(runner), self.TIMEOUT)
+            finally:
+                await runner.stop()
+        return asyncio.run(main())
+
+    def test_listened_meta_events(self, interpreter):
+        async def scenario(runner):
+            runner.add(interpreter)
+            assert len(interpreter._routes['event consumed']) == 1
+            assert len(interpreter._routes['state entered']) == 1
+            assert interpreter._routes.get('step started', interpreter._unfiltered) == []
+        self.run(scenario)
+
+    def test_queue_async(self, interpreter):
+        async def scenario(runner):
+            handle = runner.add(interpreter)
+            step = await handle.queue_async('goto s2')
+            assert step.event.name == 'goto s2'
+            assert interpreter.configuration == ['root', 's2']
+            await handle.until_entered('s3')
+
+            entered = handle.until_entered('s2')
+            final = handle.until_final()
+            assert not entered.done()
+            await handle.queue_async('goto s2')
+            await entered
+            assert not final.done()
+
+            handle.queue('goto final')
+            await final
+            assert interpreter.final
+            await runner.wait()
+            assert not handle.running
+
+        self.run(scenario)
+
+    def test_already_entered(self, interpreter):
+        async def scenario(runner):
+            handle = runner.add(interpreter)
+            await handle.until_entered('s1')
+            assert handle.until_entered('s1').done()
+            with pytest.raises(StatechartError):
+                handle.until_entered('unknown')
+
+        self.run(scenario)
+
+    def test_several_interpreters(self, simple_statechart):
+        async def scenario(runner):
+            handles = [runner.add(Interpreter(simple_statechart)) for _ in range(3)]
+            for handle in handles:
+                handle.queue('goto s2', 'goto final')
+            await runner.wait()
+            assert all(handle.interpreter.final for handle in handles)
+
+        self.run(scenario)
+
+    def test_deadlines(self, timer_statechart):
+        interpreter = Interpreter(timer_statechart, clock=SimulatedClock())
+        interpreter.clock.speed = 100  # Deadlines in guards are 3, 2 and 2 seconds
+        steps = []
+        interpreter.attach(lambda e: steps.append(e) if e.name == 'step started' else None)
+        entered = []
+        interpreter.attach(partial(record_entered, entered, interpreter), events=['state entered'])
+
+        async def scenario(runner):
+            interpreter.clock.start()
+            await runner.add(interpreter).until_final()
+            assert_entered_after_deadlines(entered)
+            # Only one cycle per deadline and state (+ initialization)
+            assert len(steps) < 15
+
+        self.run(scenario)
+
+    def test_coroutine_listener(self, interpreter):
+        entered = []
+
+        async def listener(event):
+            if event.name == 'state entered':
+                await asyncio.sleep(0)
+                entered.append(event.state)
+
+        async def scenario(runner):
+            handle = runner.add(interpreter)
+            handle.attach(listener)
+            await handle.queue_async('goto s2')
+            assert entered[-1] == 's2'
+            await handle.until_entered('s3')
+
+            handle.detach(listener)
+            await handle.queue_async('goto s1')
+            assert entered[-1] == 's3'
+
+        self.run(scenario)
+
+    def test_cancel(self, interpreter):
+        async def scenario(runner):
+            handle = runner.add(interpreter)
+            event = Event('goto s2', delay=10)
+            consumed = handle.queue_async(event)
+            assert handle.cancel(event)
+            with pytest.raises(asyncio.CancelledError):
+                await consumed
+
+        self.run(scenario)
+
+    def test_coalesced_and_dropped(self, simple_statechart):
+        async def scenario(runner):
+            interpreter = Interpreter(simple_statechart, coalesce={'goto s2': 'latest'},
+                                      queue_size=2, queue_policy='drop newest')
+            handle = runner.add(interpreter)
+            first = handle.queue_async('goto s2', x=1)
+            second = handle.queue_async('goto s2', x=2)
+            handle.queue('goto s1')
+            dropped = handle.queue_async('goto final')
+
+            assert await first is await second
+            assert first.result().event == Event('goto s2', x=2)
+            with pytest.raises(asyncio.CancelledError):
+                await dropped
+            assert len(handle._consumed) == 0
+            assert len(interpreter._discarded) == 0
+
+        self.run(scenario)
+
+    def test_stop(self, interpreter):
+        async def scenario(runner):
+            handle = runner.add(interpreter)
+            final = handle.until_final()
+            await runner.stop()
+            assert not runner.running
+            assert final.cancelled()
+            assert handle.queue_async('goto s2').cancelled()
+
+        self.run(scenario)
+
+    def test_exception(self, interpreter):
+        def listener(event):
+            if event.name == 'state entered' and event.state == 's2':
+                raise ValueError()
+
+        async def scenario(runner):
+            handle = runner.add(interpreter)
+            interpreter.attach(listener)
+            with pytest.raises(ValueError):
+                await handle.queue_async('goto s2')
+            with pytest.raises(ValueError):
+                await runner.wait()
+
+        self.run(scenario)
+
+
+class TestScheduler:
+    @pytest.fixture()
+    def scheduler(self):
+        return Scheduler()
+
+    def test_initialization(self, scheduler, simple_statechart):
+        interpreters = [Interpreter(simple_statechart) for _ in range(3)]
+        for interpreter in interpreters:
+            scheduler.add(interpreter)
+        assert len(scheduler) == 3
+        assert scheduler.lag(interpreters[0]) is None
+
+        # Initialization, then interpreters are executed again as they could process more steps
+        assert scheduler.run_once() == 3
+        assert all(interpreter.configuration == ['root', 's1'] for interpreter in interpreters)
+        assert scheduler.lag(interpreters[0]) >= 0
+        assert scheduler.next_due_time() is not None
+        assert scheduler.run_once() == 0
+
+        # Nothing to do until an event is queued
+        assert scheduler.next_due_time() is None
+        assert scheduler.run_once() == 0
+
+        with pytest.raises(ValueError):
+            scheduler.add(interpreters[0])
+
+    def test_only_due_interpreters(self, scheduler, simple_statechart, mocker):
+        interpreters = [Interpreter(simple_statechart) for _ in range(3)]
+        for interpreter in interpreters:
+            scheduler.add(interpreter)
+        while scheduler.run_once() > 0:
+            pass
+
+        spies = [mocker.spy(interpreter, 'execute_once') for interpreter in interpreters]
+        interpreters[1].queue('goto s2')
+        assert scheduler.next_due_time() is not None
+        assert scheduler.run_once() == 1
+        assert [spy.call_count for spy in spies] == [0, 1, 0]
+        assert interpreters[1].configuration == ['root', 's2']
+
+        # Eventless transition
+        assert scheduler.run_once() == 1
+        assert interpreters[1].configuration == ['root', 's3']
+        assert scheduler.run_once() == 0
+        assert [spy.call_count for spy in spies] == [0, 3, 0]
+
+    def test_quantum(self, simple_statechart):
+        scheduler = Scheduler(quantum=3)
+        interpreter = Interpreter(simple_statechart)
+        scheduler.add(interpreter)
+        interpreter.queue('goto s2', 'goto s1', 'goto s2')
+
+        # Initialization, goto s2, eventless
+        assert scheduler.run_once() == 3
+        assert interpreter.configuration == ['root', 's3']
+        # goto s1, goto s2, eventless
+        assert scheduler.run_once() == 3
+        assert scheduler.run_once() == 0
+
+        with pytest.raises(ValueError):
+            Scheduler(quantum=0)
+
+    def test_final_and_remove(self, scheduler, simple_statechart):
+        interpreter = Interpreter(simple_statechart)
+        other = Interpreter(simple_statechart)
+        scheduler.add(interpreter)
+        scheduler.add(other)
+        interpreter.queue('goto s2', 'goto final')
+        scheduler.remove(other)
+
+        while scheduler.run_once() > 0:
+            pass
+        assert interpreter.final
+        assert interpreter not in scheduler
+        assert other.configuration == []
+        assert len(scheduler) == 0
+
+    def test_failure(self, scheduler, simple_statechart):
+        failing = Interpreter(deepcopy(simple_statechart))
+        failing.statechart.state_for('s2').on_entry = 'x = 1 / 0'
+        other = Interpreter(simple_statechart)
+        scheduler.add(failing)
+        scheduler.add(other)
+        failing.queue('goto s2')
+        other.queue('goto s2')
+
+        # Initialization, then both interpreters are due when the first one fails
+        assert scheduler.run_once() == 2
+        assert scheduler.run_once() == 1
+        assert scheduler.interpreters == [other]
+        assert [interpreter for interpreter, _ in scheduler.failures] == [failing]
+        assert isinstance(scheduler.failures[0][1], CodeEvaluationError)
+
+        # The other interpreter is rescheduled
+        assert other.configuration == ['root', 's2']
+        assert scheduler.next_due_time() is not None
+        assert scheduler.run_once() == 1
+        assert other.configuration == ['root', 's3']
+
+    def test_run(self, scheduler, timer_statechart, mocker):
+        interpreters = [Interpreter(timer_statechart, clock=SimulatedClock()) for _ in range(3)]
+        entered = {}
+        for interpreter in interpreters:
+            interpreter.clock.speed = 100  # Deadlines in guards are 3, 2 and 2 seconds
+            interpreter.clock.start()
+            interpreter.attach(partial(record_entered, entered.setdefault(interpreter, []),
+                                       interpreter), events=['state entered'])
+            scheduler.add(interpreter)
+        execute = mocker.spy(scheduler, 'execute')
+
+        scheduler.run()
+        assert all(interpreter.final for interpreter in interpreters)
+        for interpreter in interpreters:
+            assert_entered_after_deadlines(entered[interpreter])
+        # Interpreters are only executed when they are due: once per deadline and state
+        # (+ initialization) for each of them
+        assert execute.call_count < 15 * len(interpreters)
+
+    def test_stop(self, scheduler, simple_statechart):
+        interpreter = Interpreter(simple_statechart)
+        scheduler.add(interpreter)
+        thread = Thread(target=scheduler.run)
+        thread.start()
+
+        interpreter.queue('goto s2')
+        assert wait_until(lambda: interpreter.configuration == ['root', 's3'])
+
+        scheduler.stop()
+        thread.join(1)
+        assert not thread.is_alive()
+
+
+class TestShardedRunner:
+    @pytest.fixture()
+    def runner(self):
+        runner = ShardedRunner(2, batch_interval=0)
+        runner.start()
+        yield runner
+        runner.stop()
+
+    def collect(self, runner, count):
+        summaries = []
+        for _ in range(50):
+            summaries.extend(runner.collect(timeout=0.1))
+            if len(summaries) >= count:
+                break
+        return summaries
+
+    def test_shard_for(self):
+        runner = ShardedRunner(4)
+        assert runner.shard_for('session 1') == ShardedRunner(4).shard_for('session 1')
+        assert {runner.shard_for(i) for i in range(100)} == {0, 1, 2, 3}
+
+        with pytest.raises(ValueError):
+            ShardedRunner(0)
+        with pytest.raises(RuntimeError):
+            runner.queue('session 1', 'goto s2')
+
+    def test_execution(self, runner, simple_statechart):
+        keys = ['session {}'.format(i) for i in range(6)]
+        for key in keys:
+            runner.add(key, Interpreter(simple_statechart))
+
+        # Initialization
+        summaries = self.collect(runner, 6)
+        assert sorted(summary.key for summary in summaries) == sorted(keys)
+        assert all(summary.configuration == ['root', 's1'] for summary in summaries)
+
+        runner.queue(keys[0], 'goto s2')
+        summaries = self.collect(runner, 2)
+        assert [summary.key for summary in summaries] == [keys[0]] * 2
+        assert summaries[0].event == Event('goto s2')
+        assert summaries[0].entered_states == ['s2']
+        assert summaries[1].configuration == ['root', 's3']
+        assert runner.collect() == []
+
+    def test_quantum(self, simple_statechart):
+        runner = ShardedRunner(1, quantum=3, batch_interval=0)
+        runner.start()
+        try:
+            runner.add('session', Interpreter(simple_statechart))
+            runner.queue('session', 'goto s2')
+            summaries = self.collect(runner, 3)
+        finally:
+            runner.stop()
+
+        # Consuming goto s2 and the eventless transition to s3 are executed at once
+        assert [summary.configuration for summary in summaries] == [
+            ['root', 's1'], ['root', 's2'], ['root', 's3']]
+
+    def test_final_and_failures(self, runner, simple_statechart):
+        runner.add('final', Interpreter(simple_statechart))
+        runner.queue('final', 'goto s2', 'goto final')
+        summaries = self.collect(runner, 4)
+        assert summaries[-1].configuration == []
+
+        # Discarded interpreter
+        runner.queue('final', 'goto s2')
+        assert runner.collect(timeout=0.1) == []
+
+        interpreter = Interpreter(simple_statechart)
+        interpreter.statechart.state_for('s2').on_entry = 'x = 1 / 0'
+        runner.add('failure', interpreter)
+        runner.queue('failure', 'goto s2')
+        for _ in range(50):
+            if len(runner.failures) > 0:
+                break
+            sleep(0.02)
+        [(key, exception)] = runner.failures
+        assert key == 'failure'
+        assert isinstance(exception, Exception)
+
+    def test_stop(self, simple_statechart):
+        runner = ShardedRunner(2, batch_size=1000, batch_interval=60)
+        runner.start()
+        assert runner.running
+        runner.add('session', Interpreter(simple_statechart))
+        sleep(0.2)
+        assert runner.collect() == []
+        runner.stop()
+        assert not runner.running
+
+        # Pending summaries are received before stopping
+        [summary] = runner.collect()
+        assert summary.configuration == ['root', 's1']
+        with pytest.raises(RuntimeError):
+            runner.start()